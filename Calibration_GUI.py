@@ -1,66 +1,25 @@
-import numpy as np
-import pyvisa
-from sklearn.linear_model import LinearRegression
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, \
-    QWidget, QProgressBar
-from time import sleep
+    QWidget, QProgressBar, QCheckBox, QComboBox
+from PyQt5.QtCore import Qt, QTimer, pyqtSlot
 import os
-
-
-def supply_current2020(current, delay):
-    """
-    Sets the output current of the power supply and returns the actual current the supply is outputting.
-    :param current: set the output current to the value input in Ampere units.
-    :param delay: delay between write and query commands in time unit of seconds.
-    :return: a float with the value of the actual current (Ampere) the instrument is outputting.
-    """
-    supply.clear()
-    supply_string = f'func:mode curr;:curr {current};:volt 20;:OUTP ON'
-    supply.write(supply_string)
-    sleep(delay)
-    supply.clear()
-    sleep(delay)
-    outp_str = supply.query("curr?").splitlines()
-    supply.clear()
-    return float(outp_str[0])
-
-
-# Define function to query the teslameter
-def gaussm_query():
-    """
-    Queries the instrument and returns the value of the reading.
-    :return: float with magnetic field units of Gauss (G)
-    """
-    gm_string = gaussm.query("f")
-    gm_float = float(gm_string.split('G')[0])
-    return gm_float
-
-
-# PyVisa Resource Manager
-rm = pyvisa.ResourceManager()
-
-# List all available resources with their respective aliases
-print("Listing connected GPIB-VISA resources:")
-resources_tuple = rm.list_resources()
-
-names = []
-aliases = []
-for name in resources_tuple:
-    names.append(name)
-    aliases.append(rm.resource_info(name)[4])
-
-# Create a pandas Dataframe with resources names and aliases
-resources_dict = {'Name': names, 'alias': aliases}
-resources_df = pd.DataFrame(resources_dict)
-print(f'VISA Resources:\n {resources_df.to_string(index=False)}')
-
-# Open Resources
-supply = rm.open_resource('GPIB0::1::INSTR')  # KEPCO BOP20-20DL Power Supply
-supply.clear()
-gaussm = rm.open_resource('GPIB0::3::INSTR')  # Group3 DTM-133 Digital Teslameter
+import threading
+from functools import partial
+from time import perf_counter
+import numpy as np
+from acquisition import ConvergenceStatistics, SettleStatistics
+from calibration import LinearCalibrator
+from calibration_acquisition import DATA_COLUMNS, FIELD_DATA_COLUMNS, FieldFeedback, calibration_sweep, \
+    find_instruments, load_field_calibration, measure_point, prepare_instruments, sessions, settle_settings, \
+    sweep_cleanup
+from data_writer import StreamingDataWriter, new_data_path
+from field_calibration import FieldCalibration
+from instrument_lock import InstrumentLock
+from live_plot import LivePlot
+from profile_panel import ProfilePanel
+from render_scheduler import RenderScheduler
+from sample_store import SampleStore
+from stage_timing import TimingTable, timing_path
+from sweep_worker import SweepWorker, start_worker
 
 
 # Initiate the GUI
@@ -75,52 +34,81 @@ class MainWindow(QMainWindow):
         self.setWindowTitle('Calibration: Current - Magnetic Field')
 
         # Create labels and line edits for the input fields
-        max_label = QLabel('Max Current (mA):')
+        self.max_label = max_label = QLabel('Max Current (mA):')
         self.max_edit = QLineEdit()
         self.max_edit.setFixedWidth(200)
-        min_label = QLabel('Min Current (mA):')
+        self.min_label = min_label = QLabel('Min Current (mA):')
         self.min_edit = QLineEdit()
         self.min_edit.setFixedWidth(200)
-        steps_label = QLabel('Current Steps (mA):')
+        self.steps_label = steps_label = QLabel('Current Steps (mA):')
         self.steps_edit = QLineEdit()
         self.steps_edit.setFixedWidth(200)
         wait_label = QLabel('Wait between measurements (ms): ')
         self.wait_edit = QLineEdit()
         self.wait_edit.setFixedWidth(200)
+        samples_label = QLabel('Measurements per point:')
+        self.samples_edit = QLineEdit()
+        self.samples_edit.setFixedWidth(200)
+        self.adaptive_check = QCheckBox('Adaptive steps')
+        budget_label = QLabel('Point budget (adaptive steps):')
+        self.budget_edit = QLineEdit()
+        self.budget_edit.setFixedWidth(200)
+        settle_label = QLabel('Settle tolerance (G), 0 for a fixed wait:')
+        self.settle_edit = QLineEdit()
+        self.settle_edit.setFixedWidth(200)
+        settle_window_label = QLabel('Settle window (ms):')
+        self.settle_window_edit = QLineEdit()
+        self.settle_window_edit.setFixedWidth(200)
+        self.round_trip_check = QCheckBox('Sweep up and back down')
+        model_label = QLabel('Calibration model (per branch):')
+        self.model_combo = QComboBox()
+        self.model_combo.addItems(['poly', 'piecewise', 'spline', 'linear'])
+        self.model_combo.setFixedWidth(200)
+        self.field_check = QCheckBox('Sweep field targets (G) with feedback')
+        self.field_check.toggled.connect(self.update_sweep_units)
+        field_tolerance_label = QLabel('Field tolerance (G):')
+        self.field_tolerance_edit = QLineEdit()
+        self.field_tolerance_edit.setFixedWidth(200)
+        iterations_label = QLabel('Max iterations per point:')
+        self.iterations_edit = QLineEdit()
+        self.iterations_edit.setFixedWidth(200)
 
         # Create a line edit for calibration constant 1
         self.calib_label = QLabel('Calibration Constant 1:')
         self.calib_edit = QLineEdit()
         self.calib_edit.setReadOnly(True)
-        self.calib_edit.setFixedWidth(200)
+        self.calib_edit.setFixedWidth(260)
         #self.calib_edit.setFixedHeight(30)
 
         # Create a line edit for calibration constant 2
         self.calib2_label = QLabel('Calibration Constant 2:')
         self.calib2_edit = QLineEdit()
         self.calib2_edit.setReadOnly(True)
-        self.calib2_edit.setFixedWidth(200)
+        self.calib2_edit.setFixedWidth(260)
         #self.calib2_edit.setFixedHeight(30)
         self.calib_formula_label = QLabel('y = a1 * x + a0')
 
-        # Create a canvas for the plot
-        self.figure = plt.Figure()
-        self.canvas = FigureCanvas(self.figure)  # This is the widget
-        self.ax = self.figure.add_subplot(111)
-        self.ax.set_xlabel('Current (mA)')
-        self.ax.set_ylabel('Magnetic Field (Oe)')
-        self.ax.set_title('Calibration Plot')
+        # Create a placeholder for the plot, the canvas is created by finish_startup once the
+        # window is shown because importing matplotlib takes most of the start up time
+        self.plot_placeholder = QLabel('Loading plot...')
+        self.plot_placeholder.setAlignment(Qt.AlignCenter)
 
-        # Create buttons to run the script and abort
+        # Create buttons to run the script and abort, the run button is enabled with the plot
         self.button_run = QPushButton('Run Script')
+        self.button_run.setEnabled(False)
         self.button_run.clicked.connect(self.run_script)
         self.button_abort = QPushButton('Abort')
         self.button_abort.setCheckable(True)
         self.button_abort.clicked.connect(self.toggle_bool)
+        self.button_timing = QPushButton('Timing')
+        self.button_timing.clicked.connect(self.show_timing)
 
         # Create progress bar
         self.progress_bar = QProgressBar()
 
+        # Create a label with the settle time statistics of the sweep
+        self.settle_stats_label = QLabel('')
+
         # Create a layout for the input fields and calibration constants (Left layout)
         left_layout = QVBoxLayout()
         left_layout.addWidget(max_label)
@@ -131,6 +119,23 @@ class MainWindow(QMainWindow):
         left_layout.addWidget(self.steps_edit)
         left_layout.addWidget(wait_label)
         left_layout.addWidget(self.wait_edit)
+        left_layout.addWidget(samples_label)
+        left_layout.addWidget(self.samples_edit)
+        left_layout.addWidget(self.adaptive_check)
+        left_layout.addWidget(budget_label)
+        left_layout.addWidget(self.budget_edit)
+        left_layout.addWidget(settle_label)
+        left_layout.addWidget(self.settle_edit)
+        left_layout.addWidget(settle_window_label)
+        left_layout.addWidget(self.settle_window_edit)
+        left_layout.addWidget(self.round_trip_check)
+        left_layout.addWidget(model_label)
+        left_layout.addWidget(self.model_combo)
+        left_layout.addWidget(self.field_check)
+        left_layout.addWidget(field_tolerance_label)
+        left_layout.addWidget(self.field_tolerance_edit)
+        left_layout.addWidget(iterations_label)
+        left_layout.addWidget(self.iterations_edit)
         left_layout.addStretch()
         left_layout.addWidget(self.calib_label)
         left_layout.addWidget(self.calib_edit)
@@ -142,12 +147,14 @@ class MainWindow(QMainWindow):
         button_layout = QHBoxLayout()
         button_layout.addWidget(self.button_run)
         button_layout.addWidget(self.button_abort)
+        button_layout.addWidget(self.button_timing)
 
         # Create a layout for the canvas, buttons and progress bar (Right layout)
-        right_layout = QVBoxLayout()
-        right_layout.addWidget(self.canvas)
+        self.right_layout = right_layout = QVBoxLayout()
+        right_layout.addWidget(self.plot_placeholder, 1)
         right_layout.addLayout(button_layout)
         right_layout.addWidget(self.progress_bar)
+        right_layout.addWidget(self.settle_stats_label)
 
         # Create a layout for the input fields and the button/canvas layout
         main_layout = QHBoxLayout()
@@ -167,20 +174,93 @@ class MainWindow(QMainWindow):
         # Set button boolean value to False
         self.button_bool = False
 
+        # Worker running the sweep loop and its thread
+        self.worker = None
+        self.worker_thread = None
+
+        # Create the store of the measured points, read by the plot as views
+        self.data_store = SampleStore(['setpoint', 'current', 'field', 'field_std', 'samples', 'settle_time',
+                                       'settled', 'current_time', 'field_time', 'iterations', 'converged',
+                                       'field_error'])
+
+        # Create the calibration fit, updated with every point
+        self.calibrator = LinearCalibrator()
+
+        # Create the statistics of the time the field takes to settle after each current step,
+        # and of the feedback iterations of a field target sweep
+        self.settle_stats = SettleStatistics()
+        self.convergence_stats = ConvergenceStatistics()
+        self.field_mode = False
+
+        # Create the table of the time spent in each stage of every point, shown in the timing
+        # panel (created when it is first opened) and exported next to the data file
+        self.timing = TimingTable()
+        self.profile_panel = None
+        self.data_path = None
+
+        # Adaptive sweep of the running sweep, None for a sweep with a fixed step
+        self.adaptive_sweep = None
+
         # Set the default values of the input line edits
         self.max_edit.setText("1000")
         self.min_edit.setText("0")
         self.steps_edit.setText("100")
         self.wait_edit.setText("100")
+        self.samples_edit.setText("1")
+        self.budget_edit.setText("30")
+        self.settle_edit.setText("0")
+        self.settle_window_edit.setText("100")
+        self.field_tolerance_edit.setText("1")
+        self.iterations_edit.setText("5")
+
+        # Finish the start up once the window is shown, the delay lets the event loop paint the
+        # window first
+        QTimer.singleShot(50, self.finish_startup)
+
+    # Define a function that runs the slow part of the start up after the window is shown
+    def finish_startup(self):
+        """
+        Finds the instruments in a background thread and creates the plot.
+        """
+        threading.Thread(target=find_instruments, name='FindInstruments', daemon=True).start()
+
+        # Import matplotlib on first use, pyplot isn't needed to embed a figure
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+
+        # Create a canvas for the plot
+        self.figure = Figure()
+        self.canvas = FigureCanvas(self.figure)  # This is the widget
+        self.ax = self.figure.add_subplot(111)
+        self.ax.set_xlabel('Current (mA)')
+        self.ax.set_ylabel('Magnetic Field (Oe)')
+        self.ax.set_title('Calibration Plot')
+
+        # Replace the placeholder with the canvas
+        self.right_layout.replaceWidget(self.plot_placeholder, self.canvas)
+        self.plot_placeholder.deleteLater()
+
+        # Create the live plot engine with one persistent line for the sweep
+        self.live_plot = LivePlot(self.canvas, self.ax)
+        self.live_plot.add_series('sweep', errorbars=True, linestyle='-', marker='o', color='r')
+
+        # Draw the stored points at most 20 times per second, whatever the acquisition rate
+        self.render_scheduler = RenderScheduler(self.render_points, rate=20.0, parent=self)
+        self.rendered_points = 0
+        self.button_run.setEnabled(True)
 
     # Define a function to change the boolean value to abort script
     def toggle_bool(self):
         """
-        Changes the boolean value of button_bool so that the if clause in the
-        run_script function aborts the loop.
+        Changes the boolean value of button_bool and asks the worker running the sweep loop
+        to abort.
         """
         self.button_bool = not self.button_bool
 
+        # Stop the acquisition loop running in the worker thread
+        if self.button_bool and self.worker is not None:
+            self.worker.abort()
+
     # Define a function that reads the inputs
     def read_inputs(self):
         """
@@ -192,23 +272,44 @@ class MainWindow(QMainWindow):
         min_val = float(self.min_edit.text())
         steps_val = float(self.steps_edit.text())
         wait = float(self.wait_edit.text())
-        return max_val, min_val, steps_val, wait
+        samples = max(int(self.samples_edit.text()), 1)
+        budget = max(int(self.budget_edit.text()), 2)
+        settle_tolerance = float(self.settle_edit.text())
+        settle_window = float(self.settle_window_edit.text())
+        field_tolerance = float(self.field_tolerance_edit.text())
+        iterations = max(int(self.iterations_edit.text()), 1)
+        return (max_val, min_val, steps_val, wait, samples, budget, settle_tolerance, settle_window, field_tolerance,
+                iterations)
+
+    # Define a function that shows the units of the sweep inputs
+    def update_sweep_units(self, field_mode):
+        """
+        :param field_mode: True when the sweep is defined in target fields.
+        """
+        name, unit = ('Field', 'G') if field_mode else ('Current', 'mA')
+        self.max_label.setText(f'Max {name} ({unit}):')
+        self.min_label.setText(f'Min {name} ({unit}):')
+        self.steps_label.setText(f'{name} Steps ({unit}):')
 
     def run_script(self):
         """
-        This function runs when the run button widget is clicked.
+        This function runs when the run button widget is clicked. It prepares the window and
+        starts the sweep loop in a worker thread.
         """
-        # Open Resources
-        supply = rm.open_resource('GPIB0::1::INSTR')  # KEPCO BOP20-20DL Power Supply
-        supply.clear()
-        gaussm = rm.open_resource('GPIB0::3::INSTR')  # Group3 DTM-133 Digital Teslameter
-
-        # Create a list to store the x and y data points
-        self.x_data = []
-        self.y_data = []
-
         # Get the input values from the line edits
-        max_val, min_val, steps_val, wait = self.read_inputs()
+        max_val, min_val, steps_val, wait, samples, budget, settle_tolerance, settle_window, field_tolerance, \
+            iterations = self.read_inputs()
+        self.samples = samples
+
+        # A field target sweep needs the calibration models of the magnet
+        field_mode = self.field_check.isChecked()
+        if field_mode:
+            try:
+                calibration = load_field_calibration()
+            except (OSError, ValueError) as e:
+                print(f"Could not load the calibration: {e}")
+                return
+        self.field_mode = field_mode
 
         # Reset progress bar
         self.progress_bar.setValue(0)
@@ -218,113 +319,277 @@ class MainWindow(QMainWindow):
         self.calib2_edit.setText("")
 
         # Clear the previous plot
-        self.canvas.figure.clear()
-
-        # Create a new set of subplots
-        self.ax = self.canvas.figure.add_subplot(111)
-        self.ax.set_xlabel('Current (mA)')
-        self.ax.set_ylabel('Magnetic Field (Oe)')
-        self.ax.set_title('Calibration Plot')
-
-        # Create an array of sweep values
-        curr_vals = np.arange(min_val, max_val + steps_val, steps_val)
-
-        # Create an array to store current values
-        current_data = []
-
-        # Create a list to store the magnetic field values
-        mfield_vals = []
-
-        # Loop through the sweep values and calculate proportional values
-        for val in curr_vals:
-
-            # If clause to check for abort button press
-            if self.button_bool == False:
-
-                # Set the current in ampere units
-                curr = round(supply_current2020(val/1000, 0.2)*1000)
-
-                # Store current data in current array
-                current_data.append(curr)
-
-                # Query the teslameter and store it in m_field variable
-                mfield = gaussm_query()
-                print(f"current: {curr}", f"mfield: {mfield}")
-
-                # Calculate the total number of data points to be plotted
-                data_points = ((max_val - min_val) / steps_val) + 1
-
-                # Add the data points to the x and y data lists
-                self.x_data.append(val)
-                self.y_data.append(mfield)
-
-                # Add the proportional value to the list
-                mfield_vals.append(mfield)
-
-                # Update the progress bar
-                current_index = len(mfield_vals)
-                progress = round(current_index / data_points * 100)
-                self.progress_bar.setValue(progress)
-
-                # Plot the current data point
-                self.ax.plot(self.x_data, self.y_data, linestyle='-', marker='o', color='r')
-
-                # Draw the plot on the canvas
-                self.canvas.draw()
+        self.live_plot.reset()
+        self.rendered_points = 0
+
+        # Create the sweep values. The adaptive sweep starts with a coarse grid and adds points
+        # where the field curves (saturation), on the grid of the step and within the point budget.
+        # Sweeping back down measures the descending branch of the hysteresis loop
+        round_trip = self.round_trip_check.isChecked()
+        adaptive = self.adaptive_check.isChecked() and not field_mode
+        curr_vals = calibration_sweep(min_val, max_val, steps_val, budget if adaptive else None, round_trip)
+        self.adaptive_sweep = curr_vals if adaptive else None
+        if round_trip and self.adaptive_sweep is not None:
+            print("The adaptive sweep only measures the ascending branch")
+        if field_mode and self.adaptive_check.isChecked():
+            print("The field target sweep uses fixed steps")
+
+        # Calculate the total number of data points to be plotted, an adaptive sweep can use less
+        self.data_points = len(curr_vals)
+
+        # Empty the data store, preallocated for the whole sweep, and the calibration fit
+        self.data_store.clear(capacity=self.data_points)
+        self.calibrator.reset()
+        self.settle_stats.reset()
+        self.convergence_stats.reset()
+        self.settle_stats_label.setText("")
+        self.timing.clear(capacity=self.data_points)
+        if self.profile_panel is not None:
+            self.profile_panel.clear()
+
+        # Wait for the field to settle after each current step, the wait becomes its timeout.
+        # Otherwise wait the fixed time between measurements
+        settle, fixed_wait = settle_settings(settle_tolerance, settle_window, wait)
+
+        # A field target sweep sets the current of each target from the calibration and corrects
+        # it until the field is within the tolerance, it waits after each current change
+        if field_mode:
+            measure = FieldFeedback(calibration, field_tolerance, iterations, samples, settle, fixed_wait)
+            fixed_wait = 0.0
+        else:
+            measure = partial(measure_point, samples=samples, settle=settle)
+
+        # Disable the run button until the sweep finishes
+        self.button_run.setEnabled(False)
+
+        # Stream every point to a data file while the sweep runs, the settings are also saved
+        # with the calibration models
+        self.sweep_metadata = {'min': min_val, 'max': max_val, 'steps': steps_val, 'wait': wait, 'samples': samples,
+                               'settle_tolerance': settle_tolerance, 'settle_window': settle_window,
+                               'adaptive_budget': budget if self.adaptive_sweep is not None else None,
+                               'round_trip': round_trip, 'model': self.model_combo.currentText(),
+                               'field_targets': field_mode, 'field_tolerance': field_tolerance,
+                               'max_iterations': iterations}
+        columns = FIELD_DATA_COLUMNS if field_mode else DATA_COLUMNS
+        writer = StreamingDataWriter(new_data_path('field_sweep' if field_mode else 'calibration'), columns,
+                                     metadata=self.sweep_metadata)
+        print(f"Saving data to {writer.path}")
+        self.data_path = writer.path
+
+        # Run the sweep loop in a worker thread, the points are sent back in batches. The sweep
+        # holds the instrument lock, so it doesn't start while another sweep uses the instruments
+        self.worker = SweepWorker(curr_vals, measure, wait=fixed_wait, setup=prepare_instruments,
+                                  cleanup=sweep_cleanup, writer=writer, lock=InstrumentLock(), timing=self.timing)
+        self.worker.points_ready.connect(self.add_points)
+        self.worker.finished.connect(self.sweep_finished)
+        self.worker.error.connect(self.sweep_error)
+        if self.button_bool:
+            self.worker.abort()
+        self.worker_thread = start_worker(self.worker)
+
+    # Define a function that adds the points measured by the worker
+    @pyqtSlot(list)
+    def add_points(self, points):
+        """
+        Adds a batch of points measured by the worker to the data store and schedules drawing them.
+        :param points: list of (index, current setpoint or target field, (current, magnetic
+            field, standard deviation, readings kept, settle time, settled, current and field
+            timestamps, and for a field target sweep the iterations, converged flag and field
+            error)) tuples.
+        """
+        setpoints = [point[1] for point in points]
+        currents, mfields, mfield_stds, kept, settle_times, settled, current_times, field_times = \
+            zip(*[point[2][:8] for point in points])
+        start = perf_counter()
+        for curr, mfield in zip(currents, mfields):
+            print(f"current: {curr}", f"mfield: {mfield}")
+        self.timing.add(points[0][0], points[-1][0] + 1, 'log', perf_counter() - start)
+
+        # Feedback iterations of a field target sweep, nan for a current sweep
+        if self.field_mode:
+            iterations, converged, errors = zip(*[point[2][8:] for point in points])
+            self.convergence_stats.add(iterations, converged, errors)
+        else:
+            iterations = converged = errors = np.full(len(points), np.nan)
 
-                # Wait between measurements
-                QApplication.processEvents()
-                sleep(wait/1000)
+        # Store the setpoint, current and magnetic field data
+        self.data_store.append(setpoints, currents, mfields, mfield_stds, kept, settle_times, settled, current_times,
+                               field_times, iterations, converged, errors)
 
-            # Else clause to end the program
-            else:
-                supply_current2020(0.0, 0.5)
-                supply.close()
-                gaussm.close()
-                self.calib_edit.setText("aborted")
-                self.calib2_edit.setText("aborted")
-                break
+        # Update the settle time statistics, only measured when waiting for the field to settle
+        if any(settle_times):
+            self.settle_stats.add(settle_times, settled)
 
-        # Supply current set to 0
-        print(f"Current set to {supply_current2020(0.0, 0.1)} A")
+        # Update the calibration constants with the new points
+        self.calibrator.add(currents, mfields)
 
-        # Close visa resources
-        supply.close()
-        gaussm.close()
+        # Show everything with the next frame
+        self.render_scheduler.request()
 
-        # Prepare the data to fit
-        np_current_data = np.array(current_data)
-        np_mfield_vals = np.array(mfield_vals)
-        data = np.column_stack((np_current_data, np_mfield_vals))
+    # Define a function that draws the points stored since the previous frame
+    def render_points(self):
+        """
+        Shows the statistics, the calibration constants, the progress and the points stored since
+        the previous frame. Runs at most at the frame rate of the render scheduler.
+        """
+        count = len(self.data_store)
+        start = perf_counter()
+        self.settle_stats_label.setText(self.statistics_summary())
+        self.show_calibration()
+
+        # Update the progress bar
+        progress = round(count / self.data_points * 100)
+        self.progress_bar.setValue(progress)
+
+        # Plot views of the stored columns with their error bars, drawn when each point averages
+        # several readings, and redraw only the plotted lines. The points of an adaptive sweep
+        # are drawn sorted by setpoint. A field target sweep is drawn against the measured current
+        order = self.adaptive_sweep.order(count) if self.adaptive_sweep is not None else None
+        x = self.data_store.column('current' if self.field_mode else 'setpoint')
+        field, field_std = self.data_store.column('field'), self.data_store.column('field_std')
+        new = slice(self.rendered_points, None)
+        self.live_plot.set_data('sweep', x, field, new_x=x[new], new_y=field[new],
+                                yerr=field_std if self.samples > 1 else None, new_yerr=field_std[new], order=order)
+        self.live_plot.update()
+        self.timing.add(self.rendered_points, count, 'plot', perf_counter() - start)
+        self.rendered_points = count
+        if self.profile_panel is not None:
+            self.profile_panel.update_timing(self.timing, self.data_points - count)
+
+    # Define a function to open the timing panel
+    def show_timing(self):
+        """
+        Shows the panel with the histograms of the time spent in each stage of the points and the
+        estimated time left of the sweep.
+        """
+        if self.profile_panel is None:
+            self.profile_panel = ProfilePanel()
+            self.profile_panel.setWindowTitle('Sweep Timing')
+            self.profile_panel.resize(600, 700)
+        self.profile_panel.show()
+        self.profile_panel.raise_()
+        remaining = self.data_points - len(self.data_store) if self.worker is not None else 0
+        self.profile_panel.update_timing(self.timing, remaining, force=True)
+
+    # Define a function that describes the settle and feedback statistics
+    def statistics_summary(self):
+        """
+        :return: text with the settle statistics and the feedback statistics of a field target
+            sweep, for the points that have them.
+        """
+        summaries = []
+        if self.settle_stats.count:
+            summaries.append(self.settle_stats.summary())
+        if self.convergence_stats.count:
+            summaries.append(self.convergence_stats.summary())
+        return "\n".join(summaries)
+
+    # Define a function that shows the calibration constants
+    def show_calibration(self):
+        """
+        Shows the current fit in the calibration line edits: a0 and R² in the first one, a1 and
+        the residual standard error in the second one.
+        """
+        fit = self.calibrator
+        self.calib_edit.setText(f"a0: {fit.intercept:.6g}   R²: {fit.r_squared:.6f}")
+        self.calib2_edit.setText(f"a1: {fit.slope:.6g}   s: {fit.residual_std:.4g} G")
+
+    # Define a function that prints the errors raised in the worker thread
+    @pyqtSlot(str)
+    def sweep_error(self, message):
+        print(f"Sweep error: {message}")
+
+    # Define a function that runs when the sweep loop ends
+    @pyqtSlot(bool)
+    def sweep_finished(self, aborted):
+        """
+        Fits the calibration constants and exports them once the sweep loop ended.
+        :param aborted: True if the sweep loop was aborted.
+        """
+        # Draw the last points and fit the plot limits to the final data
+        self.render_scheduler.flush()
+        self.live_plot.fit_to_data()
 
-        # Calculating calibration coefficients
-        data_to_fit = data
-        model = LinearRegression().fit(data_to_fit[:, 0].reshape((-1, 1)), data_to_fit[:, 1])  # linear regression
-        intercept = model.intercept_  # intercept
-        slope = model.coef_[0]  # slope
+        # Calibration coefficients, fitted point by point during the sweep
+        intercept = self.calibrator.intercept
+        slope = self.calibrator.slope
 
         # Add the constants to the line edit if abort button was not clicked
-        if self.button_bool == False:
-            self.calib_edit.setText(f"a0: {intercept}")
-            self.calib2_edit.setText(f"a1: {slope}")
+        if not aborted:
+            # An adaptive sweep can end before using its whole budget
+            self.progress_bar.setValue(100)
+            self.show_calibration()
             print("Calibration constants:")
             print(f"a1: {slope}")
             print(f"a0: {intercept}")
+            print(f"R^2: {self.calibrator.r_squared}")
+            print(f"Residual standard error: {self.calibrator.residual_std} G")
+            if self.settle_stats.count:
+                print(f"Field {self.settle_stats.summary()}")
+            if self.field_mode:
+                # The feedback corrections move the magnet around the hysteresis loop, so these
+                # points don't make a calibration
+                print(f"Field target sweep: {self.convergence_stats.summary()}")
+            else:
+                # Export the calibration file to the working directory, an aborted sweep keeps the
+                # previous one
+                self.calibrator.save(os.path.join(os.getcwd(), "calibration.txt"))
+                self.save_field_calibration()
         else:
+            self.calib_edit.setText("aborted")
+            self.calib2_edit.setText("aborted")
             print("Measurement aborted")
 
-        # Export the calibration file to the directory of this python file
-        path1 = os.getcwd().replace("\\", "/") + "/calibration.txt"
-        file1 = open(path1, "w+")
-        file1.writelines(f"{slope}" + "," + f"{intercept}")
-        file1.close()
+        # Export the time spent in each stage of every point next to the data file
+        path = timing_path(self.data_path)
+        self.timing.save(path)
+        print(f"Timing of the points saved to {path}")
+        if self.profile_panel is not None:
+            self.profile_panel.update_timing(self.timing, 0, force=True)
 
         # Update boolean value to run again if abort button is pressed
         self.button_bool = False
+        self.worker = None
+        self.button_run.setEnabled(True)
 
         # Print an empty line
         print("")
 
+    # Define a function to fit and export the calibration models
+    def save_field_calibration(self):
+        """
+        Fits the selected model to each branch of the sweep and writes calibration.json to the
+        working directory, next to calibration.txt.
+        """
+        model = self.sweep_metadata['model']
+        path = os.path.join(os.getcwd(), "calibration.json")
+        try:
+            calibration = FieldCalibration.fit(self.data_store.column('current'), self.data_store.column('field'),
+                                               model, metadata=self.sweep_metadata)
+            calibration.save(path)
+        except (ValueError, ImportError) as e:
+            print(f"Could not fit the {model} calibration: {e}")
+            return
+        print(f"Calibration models:\n{calibration.summary()}")
+        print(f"Calibration models saved to {path}")
+
+    # Define a function to stop the worker thread when the window is closed
+    def closeEvent(self, event):
+        """
+        Aborts a running sweep, waits for the worker thread and closes the instruments before
+        closing the window.
+        """
+        if self.worker is not None:
+            self.worker.abort()
+        if self.worker_thread is not None:
+            self.worker_thread.wait()
+        if self.profile_panel is not None:
+            self.profile_panel.close()
+
+        # Close visa resources
+        sessions.close_all()
+        super().closeEvent(event)
+
 
 if __name__ == '__main__':
     app = QApplication([])
@@ -0,0 +1,212 @@
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import perf_counter, sleep, time
+import numpy as np
+
+
+# Scale factor between the median absolute deviation and the standard deviation of normal noise
+MAD_TO_STD = 1.4826
+
+# Value read from an instrument, with the time the reading started (seconds since the epoch) and
+# its duration in seconds
+Reading = namedtuple('Reading', ['value', 'timestamp', 'duration'])
+
+
+# Define a function to summarize bursts of readings
+def burst_statistics(samples, threshold=3.5):
+    """
+    Mean and standard deviation of bursts of readings after rejecting the outliers.
+
+    A reading is rejected when its distance to the median of its burst is more than threshold
+    times the median absolute deviation (scaled to a standard deviation), which unlike a cut on
+    the standard deviation isn't inflated by the outliers themselves. Bursts whose readings are
+    mostly identical (zero deviation, e.g. a quantized instrument) are kept whole. Everything is
+    vectorized, so a whole sweep of bursts can be summarized at once.
+    :param samples: array of readings of shape (samples,) for one burst or (points, samples).
+    :param threshold: rejection threshold in scaled median absolute deviations.
+    :return: tuple of float64 arrays (mean, std, kept) with one value per burst: the mean and
+        standard deviation (ddof=1, 0 for a single reading) of the kept readings and their number.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if samples.shape[-1] == 1:
+        # A single reading has nothing to reject or average
+        shape = samples.shape[:-1]
+        return samples[..., 0], np.zeros(shape), np.ones(shape)
+
+    median = np.median(samples, axis=-1, keepdims=True)
+    deviation = np.abs(samples - median)
+    mad = np.median(deviation, axis=-1, keepdims=True) * MAD_TO_STD
+    keep = (deviation <= threshold * mad) | (mad == 0)
+
+    kept = keep.sum(axis=-1)
+    mean = np.where(keep, samples, 0.0).sum(axis=-1) / kept
+    squares = np.where(keep, samples - mean[..., None], 0.0) ** 2
+    std = np.sqrt(squares.sum(axis=-1) / np.maximum(kept - 1, 1))
+    return mean, std, kept.astype(np.float64)
+
+
+# Define a function to wait until a reading stops drifting
+def wait_settled(read, tolerance, window, timeout, interval=0.0):
+    """
+    Polls an instrument until its reading settles, e.g. the field of the magnet after a current step.
+
+    The readings of the last window are split in two halves and the reading is settled when the
+    means of both halves differ by at most tolerance. Comparing the means instead of consecutive
+    readings makes the test insensitive to the reading noise and to the polling rate, a slow
+    exponential approach still shows as a drift between the halves. The window should be about
+    the settling time constant: the smallest settle time is one window, and a shorter window lets
+    a slow drift through.
+    :param read: function returning a reading.
+    :param tolerance: maximum drift between the means of the two halves of the window.
+    :param window: duration in seconds of the window of readings.
+    :param timeout: maximum time in seconds spent polling.
+    :param interval: extra time in seconds between two readings, 0 to poll as fast as the bus allows.
+    :return: tuple (settle time in seconds, settled) with settled False if the timeout was reached.
+    """
+    start = perf_counter()
+    readings = deque()
+    while True:
+        value = float(read())
+        now = perf_counter() - start
+        readings.append((now, value))
+
+        # Keep the readings of the last window, once the polling lasted a whole window
+        while readings[0][0] < now - window:
+            readings.popleft()
+        if now >= window and len(readings) >= 4:
+            times, values = np.array(readings).T
+            older = times < now - window / 2
+            if 0 < older.sum() < len(values) and abs(values[~older].mean() - values[older].mean()) <= tolerance:
+                return now, True
+
+        if now >= timeout:
+            return now, False
+        if interval > 0:
+            sleep(interval)
+
+
+class SettleStatistics:
+    """
+    Running statistics of the settle times of a sweep.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.timeouts = 0
+
+    # Define a function to add the settle times of a batch of points
+    def add(self, times, settled):
+        """
+        :param times: sequence with the settle time in seconds of each point.
+        :param settled: sequence with False for the points that reached the timeout.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        if times.size == 0:
+            return
+        self.count += times.size
+        self.total += float(times.sum())
+        self.maximum = max(self.maximum, float(times.max()))
+        self.timeouts += int(np.count_nonzero(~np.asarray(settled, dtype=bool)))
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else float('nan')
+
+    def summary(self):
+        """
+        :return: text with the mean and maximum settle time and the number of timeouts.
+        """
+        return (f"settle mean {self.mean * 1e3:.0f} ms, max {self.maximum * 1e3:.0f} ms, "
+                f"{self.timeouts} timeouts of {self.count} points")
+
+
+class ConvergenceStatistics:
+    """
+    Running statistics of the feedback iterations of a field target sweep.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+        self.failures = 0
+        self.max_error = 0.0
+
+    # Define a function to add the iterations of a batch of points
+    def add(self, iterations, converged, errors):
+        """
+        :param iterations: sequence with the number of current settings of each point.
+        :param converged: sequence with False for the points that ended outside the tolerance.
+        :param errors: sequence with the final field error in G of each point.
+        """
+        iterations = np.asarray(iterations, dtype=np.int64)
+        if iterations.size == 0:
+            return
+        self.count += iterations.size
+        self.total += int(iterations.sum())
+        self.maximum = max(self.maximum, int(iterations.max()))
+        self.failures += int(np.count_nonzero(~np.asarray(converged, dtype=bool)))
+        self.max_error = max(self.max_error, float(np.max(np.abs(errors))))
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else float('nan')
+
+    def summary(self):
+        """
+        :return: text with the mean and maximum iterations, the points that didn't converge and
+            the largest field error.
+        """
+        return (f"feedback mean {self.mean:.2f} iterations, max {self.maximum}, {self.failures} not converged "
+                f"of {self.count} points, max error {self.max_error:.3g} G")
+
+
+class ConcurrentReader:
+    """
+    Reads independent instruments at the same time.
+
+    Each read function runs in a thread of a persistent pool, so the time of a point is the
+    slowest reading instead of the sum of all of them, and adding an instrument doesn't add its
+    latency. The instruments must have their own VISA sessions, the VISA calls release the GIL
+    while they wait for the answers.
+    """
+
+    def __init__(self, max_workers=4):
+        """
+        :param max_workers: maximum number of instruments read at the same time.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ConcurrentReader')
+
+    # Define a function to read every instrument of a point
+    def read(self, readers):
+        """
+        :param readers: dict with a read function, called without arguments, for each name.
+        :return: dict with the Reading of each name. If a read function raised an exception, it is
+            raised once every reading ended, so no instrument is left in the middle of a query.
+        """
+        if len(readers) == 1:
+            # Nothing to overlap, read in the calling thread
+            return {name: _timed_read(read) for name, read in readers.items()}
+
+        futures = {name: self._executor.submit(_timed_read, read) for name, read in readers.items()}
+        wait(futures.values())
+        return {name: future.result() for name, future in futures.items()}
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+# Define a function to time a reading
+def _timed_read(read):
+    timestamp = time()
+    start = perf_counter()
+    value = read()
+    return Reading(value, timestamp, perf_counter() - start)
@@ -0,0 +1,185 @@
+import math
+import numpy as np
+
+
+class AdaptiveSweep:
+    """
+    Sweep whose points are chosen from the measured response.
+
+    The sweep starts with a coarse uniform grid and then refines it in passes. Before each pass
+    every interval between two measured points gets a loss: the local curvature of the response
+    (how far its end points are from the straight line through their neighbours, relative to the
+    range of the response), which estimates the error of the interpolated curve, plus a small
+    term proportional to its width. Flat or linear regions are then sampled sparsely and the
+    points go where the response bends (saturation, resonances). The worst intervals are split at
+    their midpoint. The sweep stops when the point budget is used or every loss is below the
+    tolerance.
+
+    The points of each pass are measured in the sweep direction, so every pass is a monotonic
+    sweep. The sweep runs over a parameter going from start to stop, mapped to the sweep values by
+    position, e.g. the distance along a multi segment path.
+
+    Iterate over the sweep to get the values and call record with the result of each value before
+    asking for the next one (SweepWorker does it).
+    """
+
+    def __init__(self, start, stop, budget, min_step=0.0, initial_points=None, pass_fraction=0.25, uniform=0.05,
+                 tolerance=0.0, response=None, position=None):
+        """
+        :param start: first value of the sweep parameter.
+        :param stop: last value of the sweep parameter.
+        :param budget: maximum number of points.
+        :param min_step: smallest distance between two points, the points are also kept on a grid
+            of this step starting at start. 0 to disable.
+        :param initial_points: number of points of the coarse grid, defaults to a quarter of the
+            budget (at least 5).
+        :param pass_fraction: maximum number of points added by a refinement pass, as a fraction
+            of the points already measured.
+        :param uniform: weight of the width term of the loss, relative to the curvature. It keeps
+            refining the intervals where the coarse grid missed a feature.
+        :param tolerance: stop refining when every interval loss is below this value, about the
+            interpolation error as a fraction of the range of the response.
+        :param response: function returning the measured value (float) from a measurement result.
+            Defaults to the result itself, or its first item if it is a tuple.
+        :param position: function mapping the sweep parameter to the sweep value, identity by default.
+        """
+        self.start = float(start)
+        self.stop = float(stop)
+        self.budget = max(int(budget), 2)
+        self.min_step = abs(float(min_step))
+        if initial_points is None:
+            initial_points = max(5, self.budget // 4)
+        self.initial_points = min(max(int(initial_points), 2), self.budget)
+        self.pass_fraction = pass_fraction
+        self.uniform = uniform
+        self.tolerance = tolerance
+        self.response = response if response is not None else _default_response
+        self.position = position if position is not None else float
+        self.passes = 0
+        self.yielded = 0
+        self._params = []
+        self._values = []
+        self._pending = None
+
+    def __len__(self):
+        """
+        Maximum number of points of the sweep, the sweep can end earlier.
+        """
+        return self.budget
+
+    def __iter__(self):
+        self._params = []
+        self._values = []
+        self.passes = 0
+        self.yielded = 0
+        for params in self._passes():
+            self.passes += 1
+            for param in params:
+                self._pending = param
+                self.yielded += 1
+                yield self.position(param)
+
+    # Define a function to feed back a measurement
+    def record(self, result):
+        """
+        Records the result of the last value given by the sweep.
+        :param result: measurement result, the response function is applied to it.
+        """
+        if self._pending is not None:
+            self._params.append(self._pending)
+            self._values.append(float(self.response(result)))
+            self._pending = None
+
+    @property
+    def count(self):
+        return len(self._params)
+
+    # Define a function to sort the measured points along the sweep
+    def order(self, count=None):
+        """
+        The points are measured pass by pass, not in the sweep order, so they have to be sorted to
+        be plotted as a line.
+        :param count: number of measured points to sort, all of them by default.
+        :return: array with the indices sorting the first count measured points along the sweep.
+        """
+        params = np.asarray(self._params[:count], dtype=np.float64)
+        return np.argsort(params, kind='stable')[::self._direction()]
+
+    def _snap(self, params):
+        """
+        Moves parameters to the min_step grid starting at start, without leaving the sweep range.
+        """
+        if self.min_step == 0:
+            return params
+        params = self.start + np.round((params - self.start) / self.min_step) * self.min_step
+        return np.clip(params, min(self.start, self.stop), max(self.start, self.stop))
+
+    def _passes(self):
+        """
+        Generates the arrays of parameters measured by each pass.
+        """
+        # Coarse uniform grid, its ends are the exact start and stop even if they aren't on the grid
+        grid = self._snap(np.linspace(self.start, self.stop, self.initial_points))
+        grid[0], grid[-1] = self.start, self.stop
+        yield np.unique(grid)[::self._direction()]
+
+        while self.yielded < self.budget:
+            params = self._refinement(self.budget - self.yielded)
+            if params.size == 0:
+                return
+            yield params
+
+    def _direction(self):
+        return 1 if self.stop >= self.start else -1
+
+    # Define a function to compute the loss of every interval
+    def losses(self):
+        """
+        :return: tuple with the sorted measured parameters and the loss of each of the intervals
+            between them.
+        """
+        params = np.asarray(self._params, dtype=np.float64)
+        values = np.asarray(self._values, dtype=np.float64)
+        finite = np.isfinite(values)
+        params, values = params[finite], values[finite]
+        order = np.argsort(params)
+        params, values = params[order], values[order]
+        if params.size < 2:
+            return params, np.zeros(0)
+
+        # Distance of each interior point to the line through its neighbours
+        curvature = np.zeros(params.size)
+        if params.size > 2:
+            left, right = params[:-2], params[2:]
+            fraction = (params[1:-1] - left) / (right - left)
+            line = values[:-2] + fraction * (values[2:] - values[:-2])
+            curvature[1:-1] = np.abs(values[1:-1] - line)
+        scale = np.ptp(values) or 1.0
+        span = abs(self.stop - self.start) or 1.0
+
+        width = np.diff(params) / span
+        losses = np.maximum(curvature[:-1], curvature[1:]) / scale + self.uniform * width
+
+        # Intervals that can't be split on the min_step grid are done
+        losses[np.diff(params) < 2 * self.min_step - 1e-12 * span] = 0.0
+        return params, losses
+
+    def _refinement(self, remaining):
+        """
+        :param remaining: number of points left in the budget.
+        :return: array with the parameters of the next pass, in sweep order.
+        """
+        params, losses = self.losses()
+        size = min(remaining, max(1, math.ceil(self.pass_fraction * params.size)))
+        worst = np.argsort(losses)[::-1][:size]
+        worst = worst[(losses[worst] > 0) & (losses[worst] > self.tolerance)]
+
+        # Split the worst intervals at their midpoint, on the min_step grid
+        new_params = self._snap((params[worst] + params[worst + 1]) / 2)
+        inside = (new_params > params[worst]) & (new_params < params[worst + 1])
+        return np.sort(new_params[inside])[::self._direction()]
+
+
+# Define the default response function of the adaptive sweep
+def _default_response(result):
+    return result[0] if isinstance(result, tuple) else result
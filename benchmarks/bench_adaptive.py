@@ -0,0 +1,75 @@
+"""
+Accuracy comparison between the fixed step sweeps and the adaptive sweeps of adaptive_sweep.py.
+
+Both sweeps measure simulated responses: the field of an electromagnet that saturates and a
+narrow resonance on a flat background. For a number of points (instrument round trips) the
+benchmark reports the maximum error of the curve interpolated between the measured points, and
+the number of points each sweep needs to reach a target error. Run it from the repository root:
+
+    python benchmarks/bench_adaptive.py
+"""
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from adaptive_sweep import AdaptiveSweep
+
+START, STOP, MIN_STEP = -1000.0, 1000.0, 1.0
+RESPONSES = {
+    'magnet': lambda current: 0.15 * current + 2500 * np.tanh(current / 80),
+    'resonance': lambda current: 1.0 / (1 + ((current - 230) / 15) ** 2),
+}
+TARGET = 0.01
+
+
+# Define a function to get the interpolation error of a set of measured points
+def max_error(response, params):
+    """
+    :return: maximum error of the linear interpolation of the measured points, relative to the
+        range of the response.
+    """
+    fine = np.linspace(START, STOP, 200001)
+    exact = response(fine)
+    params = np.sort(params)
+    return np.max(np.abs(np.interp(fine, params, response(params)) - exact)) / np.ptp(exact)
+
+
+# Define a function to run the sweeps
+def uniform_params(points):
+    return np.linspace(START, STOP, points)
+
+
+def adaptive_params(response, points):
+    sweep = AdaptiveSweep(START, STOP, points, min_step=MIN_STEP)
+    params = []
+    for value in sweep:
+        params.append(value)
+        sweep.record(response(value))
+    return np.asarray(params)
+
+
+# Define a function to find the number of points reaching the target error
+def points_for_target(error_of):
+    points = 8
+    while error_of(points) > TARGET and points < 100000:
+        points = int(points * 1.25) + 1
+    return points
+
+
+def main():
+    for name, response in RESPONSES.items():
+        print(f"{name}: maximum interpolation error (fraction of the range)")
+        print(f"{'points':>8} {'fixed step':>12} {'adaptive':>12}")
+        for points in [25, 50, 100, 200, 400]:
+            print(f"{points:>8} {max_error(response, uniform_params(points)):>12.2e} "
+                  f"{max_error(response, adaptive_params(response, points)):>12.2e}")
+
+        uniform = points_for_target(lambda points: max_error(response, uniform_params(points)))
+        adaptive = points_for_target(lambda points: max_error(response, adaptive_params(response, points)))
+        print(f"    points for an error below {TARGET:g}: fixed step {uniform}, adaptive {adaptive} "
+              f"({uniform / adaptive:.1f}x fewer round trips)\n")
+
+
+if __name__ == '__main__':
+    main()
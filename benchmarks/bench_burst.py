@@ -0,0 +1,47 @@
+"""
+Timing comparison between reading the teslameter once per sample and in bursts of chained
+queries with the DTM133 driver, plus the cost of summarizing the bursts.
+
+The teslameter is the simulated one of simulated_instruments.py, with a fixed latency per bus
+transaction, so the benchmark runs without the GPIB bench. Run it from the repository root:
+
+    python benchmarks/bench_burst.py
+"""
+import os
+import sys
+from time import perf_counter
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acquisition import burst_statistics
+from instruments import DTM133
+from simulated_instruments import SimulatedResourceManager
+
+POINTS = 20
+
+
+def main():
+    rm = SimulatedResourceManager(latency=0.002)
+
+    print(f"{'samples':>8} {'reading':<10} {'time/point (ms)':>16} {'transactions/point':>19}")
+    for samples in [1, 5, 20, 100]:
+        for burst in [False, True]:
+            resource = rm.open_resource('GPIB0::3::INSTR')
+            teslameter = DTM133(resource, burst=burst)
+            start = perf_counter()
+            for _ in range(POINTS):
+                burst_statistics(teslameter.read_fields(samples))
+            elapsed = (perf_counter() - start) / POINTS
+            print(f"{samples:>8} {'burst' if burst else 'one by one':<10} {elapsed * 1e3:>16.2f} "
+                  f"{resource.transactions / POINTS:>19.1f}")
+
+    # Vectorized summary of a whole sweep of bursts
+    readings = np.random.default_rng(0).normal(0, 1, (100000, 20))
+    start = perf_counter()
+    burst_statistics(readings)
+    elapsed = perf_counter() - start
+    print(f"\nburst_statistics of 100000 bursts of 20 readings: {elapsed * 1e3:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Accuracy and timing comparison between the incremental LinearCalibrator of calibration.py and
+the scikit-learn LinearRegression fit that Calibration_GUI.py used to run at the end of a sweep.
+
+The data are synthetic calibration sweeps (field = a1 * current + a0 + noise) around a small and
+a large current offset, fed to the calibrator in batches like the sweep worker does. The
+reference fit is a least squares solve on centered data with numpy. scikit-learn is optional,
+its column is skipped if it isn't installed. Run it from the repository root:
+
+    python benchmarks/bench_calibration.py
+"""
+import os
+import subprocess
+import sys
+from time import perf_counter
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from calibration import LinearCalibrator
+
+try:
+    from sklearn.linear_model import LinearRegression
+except ImportError:
+    LinearRegression = None
+
+SLOPE = 0.15
+INTERCEPT = -3.0
+BATCH = 16
+
+
+# Define a function to build a synthetic calibration sweep
+def make_sweep(points, offset, seed=0):
+    rng = np.random.default_rng(seed)
+    current = offset + np.linspace(-5000, 5000, points)
+    field = SLOPE * current + INTERCEPT + rng.normal(0, 0.5, points)
+    return current, field
+
+
+# Define a function for the reference fit
+def reference_fit(current, field):
+    """
+    :return: slope and intercept of a least squares fit done on centered data.
+    """
+    mean_x = current.mean()
+    mean_y = field.mean()
+    slope = np.linalg.lstsq((current - mean_x)[:, None], field - mean_y, rcond=None)[0][0]
+    return slope, mean_y - slope * mean_x
+
+
+# Define a function for the textbook running sums, kept to show why the centered updates are used
+def naive_fit(current, field):
+    n = current.size
+    sx, sy = current.sum(), field.sum()
+    sxx, sxy = (current * current).sum(), (current * field).sum()
+    slope = (sxy - sx * sy / n) / (sxx - sx * sx / n)
+    return slope, (sy - slope * sx) / n
+
+
+# Define a function to run the incremental fit batch by batch
+def incremental_fit(current, field):
+    calibrator = LinearCalibrator()
+    for start in range(0, current.size, BATCH):
+        calibrator.add(current[start:start + BATCH], field[start:start + BATCH])
+    return calibrator.slope, calibrator.intercept
+
+
+# Define a function to fit with scikit-learn
+def sklearn_fit(current, field):
+    model = LinearRegression().fit(current.reshape((-1, 1)), field)
+    return model.coef_[0], model.intercept_
+
+
+# Define a function to measure the import time of scikit-learn in a fresh interpreter
+def sklearn_import_time():
+    code = "from time import perf_counter; s = perf_counter(); " \
+           "import sklearn.linear_model; print(perf_counter() - s)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    return float(result.stdout) if result.returncode == 0 else None
+
+
+def main():
+    fits = [('LinearCalibrator', incremental_fit), ('naive sums', naive_fit)]
+    if LinearRegression is not None:
+        fits.append(('sklearn LinearRegression', sklearn_fit))
+    else:
+        print("scikit-learn is not installed, its fit is skipped")
+
+    print(f"{'fit':<26} {'points':>8} {'offset (mA)':>12} {'time (ms)':>10} {'us/point':>9} "
+          f"{'slope error':>12} {'intercept error':>16}")
+    for points in [1000, 100000]:
+        for offset in [0.0, 1e9]:
+            current, field = make_sweep(points, offset)
+            ref_slope, ref_intercept = reference_fit(current, field)
+            for label, fit in fits:
+                start = perf_counter()
+                slope, intercept = fit(current, field)
+                elapsed = perf_counter() - start
+                print(f"{label:<26} {points:>8} {offset:>12.0e} {elapsed * 1e3:>10.2f} {elapsed / points * 1e6:>9.2f} "
+                      f"{abs(slope - ref_slope):>12.2e} {abs(intercept - ref_intercept):>16.2e}")
+
+    if LinearRegression is not None:
+        import_time = sklearn_import_time()
+        if import_time is not None:
+            print(f"\nimport sklearn.linear_model: {import_time * 1e3:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Time per point of reading the instruments of a point one after the other and concurrently with
+acquisition.ConcurrentReader.
+
+The instruments are the simulated ones of simulated_instruments.py, each with its own session and
+bus latency: the power supply current, a burst of teslameter readings and, for three channels, a
+second teslameter probe. Run it from the repository root:
+
+    python benchmarks/bench_concurrent_reads.py
+"""
+import os
+import sys
+from functools import partial
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acquisition import ConcurrentReader, burst_statistics
+from instruments import DTM133, KepcoBOP
+from simulated_instruments import SimulatedResourceManager
+
+POINTS = 50
+SAMPLES = 10
+
+
+# Define a function to read a burst of the teslameter
+def read_burst(teslameter):
+    return burst_statistics(teslameter.read_fields(SAMPLES))
+
+
+def main():
+    rm = SimulatedResourceManager(latency=0.005, command_latency={'curr?': 0.01})
+    supply = KepcoBOP(rm.open_resource('GPIB0::1::INSTR'))
+    readers = {
+        'current': supply.read_current,
+        'field': partial(read_burst, DTM133(rm.open_resource('GPIB0::3::INSTR'))),
+        'second probe': partial(read_burst, DTM133(rm.open_resource('GPIB0::3::INSTR'))),
+    }
+    point_reader = ConcurrentReader()
+
+    print(f"{'channels':>8} {'sequential (ms)':>16} {'concurrent (ms)':>16} {'slowest channel (ms)':>21}")
+    for channels in [1, 2, 3]:
+        selected = dict(list(readers.items())[:channels])
+
+        start = perf_counter()
+        for _ in range(POINTS):
+            for read in selected.values():
+                read()
+        sequential = (perf_counter() - start) / POINTS
+
+        slowest = 0.0
+        start = perf_counter()
+        for _ in range(POINTS):
+            readings = point_reader.read(selected)
+            slowest += max(reading.duration for reading in readings.values())
+        concurrent = (perf_counter() - start) / POINTS
+        print(f"{channels:>8} {sequential * 1e3:>16.2f} {concurrent * 1e3:>16.2f} {slowest / POINTS * 1e3:>21.2f}")
+
+    # Cost of the thread pool itself
+    no_op = {'a': lambda: None, 'b': lambda: None, 'c': lambda: None}
+    start = perf_counter()
+    for _ in range(10000):
+        point_reader.read(no_op)
+    print(f"\nConcurrentReader overhead for 3 channels: {(perf_counter() - start) / 10000 * 1e6:.0f} us/point")
+    point_reader.close()
+
+
+if __name__ == '__main__':
+    main()
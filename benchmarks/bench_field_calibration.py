@@ -0,0 +1,126 @@
+"""
+Accuracy and lookup speed of the calibration models of field_calibration.py compared to the
+two-constant calibration.txt.
+
+The calibration sweep goes up and back down on the quasi-static loop of the simulated magnet
+(saturating iron core with hysteresis, simulated_instruments.py) with teslameter noise. Each model
+is fitted per branch and asked for the currents giving fields spread over each branch; the error
+is the difference with the true current of that branch. The lookup benchmark converts a sweep of
+fields to currents in one call (first call, which computes the table of the inverse, and the
+next calls) and compares it with solving the polynomial for every point in a loop, the way a
+nonlinear calibration is inverted by hand. Run it from the repository root:
+
+    python benchmarks/bench_field_calibration.py
+    python benchmarks/bench_field_calibration.py --step 250 --noise 1
+"""
+import argparse
+import os
+import sys
+from time import perf_counter
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from calibration import LinearCalibrator
+from field_calibration import BranchModel, FieldCalibration
+from simulated_instruments import SimulatedMagnet
+
+MODELS = [('poly', {'degree': 5}), ('piecewise', {'knots': 12}), ('spline', {})]
+
+
+# Define a function to measure the quasi-static loop of the simulated magnet
+def measure_loop(magnet, currents, noise, seed=0):
+    """
+    :param currents: array of currents in mA, in the order they are swept.
+    :return: array of fields in G.
+    """
+    random = np.random.default_rng(seed)
+    core = 0.0
+    fields = []
+    for current in currents / 1000:
+        core = min(max(core, current - magnet.coercive_current), current + magnet.coercive_current)
+        fields.append(magnet.equilibrium_field(current, core))
+    return np.array(fields) + random.normal(0.0, noise, len(fields))
+
+
+# Define a function to get the true fields of each branch
+def branch_truth(magnet, currents):
+    up = [magnet.equilibrium_field(current, current - magnet.coercive_current) for current in currents / 1000]
+    down = [magnet.equilibrium_field(current, current + magnet.coercive_current) for current in currents / 1000]
+    return np.array(up), np.array(down)
+
+
+# Define a function to invert a polynomial point by point
+def solve_each(series, fields, low, high):
+    currents = []
+    for field in fields:
+        roots = (series - field).roots()
+        real = roots.real[(abs(roots.imag) < 1e-9) & (roots.real >= low) & (roots.real <= high)]
+        currents.append(real[0] if real.size else np.nan)
+    return np.array(currents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max', type=float, default=10000, help='highest current in mA')
+    parser.add_argument('--step', type=float, default=500, help='current step in mA')
+    parser.add_argument('--noise', type=float, default=0.5, help='teslameter noise in G')
+    parser.add_argument('--lookups', type=int, default=1000000, help='size of the converted sweep')
+    args = parser.parse_args()
+
+    magnet = SimulatedMagnet()
+    setpoints = np.arange(0, args.max + args.step, args.step)
+    currents = np.concatenate([setpoints, setpoints[-2::-1]])
+    fields = measure_loop(magnet, currents, args.noise)
+
+    # Currents of the test fields, away from the ends where a branch starts at the turning point
+    test_currents = np.linspace(0.05 * args.max, 0.95 * args.max, 200)
+    up_fields, down_fields = branch_truth(magnet, test_currents)
+
+    # calibration.txt: one line fitted to every point
+    line = LinearCalibrator()
+    line.add(currents, fields)
+    legacy = FieldCalibration(BranchModel('linear', {'coef': [line.intercept, line.slope], 'domain': [-1.0, 1.0]},
+                                          (-np.inf, np.inf)))
+    calibrations = [('calibration.txt', legacy)]
+    for model, options in MODELS:
+        try:
+            calibrations.append((model, FieldCalibration.fit(currents, fields, model, **options)))
+        except ImportError as e:
+            print(f"{model} skipped: {e}")
+
+    print(f"Sweep 0..{args.max:g}..0 mA by {args.step:g} mA ({currents.size} points), noise {args.noise:g} G")
+    print(f"{'model':>16} {'up max (mA)':>12} {'up rms (mA)':>12} {'down max (mA)':>14} {'down rms (mA)':>14}")
+    for name, calibration in calibrations:
+        row = f"{name:>16}"
+        for branch, truth in (('up', up_fields), ('down', down_fields)):
+            error = calibration.current(truth, branch) - test_currents
+            row += f" {np.nanmax(abs(error)):>{12 if branch == 'up' else 14}.2f}"
+            row += f" {np.sqrt(np.nanmean(error ** 2)):>{12 if branch == 'up' else 14}.2f}"
+        print(row)
+
+    # Convert a sweep of fields going up and down to currents
+    poly = dict(calibrations)['poly']
+    sweep = np.concatenate([np.linspace(up_fields[0], up_fields[-1], args.lookups // 2),
+                            np.linspace(down_fields[-1], down_fields[0], args.lookups // 2)])
+    # New branch models, the accuracy test already computed the tables of the inverse
+    poly = FieldCalibration(BranchModel.from_dict(poly.up.to_dict()), BranchModel.from_dict(poly.down.to_dict()))
+    start = perf_counter()
+    poly.current(sweep)
+    first = perf_counter() - start
+    start = perf_counter()
+    poly.current(sweep)
+    cached = perf_counter() - start
+
+    each_size = min(2000, sweep.size)
+    start = perf_counter()
+    solve_each(poly.up._evaluate, sweep[:each_size], *poly.up.current_range)
+    each = (perf_counter() - start) / each_size
+
+    print(f"\nField to current of {sweep.size} points (poly model, both branches)")
+    print(f"{'root per point':>16} {each * 1e6:>9.3f} us/point")
+    print(f"{'first call':>16} {first / sweep.size * 1e6:>9.3f} us/point")
+    print(f"{'cached':>16} {cached / sweep.size * 1e6:>9.3f} us/point ({each * sweep.size / cached:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Field error, iterations and time per point of the field target sweep of Calibration_GUI.py.
+
+A calibration sweep (up and back down, waiting for the field to settle) is measured on the
+simulated instruments, then the same target fields are swept up and back down with:
+    the linear constants of calibration.txt, setting the current once (the hand conversion),
+    the per branch models of calibration.json, setting the current once,
+    feedback seeded by the linear constants,
+    feedback seeded by the per branch models (the field target sweep).
+The simulation settings can be given with SWEEP_SIMULATION_CONFIG. Run it from the repository root:
+
+    python benchmarks/bench_field_targets.py
+    python benchmarks/bench_field_targets.py --tolerance 0.5 --samples 4
+"""
+import argparse
+import os
+import sys
+from time import perf_counter
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['SWEEP_SIMULATE'] = '1'
+import calibration_acquisition
+from acquisition import ConvergenceStatistics
+from calibration import LinearCalibrator
+from field_calibration import BranchModel, FieldCalibration
+
+
+# Define a function to sweep the target fields with a measurement
+def sweep_targets(measure, targets):
+    """
+    :return: tuple with the field errors, the ConvergenceStatistics and the time per point in s.
+    """
+    stats = ConvergenceStatistics()
+    errors = []
+    start = perf_counter()
+    for target in targets:
+        result = measure(target)
+        errors.append(result[10])
+        stats.add([result[8]], [result[9]], [result[10]])
+    return np.array(errors), stats, (perf_counter() - start) / len(targets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max-current', type=float, default=8000, help='highest calibration current in mA')
+    parser.add_argument('--step', type=float, default=500, help='calibration step in mA')
+    parser.add_argument('--targets', type=float, nargs=3, default=[300, 3000, 250],
+                        help='first and last target field and step in G')
+    parser.add_argument('--tolerance', type=float, default=1.0, help='field tolerance in G')
+    parser.add_argument('--iterations', type=int, default=6, help='maximum iterations per point')
+    parser.add_argument('--samples', type=int, default=1, help='teslameter readings per reading')
+    args = parser.parse_args()
+
+    calibration_acquisition.find_instruments()
+    calibration_acquisition.prepare_instruments()
+    settle = (0.5, 0.2, 3.0)
+
+    # Calibration sweep
+    setpoints = calibration_acquisition.calibration_sweep(0, args.max_current, args.step, round_trip=True)
+    results = [calibration_acquisition.measure_point(setpoint, settle=settle) for setpoint in setpoints]
+    currents, fields = [result[0] for result in results], [result[1] for result in results]
+    line = LinearCalibrator()
+    line.add(currents, fields)
+    legacy = FieldCalibration(BranchModel('linear', {'coef': [line.intercept, line.slope], 'domain': [-1.0, 1.0]},
+                                          (-np.inf, np.inf)))
+    models = FieldCalibration.fit(currents, fields, 'poly')
+
+    targets = calibration_acquisition.calibration_sweep(*args.targets, round_trip=True)
+    print(f"{len(targets)} target fields {args.targets[0]:g}..{args.targets[1]:g}..{args.targets[0]:g} G, "
+          f"tolerance {args.tolerance:g} G, {args.samples} readings per reading")
+    print(f"{'mode':>28} {'max err (G)':>12} {'rms err (G)':>12} {'in tol.':>8} {'iterations':>11} {'s/point':>8}")
+    for label, calibration, iterations in [('calibration.txt, open loop', legacy, 1),
+                                           ('per branch, open loop', models, 1),
+                                           ('calibration.txt + feedback', legacy, args.iterations),
+                                           ('per branch + feedback', models, args.iterations)]:
+        measure = calibration_acquisition.FieldFeedback(calibration, args.tolerance, iterations, args.samples, settle)
+        calibration_acquisition.measure_point(0, settle=settle)
+        errors, stats, time_per_point = sweep_targets(measure, targets)
+        inside = np.mean(abs(errors) <= args.tolerance) * 100
+        print(f"{label:>28} {np.max(abs(errors)):>12.2f} {np.sqrt(np.mean(errors ** 2)):>12.2f} {inside:>7.0f}% "
+              f"{stats.mean:>11.2f} {time_per_point:>8.2f}")
+    calibration_acquisition.sweep_cleanup(False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Throughput of the headless runner sweep_cli.py compared to the same path sweep run in
+gui_plot_paths.py.
+
+Each sweep runs in its own process with no wait between points: the window through
+bench_sweep_loop.py (Qt offscreen platform) and the headless runner from a settings file. The
+benchmark also checks that the runner doesn't import Qt or matplotlib. Run it from the repository
+root:
+
+    python benchmarks/bench_headless.py
+    python benchmarks/bench_headless.py --sizes 1000 10000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIZES = [1000, 10000, 100000]
+
+# Script run in a fresh interpreter to list the GUI modules loaded by a headless sweep
+MODULES_SCRIPT = """
+import sys
+import sweep_cli
+sys.argv = ['sweep_cli.py', sys.argv[1], '--quiet']
+try:
+    sweep_cli.main()
+except SystemExit:
+    pass
+print(sorted({name.split('.')[0] for name in sys.modules if name.startswith(('PyQt5', 'matplotlib'))}))
+"""
+
+
+# Define a function to write the settings file of a path sweep
+def write_settings(directory, size):
+    # Same sweep as bench_sweep_loop.py: one segment of size points
+    end = min(size - 1, 20000)
+    path = os.path.join(directory, f'paths_{size}.json')
+    with open(path, 'w') as file:
+        json.dump({'sweep': 'paths', 'points': [0, end], 'steps': [end / (size - 1)], 'wait': 0}, file)
+    return path
+
+
+# Define a function to time a headless sweep
+def headless_time(directory, settings):
+    summary_path = os.path.join(directory, 'summary.json')
+    subprocess.run([sys.executable, os.path.join(ROOT, 'sweep_cli.py'), settings, '--quiet', '--json', summary_path],
+                   capture_output=True, text=True, cwd=directory, check=True)
+    with open(summary_path) as file:
+        summary = json.load(file)
+    return summary['time_per_point_ms'] * 1e3
+
+
+# Define a function to time the same sweep in the window
+def window_time(size):
+    output = subprocess.run([sys.executable, os.path.join(ROOT, 'benchmarks', 'bench_sweep_loop.py'), '--single',
+                             '--gui', 'gui_plot_paths', '--sizes', str(size)],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])['time_per_point_us']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'points':>8} {'window (us/point)':>18} {'headless (us/point)':>20}")
+        for size in args.sizes:
+            settings = write_settings(directory, size)
+            window = window_time(size)
+            headless = headless_time(directory, settings)
+            print(f"{size:>8} {window:>18.1f} {headless:>20.1f}")
+
+        env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+        output = subprocess.run([sys.executable, '-c', MODULES_SCRIPT, write_settings(directory, 1000)],
+                                capture_output=True, text=True, cwd=directory, env=env, check=True).stdout
+        print(f"\nGUI modules imported by the headless runner: {output.strip().splitlines()[-1]}")
+
+
+if __name__ == '__main__':
+    main()
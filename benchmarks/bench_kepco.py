@@ -0,0 +1,69 @@
+"""
+Timing comparison between the original supply_current2020 function of Calibration_GUI.py and
+the state aware KepcoBOP driver.
+
+The power supply is the simulated one of simulated_instruments.py, which waits a fixed latency
+for each bus transaction and counts them, so the benchmark runs without the GPIB bench. Run it
+from the repository root:
+
+    python benchmarks/bench_kepco.py
+"""
+import os
+import sys
+from time import sleep, perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instruments import KepcoBOP
+from simulated_instruments import SimulatedResourceManager
+
+
+# Original implementation of supply_current2020, kept here as the reference of the benchmark
+def legacy_supply_current2020(supply, current, delay):
+    supply.clear()
+    supply_string = f'func:mode curr;:curr {current};:volt 20;:OUTP ON'
+    supply.write(supply_string)
+    sleep(delay)
+    supply.clear()
+    sleep(delay)
+    outp_str = supply.query("curr?").splitlines()
+    supply.clear()
+    return float(outp_str[0])
+
+
+# Define a function to time a sweep of setpoints
+def time_sweep(set_and_read, setpoints):
+    """
+    :return: the mean time per point in seconds and the mean readback error in Ampere.
+    """
+    error = 0.0
+    start = perf_counter()
+    for current in setpoints:
+        error += abs(set_and_read(current) - current)
+    return (perf_counter() - start) / len(setpoints), error / len(setpoints)
+
+
+def main():
+    setpoints = [i / 100 for i in range(20)]
+    rm = SimulatedResourceManager(latency=0.002)
+
+    print(f"{'implementation':<32} {'time/point (ms)':>16} {'transactions/point':>19} {'bytes/point':>12} "
+          f"{'readback error (mA)':>20}")
+
+    def report(label, resource, set_and_read):
+        per_point, error = time_sweep(set_and_read, setpoints)
+        print(f"{label:<32} {per_point * 1e3:>16.1f} {resource.transactions / len(setpoints):>19.1f} "
+              f"{resource.bytes_written / len(setpoints):>12.1f} {error * 1e3:>20.3f}")
+
+    for delay in [0.2, 0.0]:
+        resource = rm.open_resource('GPIB0::1::INSTR')
+        report(f'supply_current2020 (delay {delay} s)', resource,
+               lambda current: legacy_supply_current2020(resource, current, delay))
+
+    for completion in ['opc', 'stb']:
+        resource = rm.open_resource('GPIB0::1::INSTR')
+        kepco = KepcoBOP(resource, completion=completion)
+        report(f'KepcoBOP (completion={completion})', resource, kepco.set_and_read)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Frame time of the live plot of live_plot.py on long series, with and without decimation.
+
+A series of N points (a noisy sweep with sharp peaks) is appended to a LivePlot on an 800 px
+wide canvas under the Qt offscreen platform, then one point is appended and blitted per frame.
+The benchmark reports, for each decimation, the mean time of a frame (append and update), of a
+full redraw after a rescale and of a zoom on a tenth of the sweep, the number of points given to
+the line, and whether the drawn points still reach the lowest and highest value of the data.
+Run it from the repository root:
+
+    python benchmarks/bench_live_plot_lod.py
+    python benchmarks/bench_live_plot_lod.py --sizes 10000 1000000 --frames 50
+"""
+import argparse
+import os
+import sys
+from time import perf_counter
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
+from PyQt5.QtWidgets import QApplication
+from live_plot import LivePlot
+
+DECIMATIONS = [None, 'minmax', 'lttb']
+
+
+# Define a function to make a sweep with peaks
+def make_sweep(size, seed=0):
+    random = np.random.default_rng(seed)
+    x = np.linspace(0, 10000, size)
+    y = np.sin(x / 500) + random.normal(0, 0.05, size)
+    y[random.integers(0, size, 20)] += random.choice([-3, 3], 20)
+    return x, y
+
+
+# Define a function to time the live plot for one size and decimation
+def run(size, decimation, frames):
+    """
+    :return: dictionary with the times in ms, the number of drawn points and the envelope check.
+    """
+    figure = Figure(figsize=(8, 4), dpi=100)
+    canvas = FigureCanvasQTAgg(figure)
+    canvas.resize(800, 400)
+    canvas.show()
+    ax = figure.add_subplot(111)
+    plot = LivePlot(canvas, ax, decimation=decimation)
+    plot.add_series('data', color='b')
+    x, y = make_sweep(size + frames)
+    plot.append('data', x[:size], y[:size])
+    plot.update()
+    QApplication.processEvents()
+
+    start = perf_counter()
+    for i in range(size, size + frames):
+        plot.append('data', x[i], y[i])
+        plot.update()
+        # Full redraws after a rescale run from the event loop
+        QApplication.processEvents()
+    frame = (perf_counter() - start) / frames
+
+    drawn_y = plot.lines['data'].get_ydata()
+    envelope = np.nanmin(drawn_y) == y.min() and np.nanmax(drawn_y) == y.max()
+    drawn = len(drawn_y)
+
+    start = perf_counter()
+    canvas.draw()
+    full = perf_counter() - start
+
+    # Zoom on a tenth of the sweep, the visible points are decimated again on the redraw
+    ax.set_xlim(x[size // 2], x[size // 2 + size // 10])
+    start = perf_counter()
+    canvas.draw()
+    zoom = perf_counter() - start
+    zoom_drawn = len(plot.lines['data'].get_ydata())
+    canvas.close()
+    return {'frame': frame * 1e3, 'full': full * 1e3, 'zoom': zoom * 1e3, 'drawn': drawn,
+            'zoom_drawn': zoom_drawn, 'envelope': envelope}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help='series lengths')
+    parser.add_argument('--frames', type=int, default=100, help='frames timed per size')
+    args = parser.parse_args()
+
+    app = QApplication([])
+    print(f"{'points':>8} {'decimation':>10} {'frame (ms)':>11} {'redraw (ms)':>12} {'zoom (ms)':>10} "
+          f"{'drawn':>8} {'zoom drawn':>11} {'envelope':>9}")
+    for size in args.sizes:
+        for decimation in DECIMATIONS:
+            result = run(size, decimation, args.frames)
+            print(f"{size:>8} {str(decimation):>10} {result['frame']:>11.2f} {result['full']:>12.2f} "
+                  f"{result['zoom']:>10.2f} {result['drawn']:>8} {result['zoom_drawn']:>11} "
+                  f"{'kept' if result['envelope'] else 'lost':>9}")
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Idle time between the sweeps of a measurement campaign, run as one queue or as separate runs.
+
+The same jobs (path sweeps at several frequency and power setups) run once as a queue in a single
+sweep_cli.py process and once as one sweep_cli.py process per job, the way a campaign is run
+without the queue. The idle time is the wall time minus the time the sweeps measured. The
+benchmark also reports how far the time left estimated before the last job was from the real
+time. Run it from the repository root:
+
+    python benchmarks/bench_queue.py
+    python benchmarks/bench_queue.py --jobs 10 --points 50 --wait 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from sweep_queue import JobQueue
+
+
+# Define a function to build the settings of the jobs
+def job_settings(jobs, points, wait):
+    return [{'sweep': 'paths', 'points': [0, points - 1], 'steps': [1], 'frequency': 7000 + 100 * job,
+             'power': 12 - job % 3, 'measurements': 1, 'wait': wait, 'name': f'f{7000 + 100 * job}'}
+            for job in range(jobs)]
+
+
+# Define a function to run sweep_cli.py on a settings file
+def run_cli(directory, settings, name):
+    settings_path = os.path.join(directory, f'{name}.json')
+    summary_path = os.path.join(directory, f'{name}_summary.json')
+    with open(settings_path, 'w') as file:
+        json.dump(settings, file)
+    start = perf_counter()
+    subprocess.run([sys.executable, os.path.join(ROOT, 'sweep_cli.py'), settings_path, '--quiet', '--json',
+                    summary_path], capture_output=True, text=True, cwd=directory, check=True)
+    elapsed = perf_counter() - start
+    with open(summary_path) as file:
+        summary = json.load(file)
+    return elapsed, summary if isinstance(summary, list) else [summary]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=8)
+    parser.add_argument('--points', type=int, default=40)
+    parser.add_argument('--wait', type=float, default=10, help='wait between points in ms')
+    args = parser.parse_args()
+    settings = job_settings(args.jobs, args.points, args.wait)
+
+    with tempfile.TemporaryDirectory() as directory:
+        queue_time, queue_summaries = run_cli(directory, settings, 'queue')
+        separate_time, separate_summaries = 0.0, []
+        for job in settings:
+            elapsed, summaries = run_cli(directory, job, job['name'])
+            separate_time += elapsed
+            separate_summaries += summaries
+
+    print(f"{args.jobs} jobs of {args.points} points, wait {args.wait:g} ms")
+    print(f"{'':>10} {'wall (s)':>9} {'sweeps (s)':>11} {'idle/job (ms)':>14}")
+    for label, wall, summaries in [('queue', queue_time, queue_summaries),
+                                   ('separate', separate_time, separate_summaries)]:
+        sweeps = sum(summary['time_s'] for summary in summaries)
+        print(f"{label:>10} {wall:>9.2f} {sweeps:>11.2f} {(wall - sweeps) / args.jobs * 1e3:>14.1f}")
+
+    # Time left estimated before the last job, from the jobs before it, against its real time
+    queue = JobQueue(lambda job: job['points'][1] + 1)
+    for job, summary in zip(settings[:-1], queue_summaries[:-1]):
+        queue.record(job, summary['points'], summary['time_s'])
+    queue.add(settings[-1])
+    estimate, real = queue.eta(), queue_summaries[-1]['time_s']
+    print(f"\nLast job: estimated {estimate:.2f} s, took {real:.2f} s ({(estimate - real) / real * 100:+.1f} %)")
+
+
+if __name__ == '__main__':
+    main()
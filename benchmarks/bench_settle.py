@@ -0,0 +1,68 @@
+"""
+Time per point and field error of a calibration sweep with fixed waits and with the field settle
+detection of acquisition.wait_settled.
+
+The sweep runs on the simulated power supply, teslameter and magnet of simulated_instruments.py
+(field time constant of 150 ms): small current steps up to 2 A, then a large step back to zero.
+A fixed wait has to be set for the large step, the settle detection waits what each step needs.
+The error is the distance between the averaged reading and the field the magnet settles to. Run
+it from the repository root:
+
+    python benchmarks/bench_settle.py
+"""
+import os
+import sys
+from time import perf_counter, sleep
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acquisition import SettleStatistics, burst_statistics, wait_settled
+from instruments import DTM133, KepcoBOP
+from simulated_instruments import SimulatedResourceManager
+
+CURRENTS = np.concatenate((np.arange(0.0, 2.01, 0.1), [0.0]))
+SAMPLES = 10
+
+
+# Define a function to run one sweep
+def run_sweep(wait=0.0, settle=None):
+    """
+    :param wait: fixed wait in seconds after each current step.
+    :param settle: optional (tolerance, window, timeout) arguments of wait_settled.
+    :return: tuple (time per point in s, maximum field error in G, SettleStatistics).
+    """
+    rm = SimulatedResourceManager(latency=0.002, seed=0)
+    supply = KepcoBOP(rm.open_resource('GPIB0::1::INSTR'))
+    teslameter = DTM133(rm.open_resource('GPIB0::3::INSTR'))
+    magnet = rm.magnet
+    statistics = SettleStatistics()
+    errors = []
+
+    start = perf_counter()
+    for current in CURRENTS:
+        supply.set_and_read(current)
+        if settle is not None:
+            settle_time, settled = wait_settled(teslameter.read_field, *settle)
+            statistics.add([settle_time], [settled])
+        else:
+            sleep(wait)
+        field = burst_statistics(teslameter.read_fields(SAMPLES))[0]
+        errors.append(abs(field - magnet.equilibrium_field(magnet.current, magnet.core_current)))
+    elapsed = (perf_counter() - start) / len(CURRENTS)
+    return elapsed, max(errors), statistics
+
+
+def main():
+    print(f"{len(CURRENTS)} points, {SAMPLES} readings per point")
+    print(f"{'mode':<34} {'time/point (ms)':>16} {'max error (G)':>14}")
+    for wait in [0.1, 0.5, 1.0]:
+        elapsed, error, _ = run_sweep(wait=wait)
+        print(f"{f'fixed wait {wait * 1e3:.0f} ms':<34} {elapsed * 1e3:>16.0f} {error:>14.2f}")
+    for tolerance, window in [(1.0, 0.1), (0.5, 0.15)]:
+        elapsed, error, statistics = run_sweep(settle=(tolerance, window, 2.0))
+        mode = f"settle {tolerance:g} G, window {window * 1e3:.0f} ms"
+        print(f"{mode:<34} {elapsed * 1e3:>16.0f} {error:>14.2f}    {statistics.summary()}")
+
+
+if __name__ == '__main__':
+    main()
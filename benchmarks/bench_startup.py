@@ -0,0 +1,103 @@
+"""
+Cold start measurement of the GUIs.
+
+For each GUI (Calibration_GUI.py by default) a fresh interpreter imports the module with
+`-X importtime` and reports its slowest imports, then another fresh interpreter measures the time
+until the window is shown and until it is ready to run a sweep (plot created). Calibration_GUI.py
+runs with the simulated instruments and every window uses the Qt offscreen platform. The
+benchmark exits with an error if a window takes longer than the target to be shown, so it can
+guard the start up time. Run it from the repository root:
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --gui Calibration_GUI gui_plot --target 800
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUIS = ['Calibration_GUI', 'gui_plot', 'gui_plot_paths']
+
+# Script run in a fresh interpreter to time the start up of a window
+STARTUP_SCRIPT = """
+import json, sys
+from time import perf_counter
+start = perf_counter()
+from PyQt5.QtWidgets import QApplication
+app = QApplication([])
+module = __import__(sys.argv[1])
+imported = perf_counter()
+window = module.MainWindow()
+window.show()
+app.processEvents()
+shown = perf_counter()
+while not hasattr(window, 'live_plot'):
+    app.processEvents()
+ready = perf_counter()
+print(json.dumps({'import': imported - start, 'shown': shown - start, 'ready': ready - start}))
+window.close()
+"""
+
+
+# Define a function to build the environment of the child interpreters
+def child_env():
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen', SWEEP_SIMULATE='1')
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    return env
+
+
+# Define a function to profile the imports of a GUI module
+def import_profile(gui):
+    """
+    :return: list of (cumulative time in ms, module) of the modules imported by the GUI module
+        itself, slowest first.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {gui}'],
+                            capture_output=True, text=True, env=child_env(), cwd=ROOT, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two spaces per level, keep the direct imports of the GUI
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            imports.append((int(cumulative) / 1000, name.strip()))
+    return sorted(imports, reverse=True)
+
+
+# Define a function to time the start up of a GUI
+def startup_times(gui):
+    result = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, gui],
+                            capture_output=True, text=True, env=child_env(), cwd=ROOT, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gui', choices=GUIS, nargs='+', default=['Calibration_GUI'])
+    parser.add_argument('--target', type=float, default=1000, help='maximum time in ms until a window is shown')
+    parser.add_argument('--top', type=int, default=8, help='number of slowest imports listed')
+    args = parser.parse_args()
+
+    failed = []
+    for gui in args.gui:
+        print(f"{gui}: slowest imports (cumulative ms)")
+        for cumulative, name in import_profile(gui)[:args.top]:
+            print(f"    {cumulative:>8.1f}  {name}")
+
+        times = startup_times(gui)
+        print(f"    import {times['import'] * 1e3:.0f} ms, window shown {times['shown'] * 1e3:.0f} ms, "
+              f"ready {times['ready'] * 1e3:.0f} ms (target {args.target:.0f} ms)\n")
+        if times['shown'] * 1e3 > args.target:
+            failed.append(gui)
+
+    if failed:
+        print(f"Start up target missed by: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
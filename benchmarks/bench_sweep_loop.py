@@ -0,0 +1,201 @@
+"""
+Headless benchmark of the sweep loop of gui_plot.py and gui_plot_paths.py.
+
+Each GUI runs a sweep with no wait between points under the Qt offscreen platform and the
+benchmark reports the wall time per point, the time spent in each stage of the GUI side of the
+loop (plot, table, data store, console, progress bar) and in the measurement itself, the peak
+RSS of the process and the number of plot artists and table rows left at the end. Every run is
+done in its own process so the peak RSS of one size doesn't hide the next one. Run it from the
+repository root:
+
+    python benchmarks/bench_sweep_loop.py
+    python benchmarks/bench_sweep_loop.py --gui gui_plot --sizes 100 1000
+    python benchmarks/bench_sweep_loop.py --frame-rate 60
+
+The plot, progress bar and table are drawn by the render scheduler of the windows at most at
+their frame rate (20 Hz), --frame-rate changes it and the number of frames drawn is reported.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUIS = ['gui_plot', 'gui_plot_paths']
+SIZES = [100, 1000, 10000, 100000]
+
+# Methods timed during the sweep, as (stage, attribute of the window, method)
+STAGES = [
+    ('plot', 'live_plot', 'append'),
+    ('plot', 'live_plot', 'set_data'),
+    ('plot', 'live_plot', 'update'),
+    ('plot', 'canvas', 'draw'),
+    ('progress', 'progress_bar', 'setValue'),
+    ('table', 'table', 'insertRow'),
+    ('table', 'table', 'setItem'),
+    ('store', 'data_store', 'append'),
+    ('table', 'table_model', 'sync'),
+]
+
+
+class StageTimer:
+    """
+    Accumulates the time spent in wrapped methods, grouped by stage.
+    """
+
+    def __init__(self):
+        self.totals = {}
+
+    def wrap(self, stage, owner, name):
+        """
+        Replaces owner.name with a wrapper that adds its duration to the stage total. Methods
+        that don't exist in the current version of the GUI are skipped.
+        """
+        method = getattr(owner, name, None)
+        if method is None:
+            return
+        self.totals.setdefault(stage, 0.0)
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.totals[stage] += perf_counter() - start
+
+        setattr(owner, name, timed)
+
+
+# Define a function to set the inputs of a window for a sweep of a given size
+def prepare_window(gui, window, size):
+    if gui == 'gui_plot':
+        window.min_edit.setText("0")
+        window.max_edit.setText(str(size - 1))
+        window.steps_edit.setText("1")
+        window.wait_edit.setText("0")
+    else:
+        # The path spin boxes are limited to +-20000, use fractional steps for the big sweeps
+        end = min(size - 1, 20000)
+        window.radio_value = 1
+        window.pointA_edit.setValue(0)
+        window.pointB_edit.setValue(end)
+        window.step1_edit.setDecimals(6)
+        window.step1_edit.setValue(end / (size - 1))
+        window.time_edit.setValue(0)
+
+
+# Define a function to count the artists of the plot
+def count_artists(ax):
+    return len(ax.lines) + len(ax.collections) + len(ax.patches)
+
+
+# Define a function that runs a single sweep in this process
+def run_single(gui, size, frame_rate=None):
+    """
+    Runs one sweep and returns the measured numbers as a dict.
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    sys.path.insert(0, ROOT)
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import QEventLoop
+
+    app = QApplication([])
+    module = __import__(gui)
+
+    # Console output of gui_plot goes to the terminal, send it to devnull instead
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+
+    window = module.MainWindow()
+    window.show()
+    prepare_window(gui, window, size)
+    scheduler = getattr(window, 'render_scheduler', None)
+    if scheduler is not None and frame_rate:
+        scheduler.interval = 1.0 / frame_rate
+
+    # Wrap the stages of the loop with timers
+    timer = StageTimer()
+    for stage, owner_name, method in STAGES:
+        owner = getattr(window, owner_name, None)
+        if owner is not None:
+            timer.wrap(stage, owner, method)
+    timer.wrap('console', sys.stdout, 'write')
+    timer.wrap('measure', window, 'measure_point')
+
+    # Run the sweep and wait for the worker to finish. The loop is quit by the slot of the window,
+    # connected by run_script before the worker starts, so a short sweep can't finish unnoticed
+    loop = QEventLoop()
+    sweep_finished = window.sweep_finished
+
+    def quit_loop(aborted):
+        sweep_finished(aborted)
+        loop.quit()
+    window.sweep_finished = quit_loop
+
+    start = perf_counter()
+    window.run_script()
+    loop.exec_()
+    app.processEvents()
+    elapsed = perf_counter() - start
+
+    points = len(window.data_store)
+    table = getattr(window, 'table', None)
+    result = {
+        'gui': gui,
+        'size': size,
+        'points': points,
+        'time_per_point_us': elapsed / points * 1e6,
+        'stages_us': {stage: total / points * 1e6 for stage, total in timer.totals.items()},
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'artists': count_artists(window.ax),
+        'rows': table.model().rowCount() if table is not None else None,
+        'frames': scheduler.frames if scheduler is not None else None,
+    }
+
+    window.close()
+    sys.stdout = real_stdout
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gui', choices=GUIS, nargs='+', default=GUIS)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--json', help='also write the results to this JSON file')
+    parser.add_argument('--frame-rate', type=float, help='maximum frame rate of the windows in Hz')
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(args.gui[0], args.sizes[0], args.frame_rate)))
+        return
+
+    results = []
+    print(f"{'gui':<16} {'points':>8} {'us/point':>10} {'plot':>8} {'table':>8} {'store':>8} {'console':>8} "
+          f"{'progress':>9} {'measure':>8} {'RSS (MB)':>9} {'artists':>8} {'rows':>8} {'frames':>7}")
+    for gui in args.gui:
+        for size in args.sizes:
+            command = [sys.executable, __file__, '--single', '--gui', gui, '--sizes', str(size)]
+            if args.frame_rate:
+                command += ['--frame-rate', str(args.frame_rate)]
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results.append(result)
+            stages = result['stages_us']
+            print(f"{gui:<16} {result['points']:>8} {result['time_per_point_us']:>10.1f} "
+                  f"{stages.get('plot', 0):>8.1f} {stages.get('table', 0):>8.1f} {stages.get('store', 0):>8.1f} "
+                  f"{stages.get('console', 0):>8.1f} {stages.get('progress', 0):>9.1f} "
+                  f"{stages.get('measure', 0):>8.1f} {result['peak_rss_mb']:>9.1f} {result['artists']:>8} "
+                  f"{str(result['rows']):>8} {str(result.get('frames')):>7}")
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
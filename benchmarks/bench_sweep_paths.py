@@ -0,0 +1,78 @@
+"""
+Benchmark of the path generator of gui_plot_paths.py.
+
+Compares the original range based build_array with the numpy based build_path and iter_path
+for paths of increasing size. Run it from the repository root:
+
+    python benchmarks/bench_sweep_paths.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sweep_paths import build_path, iter_path
+
+
+# Original implementation of build_array, kept here as the reference of the benchmark
+def legacy_build_array(num_paths, points_arr, steps_arr):
+    sweep_values = []
+
+    for i in range(num_paths):
+        start_index = i
+        end_index = i + 1
+
+        start_point = points_arr[start_index]
+        end_point = points_arr[end_index]
+        step_size = steps_arr[start_index]
+
+        # Generate sweep values from start_point to end_point with step_size
+        sweep_values.extend(list(range(int(start_point), int(end_point), int(step_size))))
+
+    # Add final point to sweep values
+    sweep_values.append(points_arr[num_paths])
+
+    return sweep_values
+
+
+# Define a function to time a callable
+def best_time(function, repeat=5):
+    """
+    :return: the best time in seconds of a single call over a few repetitions.
+    """
+    number = 1
+    while timeit.timeit(function, number=number) < 0.2 and number < 10 ** 6:
+        number *= 10
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def main():
+    # Hysteresis like path A-B-C-D-E-F-G with the step signs the legacy function needs
+    base_points = [-1000, -100, 100, 1000, 100, -100, -1000]
+    base_steps = [100, 10, 100, -100, -10, -100]
+
+    print(f"{'points':>10} {'legacy (ms)':>12} {'build_path (ms)':>16} {'iter_path (ms)':>15} {'speedup':>8}")
+    for scale in [1, 10, 100, 1000, 10000]:
+        # Scale the points so both implementations build the same integer path
+        points = [point * scale for point in base_points]
+
+        size = len(build_path(points, base_steps))
+        assert (build_path(points, base_steps) == legacy_build_array(6, points, base_steps)).all()
+        legacy = best_time(lambda: legacy_build_array(6, points, base_steps))
+        vectorized = best_time(lambda: build_path(points, base_steps))
+        lazy = best_time(lambda: sum(chunk.size for chunk in iter_path(points, base_steps)))
+        print(f"{size:>10} {legacy * 1e3:>12.3f} {vectorized * 1e3:>16.3f} {lazy * 1e3:>15.3f} "
+              f"{legacy / vectorized:>7.1f}x")
+
+    # Show what the legacy function does with fractional and wrongly signed steps
+    print("")
+    print("Path 0 -> 1 with step 0.25:")
+    print(f"  legacy:     {legacy_build_array(1, [0, 1], [int(1)])} (int(0.25) is 0, so step 1 was used)")
+    print(f"  build_path: {build_path([0, 1], [0.25]).tolist()}")
+    print("Path 10 -> 0 with step 5 (wrong sign for range):")
+    print(f"  legacy:     {legacy_build_array(1, [10, 0], [5])}")
+    print(f"  build_path: {build_path([10, 0], [5]).tolist()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import math
+import numpy as np
+
+
+class LinearCalibrator:
+    """
+    Incremental least squares fit of y = a1 * x + a0.
+
+    Instead of keeping every point and fitting at the end, the calibrator keeps the number of
+    points, the means of x and y and the centered sums of squares and products. Each point (or
+    batch of points) is merged with the updates of Welford and Chan, so the fit is available
+    after every point and doesn't lose precision when x is large compared to its spread, which
+    the textbook sum(x*x) - sum(x)**2/n formula does.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    # Define a function to forget every point
+    def reset(self):
+        self.count = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.sxx = 0.0
+        self.syy = 0.0
+        self.sxy = 0.0
+
+    # Define a function to add points to the fit
+    def add(self, x, y):
+        """
+        Adds one or more points to the fit.
+        :param x: a float or array of x values (current).
+        :param y: a float or array of y values (magnetic field), same length as x.
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        count = x.size
+        if count == 0:
+            return
+
+        # Centered statistics of the batch
+        mean_x = float(x.mean())
+        mean_y = float(y.mean())
+        dx = x - mean_x
+        dy = y - mean_y
+        sxx = float(dx @ dx)
+        syy = float(dy @ dy)
+        sxy = float(dx @ dy)
+
+        # Merge them with the statistics of the previous points
+        total = self.count + count
+        delta_x = mean_x - self.mean_x
+        delta_y = mean_y - self.mean_y
+        weight = self.count * count / total
+        self.mean_x += delta_x * count / total
+        self.mean_y += delta_y * count / total
+        self.sxx += sxx + delta_x * delta_x * weight
+        self.syy += syy + delta_y * delta_y * weight
+        self.sxy += sxy + delta_x * delta_y * weight
+        self.count = total
+
+    @property
+    def slope(self):
+        """
+        a1, or nan if the x values don't have any spread yet.
+        """
+        if self.count < 2 or self.sxx == 0:
+            return math.nan
+        return self.sxy / self.sxx
+
+    @property
+    def intercept(self):
+        """
+        a0, or nan if the x values don't have any spread yet.
+        """
+        return self.mean_y - self.slope * self.mean_x
+
+    @property
+    def residual_sum(self):
+        """
+        Sum of the squared residuals of the fit.
+        """
+        if self.count < 2 or self.sxx == 0:
+            return math.nan
+        return max(self.syy - self.sxy * self.sxy / self.sxx, 0.0)
+
+    @property
+    def r_squared(self):
+        """
+        Coefficient of determination of the fit, 1 for a perfect line.
+        """
+        if self.syy == 0:
+            return math.nan
+        return 1 - self.residual_sum / self.syy
+
+    @property
+    def residual_std(self):
+        """
+        Residual standard error (in y units), with n - 2 degrees of freedom.
+        """
+        if self.count < 3:
+            return math.nan
+        return math.sqrt(self.residual_sum / (self.count - 2))
+
+    # Define a function to export the calibration constants
+    def save(self, path):
+        """
+        Writes the calibration file read by the other programs: "a1,a0" on a single line.
+        :param path: path of the calibration file.
+        """
+        with open(path, 'w') as file:
+            file.write(f"{self.slope},{self.intercept}")
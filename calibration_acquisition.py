@@ -0,0 +1,359 @@
+from functools import partial
+from time import sleep
+import os
+import sys
+import threading
+import numpy as np
+from acquisition import ConcurrentReader, burst_statistics, wait_settled
+from adaptive_sweep import AdaptiveSweep
+from field_calibration import FieldCalibration
+from instruments import DTM133, KepcoBOP
+from simulated_instruments import resource_manager_from_config
+from stage_timing import record, stage
+from visa_discovery import CACHE_PATH, VisaDiscovery, format_instruments
+from visa_sessions import SessionManager
+
+
+# Columns of the calibration data files, after the current setpoint the values returned by measure_point
+DATA_COLUMNS = ['setpoint_mA', 'current_mA', 'field_G', 'field_std_G', 'samples', 'settle_s', 'settled',
+                'current_timestamp', 'field_timestamp', 'timestamp']
+# Columns of the field target sweep data files, after the target field the values returned by FieldFeedback
+FIELD_DATA_COLUMNS = ['target_G', 'current_mA', 'field_G', 'field_std_G', 'samples', 'settle_s', 'settled',
+                      'current_timestamp', 'field_timestamp', 'iterations', 'converged', 'field_error_G', 'timestamp']
+# Smallest slope of a calibration branch the field target feedback divides by, relative to the
+# mean slope of the branch
+MIN_SLOPE_RATIO = 1e-3
+
+
+def supply_current2020(current, delay=0):
+    """
+    Sets the output current of the power supply and returns the actual current the supply is outputting.
+    Only the commands whose state changed are sent and the function returns as soon as the supply
+    reports the operation as complete.
+    :param current: set the output current to the value input in Ampere units.
+    :param delay: optional extra delay between write and query commands in time unit of seconds.
+    :return: a float with the value of the actual current (Ampere) the instrument is outputting.
+    """
+    with stage('setpoint'):
+        kepco.set_current(current)
+    if delay:
+        with stage('settle'):
+            sleep(delay)
+    with stage('readback'):
+        return kepco.read_current()
+
+
+# Define function to query the teslameter
+def gaussm_query():
+    """
+    Queries the instrument and returns the value of the reading.
+    :return: float with magnetic field units of Gauss (G)
+    """
+    return teslameter.read_field()
+
+
+# Define function to query the teslameter several times
+def gaussm_burst(samples):
+    """
+    Reads the teslameter a number of times, in a single bus transaction when it supports it.
+    :param samples: number of readings.
+    :return: tuple with the mean and standard deviation (G) of the readings and the number of
+        readings kept after rejecting the outliers.
+    """
+    mean, std, kept = burst_statistics(teslameter.read_fields(samples))
+    return float(mean), float(std), float(kept)
+
+
+# Run with the simulated instruments when started with --simulate or SWEEP_SIMULATE=1, the
+# simulation settings can be given in a JSON file with SWEEP_SIMULATION_CONFIG
+SIMULATE = '--simulate' in sys.argv or os.environ.get('SWEEP_SIMULATE', '0') not in ('', '0')
+
+# Resource Manager of the simulated instruments. The PyVisa Resource Manager (and pyvisa itself)
+# is created by the session manager on first use, so it doesn't slow down the start up
+if SIMULATE:
+    rm = resource_manager_from_config(os.environ.get('SWEEP_SIMULATION_CONFIG'))
+else:
+    rm = None
+
+# Persistent sessions, each resource is opened on first use and reused by every run
+sessions = SessionManager(rm)
+
+# Addresses of the instruments used when they can't be identified on the bus
+SUPPLY_ADDRESS = 'GPIB0::1::INSTR'  # KEPCO BOP20-20DL Power Supply
+TESLAMETER_ADDRESS = 'GPIB0::3::INSTR'  # Group3 DTM-133 Digital Teslameter
+
+# Sessions of the instruments and power supply driver, created once the instruments are found
+supply = None
+gaussm = None
+kepco = None
+teslameter = None
+instruments_ready = threading.Event()
+
+# Reads the instruments of each point at the same time
+point_reader = ConcurrentReader()
+
+
+# Define a function to create the sessions of the instruments
+def connect_instruments(supply_name, teslameter_name):
+    """
+    :param supply_name: VISA resource name of the KEPCO power supply.
+    :param teslameter_name: VISA resource name of the teslameter.
+    """
+    global supply, gaussm, kepco, teslameter
+    supply = sessions.session(supply_name, clear_on_open=True)
+    gaussm = sessions.session(teslameter_name, health_query='f')
+    teslameter = DTM133(gaussm)
+
+    # Power supply driver, its cached state is lost when the session reconnects
+    kepco = KepcoBOP(supply)
+    supply.on_reconnect(kepco.invalidate)
+
+
+# Define a function to find the instruments, it runs in a background thread at start up
+def find_instruments():
+    """
+    Lists the connected GPIB-VISA resources with their identity and connects to the power supply
+    and the teslameter found by identity, or at their default addresses.
+    """
+    supply_name, teslameter_name = SUPPLY_ADDRESS, TESLAMETER_ADDRESS
+    try:
+        # The simulated instruments are never written to the discovery cache
+        discovery = VisaDiscovery(sessions.resource_manager, cache_path=None if SIMULATE else CACHE_PATH)
+        print("Listing connected GPIB-VISA resources:")
+        print(f"VISA Resources:\n{format_instruments(discovery.discover())}")
+        supply_name = discovery.find('KEPCO', SUPPLY_ADDRESS)
+        teslameter_name = discovery.find('DTM', TESLAMETER_ADDRESS)
+    except Exception as e:
+        print(f"Could not identify the VISA resources: {e}")
+    finally:
+        connect_instruments(supply_name, teslameter_name)
+        instruments_ready.set()
+    print(f"Power supply: {supply_name}, teslameter: {teslameter_name}")
+
+
+# Define a function to prepare the instruments before a sweep, it runs in the worker thread
+def prepare_instruments():
+    """
+    Waits until the instruments are found and checks that every one of them answers.
+    """
+    instruments_ready.wait()
+    sessions.check_all()
+
+
+# Define the measurement of a single point, it runs in the thread of the sweep loop
+def measure_point(val, samples=1, settle=None):
+    """
+    Sets the current of the power supply, then reads the current of the supply and the
+    teslameter at the same time.
+    :param val: current setpoint in mA.
+    :param samples: number of teslameter readings averaged.
+    :param settle: optional (tolerance in G, window in s, timeout in s) tuple. The teslameter
+        is polled until the field settles (see wait_settled) before it is read.
+    :return: tuple with the current the supply is outputting (mA), the mean and standard
+        deviation of the magnetic field (G), the number of readings kept, the settle time (s),
+        1.0 if the field settled (0.0 if the settle timed out) and the timestamps of the
+        current and field readings.
+    """
+    # Set the current in ampere units
+    with stage('setpoint'):
+        kepco.set_current(val/1000)
+
+    # Wait for the field to follow the current step
+    settle_time, settled = 0.0, True
+    if settle is not None:
+        with stage('settle'):
+            settle_time, settled = wait_settled(gaussm_query, *settle)
+    curr, mfield, mfield_std, kept, current_time, field_time = read_point(samples)
+    return curr, mfield, mfield_std, kept, settle_time, float(settled), current_time, field_time
+
+
+# Define a function to read the instruments of a point
+def read_point(samples=1):
+    """
+    Reads the supply current and a burst of the teslameter concurrently, each instrument has its
+    own session.
+    :param samples: number of teslameter readings averaged.
+    :return: tuple with the current (mA), the mean and standard deviation of the magnetic field
+        (G), the number of readings kept and the timestamps of the current and field readings.
+    """
+    readings = point_reader.read({'current': kepco.read_current, 'field': partial(gaussm_burst, samples)})
+    record('readback', readings['current'].duration)
+    record('field', readings['field'].duration)
+    curr = round(readings['current'].value*1000)
+    mfield, mfield_std, kept = readings['field'].value
+    return curr, mfield, mfield_std, kept, readings['current'].timestamp, readings['field'].timestamp
+
+
+class FieldFeedback:
+    """
+    Measurement of the field target sweep mode: sets the current giving each target field.
+
+    The first current of a point comes from the calibration, on the branch of the direction of
+    the sweep, plus the correction the previous point needed, since the calibration error changes
+    slowly along a sweep. While the measured field is outside the tolerance the current is
+    corrected by a Newton step, with the slope of the calibration for the first correction and
+    the secant of the last two currents for the next ones, which also follows the smaller slope
+    of the magnet inside its hysteresis loop after an overshoot. The sweep loop calls it with each
+    target field.
+    """
+
+    def __init__(self, calibration, tolerance=1.0, max_iterations=5, samples=1, settle=None, wait=0.0,
+                 max_current=20000.0):
+        """
+        :param calibration: FieldCalibration of the magnet.
+        :param tolerance: largest accepted difference in G between the field and its target.
+        :param max_iterations: largest number of currents set for a point.
+        :param samples: number of teslameter readings averaged by each reading.
+        :param settle: optional (tolerance in G, window in s, timeout in s) tuple, the field
+            settles after each current change (see wait_settled).
+        :param wait: time in seconds waited after each current change when settle is None.
+        :param max_current: largest current in mA the supply is set to, in both directions.
+        """
+        self.calibration = calibration
+        self.tolerance = tolerance
+        self.max_iterations = max(int(max_iterations), 1)
+        self.samples = samples
+        self.settle = settle
+        self.wait = wait
+        self.max_current = max_current
+        self.reset()
+
+    # Define a function to forget the previous points, before a new sweep
+    def reset(self):
+        self.correction = 0.0
+        self.previous = None
+
+    def __call__(self, target):
+        """
+        :param target: target field in G.
+        :return: tuple with the values of measure_point for the last current set, followed by the
+            number of currents set, 1.0 if the field is within the tolerance (0.0 otherwise) and
+            the field error in G.
+        :raise ValueError: if the target is outside the calibrated field range, or the calibration
+            is flat around it (see branch_slope).
+        """
+        branch = 'down' if self.previous is not None and target < self.previous else 'up'
+        self.previous = target
+        model = self.calibration.branch(branch)
+        seed = model.current(target)
+        if np.isnan(seed):
+            raise ValueError(f"The target field {target:g} G is outside the calibrated range")
+
+        current = seed + self.correction
+        slope = branch_slope(model, seed)
+        last = None
+        settle_total = 0.0
+        for iteration in range(1, self.max_iterations + 1):
+            current = min(max(current, -self.max_current), self.max_current)
+            with stage('setpoint'):
+                kepco.set_current(current/1000)
+            settle_time, settled = 0.0, True
+            with stage('settle'):
+                if self.settle is not None:
+                    settle_time, settled = wait_settled(gaussm_query, *self.settle)
+                elif self.wait > 0:
+                    sleep(self.wait)
+            settle_total += settle_time
+            curr, mfield, mfield_std, kept, current_time, field_time = read_point(self.samples)
+            error = mfield - target
+            if abs(error) <= self.tolerance or iteration == self.max_iterations:
+                break
+
+            # Newton step, on the secant of the last two currents once their fields differ by more
+            # than the noise. A secant much flatter than the calibration would send the current far away
+            if last is not None and current != last[0] and abs(mfield - last[1]) > 2 * self.tolerance:
+                secant = (mfield - last[1]) / (current - last[0])
+                if secant * slope > 0 and abs(secant) >= MIN_SLOPE_RATIO * abs(slope):
+                    slope = secant
+            last = (current, mfield)
+            current -= error / slope
+
+        # The next point starts with the correction this one needed
+        self.correction = current - seed
+        converged = abs(error) <= self.tolerance
+        return (curr, mfield, mfield_std, kept, settle_total, float(settled), current_time, field_time,
+                float(iteration), float(converged), error)
+
+
+# Define a function to load the calibration of a field target sweep
+def load_field_calibration(path=None):
+    """
+    :param path: calibration file, by default calibration.json in the working directory, or
+        calibration.txt if there is no calibration.json.
+    :return: the FieldCalibration.
+    :raise ValueError: if the model of a branch can't be inverted.
+    """
+    if path is None:
+        path = os.path.join(os.getcwd(), 'calibration.json')
+        if not os.path.exists(path):
+            path = os.path.join(os.getcwd(), 'calibration.txt')
+    calibration = FieldCalibration.load(path)
+    calibration.check()
+    return calibration
+
+
+# Define a function to get the slope of a calibration branch
+def branch_slope(model, current):
+    """
+    :param model: BranchModel of the calibration.
+    :param current: current in mA, inside the calibrated range.
+    :return: slope of the field in G/mA around the current.
+    :raise ValueError: if the slope isn't finite or is below MIN_SLOPE_RATIO times the mean slope
+        of the branch, e.g. on the saturated stretch of the calibration, where a Newton step
+        would divide by zero or set the supply to a current far outside the range.
+    """
+    low, high = model.current_range
+    finite = np.isfinite(high - low)
+    step = (high - low) * 1e-3 if finite else 1.0
+    below, above = max(current - step, low), min(current + step, high)
+    slope = (model.field(above) - model.field(below)) / (above - below)
+    floor = MIN_SLOPE_RATIO * abs(model.field(high) - model.field(low)) / (high - low) if finite else 0.0
+    if not np.isfinite(slope) or abs(slope) <= floor:
+        raise ValueError(f"The calibration is flat around {current:g} mA (slope {slope:g} G/mA), "
+                         f"the field can't be corrected there")
+    return slope
+
+
+# Define the instrument shutdown after the sweep loop, it runs in the thread of the sweep loop
+def sweep_cleanup(aborted):
+    """
+    Sets the power supply current back to zero. The resources stay open for the next run.
+    :param aborted: True if the sweep loop was aborted.
+    """
+    # Supply current set to 0
+    print(f"Current set to {supply_current2020(0.0)} A")
+
+
+# Define a function to build the sweep values of a calibration
+def calibration_sweep(min_val, max_val, steps_val, budget=None, round_trip=False):
+    """
+    :param min_val: first current setpoint in mA.
+    :param max_val: last current setpoint in mA.
+    :param steps_val: step between the setpoints in mA, the smallest step of an adaptive sweep.
+    :param budget: maximum number of points of an adaptive sweep, None for a sweep with a fixed step.
+    :param round_trip: sweep a fixed step sweep back down to the first setpoint after the last
+        one, so both branches of the hysteresis loop are measured.
+    :return: numpy array with the setpoints, or an AdaptiveSweep refining the setpoints where the
+        field curves (saturation).
+    """
+    if budget is not None:
+        return AdaptiveSweep(min_val, max_val, budget, min_step=steps_val, response=lambda result: result[1])
+    setpoints = np.arange(min_val, max_val + steps_val, steps_val)
+    if round_trip:
+        return np.concatenate([setpoints, setpoints[-2::-1]])
+    return setpoints
+
+
+# Define a function to choose between a fixed wait and waiting for the field to settle
+def settle_settings(settle_tolerance, settle_window, wait):
+    """
+    :param settle_tolerance: settle tolerance in G, 0 to wait a fixed time between measurements.
+    :param settle_window: settle window in ms.
+    :param wait: wait between measurements in ms, it becomes the settle timeout when waiting for
+        the field to settle.
+    :return: tuple with the settle argument of measure_point and the fixed wait of the sweep
+        loop in seconds.
+    """
+    if settle_tolerance > 0:
+        return (settle_tolerance, settle_window/1000, wait/1000), 0.0
+    return None, wait/1000
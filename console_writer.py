@@ -0,0 +1,73 @@
+import threading
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtGui import QTextCursor
+
+
+class ConsoleWriter(QObject):
+    """
+    Stream that replaces sys.stdout/sys.stderr and shows the output in a QPlainTextEdit.
+
+    Writes only append the text to an in-memory buffer, so they are cheap and safe to call from
+    any thread. A timer in the GUI thread moves the buffer to the widget a few times per second,
+    the amount of text inserted per flush is capped and the widget keeps a maximum number of
+    lines. Everything is also written to the original stream.
+    """
+
+    def __init__(self, console, stream, interval=100, max_chars=20000, max_blocks=5000):
+        """
+        :param console: QPlainTextEdit that shows the output.
+        :param stream: original stream (sys.stdout or sys.stderr) the output is also written to.
+        :param interval: time in ms between two flushes to the widget.
+        :param max_chars: maximum number of characters inserted in the widget per flush, the
+            oldest buffered text is dropped from the widget (not from the original stream).
+        :param max_blocks: maximum number of lines kept by the widget.
+        """
+        super().__init__(console)
+        self.console = console
+        self.stream = stream
+        self.max_chars = max_chars
+        self._buffer = []
+        self._lock = threading.Lock()
+
+        # Let the widget drop its oldest lines by itself
+        self.console.setMaximumBlockCount(max_blocks)
+
+        # Flush the buffer to the widget from the GUI thread
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.flush_to_console)
+        self._timer.start(interval)
+
+    def write(self, text):
+        # Tee the output to the original stream
+        if self.stream is not None:
+            self.stream.write(text)
+        with self._lock:
+            self._buffer.append(text)
+        return len(text)
+
+    def flush(self):
+        if self.stream is not None:
+            self.stream.flush()
+
+    # Define a function to move the buffered text to the widget
+    def flush_to_console(self):
+        """
+        Inserts the buffered text at the end of the widget. Runs in the GUI thread.
+        """
+        with self._lock:
+            if not self._buffer:
+                return
+            text = ''.join(self._buffer)
+            self._buffer = []
+
+        # Keep only the most recent text if too much was written since the last flush
+        if len(text) > self.max_chars:
+            # Cut at a line break so the first line shown is complete
+            cut = len(text) - self.max_chars
+            line_end = text.find('\n', cut)
+            cut = line_end + 1 if line_end != -1 else cut
+            text = f"[... {cut} characters not shown ...]\n" + text[cut:]
+
+        self.console.moveCursor(QTextCursor.End)
+        self.console.insertPlainText(text)
+        self.console.moveCursor(QTextCursor.End)
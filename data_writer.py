@@ -0,0 +1,212 @@
+import csv
+import json
+import os
+import queue
+import struct
+import threading
+from datetime import datetime
+from time import monotonic
+import numpy as np
+
+
+# File signature and version of the binary sweep data format
+MAGIC = b'SWEEPDAT'
+VERSION = 1
+
+
+# Define a function to build the path of a new data file
+def new_data_path(prefix, directory='data'):
+    """
+    :param prefix: name of the sweep, e.g. 'calibration'.
+    :param directory: directory of the data files, relative to the working directory.
+    :return: path of a new data file named after the prefix and the current date and time.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = os.path.join(directory, f'{prefix}_{stamp}.sweep')
+
+    # Sweeps started within the same second, e.g. queued jobs, get numbered files
+    number = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f'{prefix}_{stamp}_{number}.sweep')
+        number += 1
+    return path
+
+
+class StreamingDataWriter:
+    """
+    Append-only writer that saves every point of a sweep to disk while the sweep runs.
+
+    The file starts with a small header (signature, version and a JSON description of the
+    columns) followed by fixed size records of little endian float64 values, one per column.
+    Points are handed over through a queue and written by a background thread, which flushes and
+    fsyncs the file at most every flush_interval seconds. If the program crashes only the last
+    unflushed points are lost, and a partially written record is ignored when reading. An error
+    of the background thread (disk full, a point with the wrong number of values) stops the
+    writing and is raised by the next append or by close.
+    """
+
+    def __init__(self, path, columns, metadata=None, flush_interval=1.0, write_csv=True):
+        """
+        :param path: path of the binary data file.
+        :param columns: list with the names of the columns.
+        :param metadata: optional dict saved in the header (sweep settings...).
+        :param flush_interval: maximum time in seconds between two flushes to disk.
+        :param write_csv: write a CSV copy next to the binary file when the writer is closed.
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.flush_interval = flush_interval
+        self.write_csv = write_csv
+        self.count = 0
+        self.error = None
+        self._raised = False
+        self._record = struct.Struct('<' + 'd' * len(self.columns))
+        self._queue = queue.Queue()
+        self._file = open(path, 'wb')
+        self._file.write(_header(self.columns, metadata))
+        self._sync()
+
+        self._thread = threading.Thread(target=self._run, name='StreamingDataWriter', daemon=True)
+        self._thread.start()
+
+    # Define a function to queue a point
+    def append(self, *values):
+        """
+        Queues a point for writing, it doesn't wait for any I/O.
+        :param values: one float per column.
+        :raise Exception: the error that stopped the background thread, if any.
+        """
+        if self.error is not None:
+            self._raised = True
+            raise self.error
+        self._queue.put(values)
+
+    # Define a function to finish the file
+    def close(self):
+        """
+        Writes the queued points, closes the file and exports the CSV copy if requested.
+        :return: path of the CSV file, or None.
+        :raise Exception: the error that stopped the background thread, unless append already
+            raised it.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self.error is not None:
+            if not self._raised:
+                self._raised = True
+                raise self.error
+            return None
+        if self.write_csv:
+            return export_csv(self.path)
+        return None
+
+    def _run(self):
+        """
+        Writing loop of the background thread, keeps its error for append and close.
+        """
+        try:
+            self._write_loop()
+        except Exception as e:
+            self.error = e
+            try:
+                self._file.close()
+            except OSError:
+                pass
+
+    def _write_loop(self):
+        last_flush = monotonic()
+        pending = False
+        while True:
+            try:
+                values = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                values = ()
+
+            if values is None:
+                break
+            if values:
+                self._file.write(self._record.pack(*values))
+                self.count += 1
+                pending = True
+
+            # Flush in batches, not after every point
+            if pending and monotonic() - last_flush >= self.flush_interval:
+                self._sync()
+                last_flush = monotonic()
+                pending = False
+
+        self._sync()
+        self._file.close()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
+# Define a function to build the header of a data file
+def _header(columns, metadata):
+    """
+    :return: bytes of the signature, version, length of the JSON description and the description.
+    """
+    description = json.dumps({'columns': list(columns), 'metadata': metadata or {}}).encode()
+    return MAGIC + struct.pack('<HI', VERSION, len(description)) + description
+
+
+# Define a function to write a whole table at once
+def write_data(path, columns, data, metadata=None):
+    """
+    Writes a data file in the format of StreamingDataWriter in one go, e.g. a table kept in
+    memory during the sweep. It is read back with read_data.
+    :param path: path of the binary data file.
+    :param columns: list with the names of the columns.
+    :param data: array of shape (points, columns).
+    :param metadata: optional dict saved in the header.
+    """
+    with open(path, 'wb') as file:
+        file.write(_header(columns, metadata))
+        file.write(np.ascontiguousarray(data, dtype='<f8').tobytes())
+
+
+# Define a function to read a data file
+def read_data(path):
+    """
+    Reads a file written by StreamingDataWriter, ignoring an incomplete last record.
+    :param path: path of the binary data file.
+    :return: tuple with the list of column names, a float64 array of shape (points, columns) and
+        the metadata dict.
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a sweep data file")
+        version, length = struct.unpack('<HI', file.read(struct.calcsize('<HI')))
+        if version != VERSION:
+            raise ValueError(f"Unsupported sweep data file version {version}")
+        description = json.loads(file.read(length))
+        columns = description['columns']
+        raw = file.read()
+
+    record_size = 8 * len(columns)
+    complete = len(raw) // record_size * record_size
+    data = np.frombuffer(raw[:complete], dtype='<f8').reshape(-1, len(columns))
+    return columns, data, description.get('metadata', {})
+
+
+# Define a function to convert a data file to CSV
+def export_csv(path, csv_path=None):
+    """
+    Writes a CSV copy of a binary data file.
+    :param path: path of the binary data file.
+    :param csv_path: path of the CSV file. Defaults to the data file path with a .csv extension.
+    :return: the path of the CSV file.
+    """
+    columns, data, _ = read_data(path)
+    if csv_path is None:
+        csv_path = os.path.splitext(path)[0] + '.csv'
+    with open(csv_path, 'w', newline='') as file:
+        csv_writer = csv.writer(file)
+        csv_writer.writerow(columns)
+        # Python floats are written with the shortest representation that reads back exactly
+        csv_writer.writerows(data.tolist())
+    return csv_path
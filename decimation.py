@@ -0,0 +1,122 @@
+import numpy as np
+
+
+class MinMaxDecimator:
+    """
+    Incremental min/max decimation of a growing series, for drawing.
+
+    The points are grouped in buckets of consecutive points and each bucket is drawn as its lowest
+    and highest point, in measurement order, so the envelope of the curve and its peaks are kept.
+    The buckets are computed once: update only processes the points added since the previous
+    call, and when there are more than twice the wanted number of buckets they are merged in
+    pairs. The cost of an update depends on the new points, the unfinished bucket and the number
+    of buckets, not on the length of the series.
+    """
+
+    def __init__(self, size=1000):
+        """
+        :param size: number of buckets kept, between size and twice size once the series is long
+            enough, e.g. the width of the plot in pixels.
+        """
+        self.size = max(int(size), 1)
+        self.reset()
+
+    def reset(self):
+        self.bucket = 1
+        self.count = 0
+        self._low = np.empty(0, dtype=np.int64)
+        self._high = np.empty(0, dtype=np.int64)
+
+    # Define a function to get the points to draw
+    def update(self, y):
+        """
+        :param y: array with every y value of the series, the values already given must not
+            have changed. A shorter array than the previous one starts over.
+        :return: increasing array with the indices of the points to draw.
+        """
+        y = np.asarray(y)
+        size = y.size
+        if size < self.count:
+            self.reset()
+
+        # Merge the buckets in pairs while there are too many of them
+        while size // self.bucket > 2 * self.size:
+            self._merge(y)
+
+        # Buckets of the new points
+        full = (size - self.count) // self.bucket
+        if full:
+            block = y[self.count:self.count + full * self.bucket].reshape(full, self.bucket)
+            start = self.count + np.arange(full) * self.bucket
+            self._low = np.concatenate((self._low, start + np.argmin(block, axis=1)))
+            self._high = np.concatenate((self._high, start + np.argmax(block, axis=1)))
+            self.count += full * self.bucket
+
+        # Both points of every bucket in order, then the lowest and highest point of the
+        # unfinished bucket and the last point, each point once
+        points = np.sort(np.stack((self._low, self._high), axis=1), axis=1).ravel()
+        if size > self.count:
+            tail = y[self.count:]
+            points = np.concatenate((points, np.sort(self.count + np.array([np.argmin(tail), np.argmax(tail)]))))
+        if size:
+            points = np.append(points, size - 1)
+        return points[np.concatenate(([True], points[1:] != points[:-1]))] if points.size else points
+
+    def _merge(self, y):
+        # A last bucket without a pair goes back to the unfinished bucket
+        if self._low.size % 2:
+            self._low, self._high = self._low[:-1], self._high[:-1]
+            self.count -= self.bucket
+        low = self._low.reshape(-1, 2)
+        high = self._high.reshape(-1, 2)
+        self._low = np.where(y[low[:, 0]] <= y[low[:, 1]], low[:, 0], low[:, 1])
+        self._high = np.where(y[high[:, 0]] >= y[high[:, 1]], high[:, 0], high[:, 1])
+        self.bucket *= 2
+
+
+# Define a function to decimate a whole series at once
+def minmax_indices(y, size):
+    """
+    :param y: array of y values.
+    :param size: number of buckets.
+    :return: increasing array with the indices of the lowest and highest point of each bucket.
+    """
+    return MinMaxDecimator(size).update(y)
+
+
+# Define the Largest Triangle Three Buckets decimation
+def lttb_indices(x, y, size):
+    """
+    Largest Triangle Three Buckets: keeps the first and last points and, in each of size - 2
+    buckets, the point making the largest triangle with the point kept in the previous bucket and
+    the mean of the next bucket. It keeps the visual shape of a curve with one point per bucket.
+    :param x: array of x values.
+    :param y: array of y values.
+    :param size: number of points kept.
+    :return: increasing array with the indices of the kept points.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    count = x.size
+    if size >= count or size < 3:
+        return np.arange(count)
+
+    # Limits of the buckets between the first and the last point
+    edges = np.linspace(1, count - 1, size - 1).astype(np.int64)
+    sums_x = np.add.reduceat(x[1:count - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:count - 1], edges[:-1] - 1)
+    lengths = np.diff(edges)
+    means_x = np.append(sums_x / lengths, x[-1])
+    means_y = np.append(sums_y / lengths, y[-1])
+
+    kept = np.empty(size, dtype=np.int64)
+    kept[0], kept[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(size - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        # Twice the area of the triangles with the previous point and the mean of the next bucket
+        areas = np.abs((x[previous] - means_x[bucket + 1]) * (y[start:stop] - y[previous])
+                       - (x[previous] - x[start:stop]) * (means_y[bucket + 1] - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
@@ -0,0 +1,370 @@
+import json
+import math
+from datetime import datetime
+from functools import partial
+import numpy as np
+
+
+# Version of the calibration files written by FieldCalibration.save
+CALIBRATION_VERSION = 1
+# Models a branch can be fitted with
+MODELS = ('linear', 'poly', 'piecewise', 'spline')
+
+
+class BranchModel:
+    """
+    Field of the magnet as a function of the current along one branch (ascending or descending
+    current) of the hysteresis loop.
+
+    The model is one of:
+        linear: straight line (the constants of calibration.txt).
+        poly: polynomial of a given degree.
+        piecewise: continuous piecewise linear curve with evenly spaced knots.
+        spline: smoothing cubic spline, needs scipy.
+    Both directions of the lookup are vectorized. The inverse of the linear and piecewise models
+    is exact; the inverse of the polynomial and spline is interpolated in a table of the model,
+    computed on the first inverse lookup and kept for the next ones. Values outside the
+    calibrated current range, or its field range for the inverse, give nan.
+    """
+
+    def __init__(self, kind, params, current_range, residual_std=math.nan, count=0, table_size=4097):
+        """
+        :param kind: one of MODELS.
+        :param params: dict with the parameters of the model, the ones written by to_dict.
+        :param current_range: (lowest, highest) calibrated current in mA.
+        :param residual_std: standard deviation of the fit residuals in G.
+        :param count: number of points fitted.
+        :param table_size: number of points of the table of the inverse lookup.
+        """
+        if kind not in MODELS:
+            raise ValueError(f"Unknown calibration model {kind!r}, use one of {', '.join(MODELS)}")
+        self.kind = kind
+        self.params = params
+        self.current_range = (float(current_range[0]), float(current_range[1]))
+        self.residual_std = residual_std
+        self.count = count
+        self.table_size = table_size
+        self._evaluate = self._evaluator()
+        self._table = None
+
+    def _evaluator(self):
+        if self.kind in ('linear', 'poly'):
+            return np.polynomial.Polynomial(self.params['coef'], domain=self.params['domain'])
+        if self.kind == 'piecewise':
+            return partial(np.interp, xp=np.asarray(self.params['knots']), fp=np.asarray(self.params['values']))
+        return _scipy_interpolate().BSpline(np.asarray(self.params['t']), np.asarray(self.params['c']),
+                                            self.params['k'])
+
+    # Define a function to get the field of currents
+    def field(self, current):
+        """
+        :param current: a float or array of currents in mA.
+        :return: the field in G, an array of the same shape or a float.
+        """
+        current = np.asarray(current, dtype=np.float64)
+        field = np.asarray(self._evaluate(current), dtype=np.float64)
+        field = np.where(self._inside(current, self.current_range), field, np.nan)
+        return float(field) if field.ndim == 0 else field
+
+    # Define a function to get the current of fields
+    def current(self, field):
+        """
+        :param field: a float or array of fields in G.
+        :return: the current in mA giving each field, an array of the same shape or a float.
+        """
+        field = np.asarray(field, dtype=np.float64)
+        if self.kind == 'linear':
+            intercept, slope = np.pad(self._evaluate.convert().coef, (0, 1))[:2]
+            current = (field - intercept) / slope
+            current = np.where(self._inside(current, self.current_range), current, np.nan)
+        else:
+            fields, currents = self.table()
+            current = np.interp(field, fields, currents)
+            current = np.where(self._inside(field, (fields[0], fields[-1])), current, np.nan)
+        return float(current) if current.ndim == 0 else current
+
+    # Define a function to get the table of the inverse lookup
+    def table(self):
+        """
+        :return: tuple with the increasing fields and their currents, computed once.
+        :raise ValueError: if the field isn't monotonic over the current range, so it can't be
+            inverted (e.g. a polynomial of too high degree).
+        """
+        if self._table is not None:
+            return self._table
+        low, high = self.current_range
+        if self.kind == 'piecewise':
+            currents = np.asarray(self.params['knots'], dtype=np.float64)
+        else:
+            currents = np.linspace(low, high, self.table_size)
+        fields = np.asarray(self._evaluate(currents), dtype=np.float64)
+        if np.all(np.diff(fields) < 0):
+            fields, currents = fields[::-1], currents[::-1]
+        elif not np.all(np.diff(fields) > 0):
+            raise ValueError(f"The {self.kind} calibration isn't monotonic over {low:g}..{high:g} mA, "
+                             f"it can't be inverted")
+        self._table = (fields, currents)
+        return self._table
+
+    # Define a function to check that the model can be inverted
+    def check(self):
+        """
+        Computes the inverse lookup now, so a calibration that can't be inverted is reported when
+        it is loaded rather than on the first point of a sweep.
+        :raise ValueError: if the field isn't strictly monotonic over the current range.
+        """
+        if self.kind == 'linear':
+            slope = np.pad(self._evaluate.convert().coef, (0, 1))[1]
+            if not np.isfinite(slope) or slope == 0:
+                raise ValueError(f"The linear calibration has a slope of {slope:g} G/mA, it can't be inverted")
+        else:
+            self.table()
+
+    @staticmethod
+    def _inside(values, value_range):
+        low, high = min(value_range), max(value_range)
+        # Small tolerance so the ends of the range, measured or rounded, stay inside
+        margin = (high - low) * 1e-9
+        return (values >= low - margin) & (values <= high + margin)
+
+    def to_dict(self):
+        # JSON has no nan, an undefined residual error is written as null
+        residual_std = self.residual_std if math.isfinite(self.residual_std) else None
+        return {'model': self.kind, 'params': self.params, 'current_range': list(self.current_range),
+                'residual_std': residual_std, 'count': self.count}
+
+    @classmethod
+    def from_dict(cls, data):
+        residual_std = data.get('residual_std')
+        return cls(data['model'], data['params'], data['current_range'],
+                   math.nan if residual_std is None else residual_std, data.get('count', 0))
+
+
+# Define a function to import the splines of scipy, an optional dependency only the spline model needs
+def _scipy_interpolate():
+    try:
+        from scipy import interpolate
+    except ImportError:
+        raise ImportError("The spline calibration model needs scipy, install it or use the poly or piecewise model")
+    return interpolate
+
+
+# Define a function to fit a branch
+def fit_branch(current, field, model='poly', degree=3, knots=8, smoothing=None):
+    """
+    :param current: array of currents in mA.
+    :param field: array of fields in G, same length. The fields of repeated currents are averaged.
+    :param model: one of MODELS.
+    :param degree: degree of the poly model.
+    :param knots: number of knots of the piecewise model.
+    :param smoothing: smoothing factor of the spline (sum of the squared residuals it allows),
+        by default estimated from the noise of the fields.
+    :return: the fitted BranchModel.
+    """
+    current = np.asarray(current, dtype=np.float64)
+    field = np.asarray(field, dtype=np.float64)
+    valid = np.isfinite(current) & np.isfinite(field)
+    x, inverse = np.unique(current[valid], return_inverse=True)
+    y = np.bincount(inverse, field[valid]) / np.bincount(inverse)
+    if x.size < 2:
+        raise ValueError("At least two different currents are needed to fit a calibration")
+
+    if model == 'linear' or model == 'poly':
+        series = np.polynomial.Polynomial.fit(x, y, 1 if model == 'linear' else min(degree, x.size - 1))
+        params = {'coef': series.coef.tolist(), 'domain': series.domain.tolist()}
+        size = series.coef.size
+    elif model == 'piecewise':
+        # Least squares values of the knots, the curve is a sum of hat functions
+        grid = np.linspace(x[0], x[-1], min(knots, x.size))
+        basis = np.stack([np.interp(x, grid, hat) for hat in np.eye(grid.size)], axis=1)
+        values = np.linalg.lstsq(basis, y, rcond=None)[0]
+        params = {'knots': grid.tolist(), 'values': values.tolist()}
+        size = grid.size
+    elif model == 'spline':
+        order = min(3, x.size - 1)
+        if smoothing is None:
+            # The second differences of white noise have 6 times its variance
+            smoothing = x.size * float(np.var(np.diff(y, 2))) / 6 if x.size > 2 else 0.0
+        t, c, k = _scipy_interpolate().splrep(x, y, k=order, s=smoothing)
+        params = {'t': t.tolist(), 'c': c.tolist(), 'k': int(k)}
+        size = max(len(t) - k - 1, 1)
+    else:
+        raise ValueError(f"Unknown calibration model {model!r}, use one of {', '.join(MODELS)}")
+
+    branch = BranchModel(model, params, (x[0], x[-1]), count=int(x.size))
+    residuals = y - branch.field(x)
+    branch.residual_std = math.sqrt(float(residuals @ residuals) / (x.size - size)) if x.size > size else math.nan
+    return branch
+
+
+# Define a function to find the direction of every point of a sweep
+def sweep_directions(values):
+    """
+    :param values: array of currents (or fields) in the order they were swept.
+    :return: tuple of boolean arrays, True where the point was reached by an ascending step and
+        True where it was reached by a descending step. The first point takes the direction of
+        the step after it and a repeated value keeps the direction of the previous step.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    steps = np.sign(np.diff(values))
+    if steps.size == 0 or not np.any(steps):
+        return np.ones(values.shape, dtype=bool), np.zeros(values.shape, dtype=bool)
+
+    # Carry the last non zero step over the repeated values
+    nonzero = np.flatnonzero(steps)
+    last = np.maximum.accumulate(np.where(steps != 0, np.arange(steps.size), nonzero[0]))
+    steps = steps[last]
+    direction = np.concatenate([steps[:1], steps])
+    return direction > 0, direction < 0
+
+
+class FieldCalibration:
+    """
+    Current to field calibration of the magnet, with one model per branch of the hysteresis loop.
+
+    fit splits the points of a calibration sweep by the direction of the current steps (a sweep
+    going up and back down measures both branches, its turning point belongs to both) and fits
+    each branch. The lookups convert a
+    whole array in one call; by default each value uses the branch of its step in the array, so a
+    planned sweep of fields is converted to the currents that give them along its own direction.
+    A calibration with a single measured branch uses it for both directions.
+    """
+
+    def __init__(self, up, down=None, metadata=None):
+        """
+        :param up: BranchModel of the ascending current branch.
+        :param down: BranchModel of the descending current branch, None if it wasn't measured.
+        :param metadata: dict saved with the calibration, e.g. the settings of the sweep.
+        """
+        self.up = up
+        self.down = down
+        self.metadata = metadata or {}
+
+    # Define a function to fit a calibration to the points of a sweep
+    @classmethod
+    def fit(cls, current, field, model='poly', metadata=None, **options):
+        """
+        :param current: array of currents in mA, in the order they were measured.
+        :param field: array of fields in G, same length.
+        :param model: one of MODELS.
+        :param metadata: dict saved with the calibration.
+        :param options: degree, knots or smoothing arguments of fit_branch.
+        :return: the FieldCalibration.
+        """
+        current = np.asarray(current, dtype=np.float64)
+        field = np.asarray(field, dtype=np.float64)
+        ascending, descending = sweep_directions(current)
+
+        # The turning points of the sweep belong to both branches
+        turning = np.zeros(current.shape, dtype=bool)
+        turning[:-1] = ascending[:-1] != ascending[1:]
+        ascending, descending = ascending | turning, descending | turning
+        up = fit_branch(current[ascending], field[ascending], model, **options)
+        down = None
+        if np.unique(current[descending]).size >= 2:
+            down = fit_branch(current[descending], field[descending], model, **options)
+        return cls(up, down, metadata)
+
+    # Define a function to get the model of a branch
+    def branch(self, name):
+        """
+        :param name: 'up' or 'down'.
+        :return: the BranchModel, the ascending one if the descending branch wasn't measured.
+        """
+        if name not in ('up', 'down'):
+            raise ValueError(f"Unknown branch {name!r}, use 'up' or 'down'")
+        return self.down if name == 'down' and self.down is not None else self.up
+
+    # Define a function to check that every branch can be inverted
+    def check(self):
+        """
+        :raise ValueError: if the model of a branch isn't strictly monotonic over its current range.
+        """
+        for model in (self.up, self.down):
+            if model is not None:
+                model.check()
+
+    # Define a function to convert currents to fields
+    def field(self, current, branch=None):
+        """
+        :param current: a float or array of currents in mA.
+        :param branch: 'up', 'down', or None to use the direction of each step of the array.
+        :return: the field in G, an array of the same shape or a float.
+        """
+        return self._lookup('field', current, branch)
+
+    # Define a function to convert fields to currents
+    def current(self, field, branch=None):
+        """
+        :param field: a float or array of fields in G.
+        :param branch: 'up', 'down', or None to use the direction of each step of the array.
+        :return: the current in mA, an array of the same shape or a float.
+        """
+        return self._lookup('current', field, branch)
+
+    def _lookup(self, name, values, branch):
+        values = np.asarray(values, dtype=np.float64)
+        if branch is not None or values.ndim == 0 or self.down is None:
+            return getattr(self.branch(branch or 'up'), name)(values)
+
+        # Convert the values of each direction with its branch
+        flat = values.ravel()
+        ascending, descending = sweep_directions(flat)
+        result = np.empty(flat.size)
+        result[ascending] = getattr(self.up, name)(flat[ascending])
+        result[descending] = getattr(self.down, name)(flat[descending])
+        return result.reshape(values.shape)
+
+    # Define a function to describe the calibration
+    def summary(self):
+        """
+        :return: text with the model, range, points and residual standard error of each branch.
+        """
+        lines = []
+        for name, branch in (('up', self.up), ('down', self.down)):
+            if branch is None:
+                lines.append(f"{name}: not measured, the up branch is used")
+                continue
+            low, high = branch.current_range
+            lines.append(f"{name}: {branch.kind} model, {low:g}..{high:g} mA, {branch.count} points, "
+                         f"residual standard error {branch.residual_std:.4g} G")
+        return "\n".join(lines)
+
+    # Define a function to save the calibration
+    def save(self, path):
+        """
+        Writes the calibration to a versioned JSON file.
+        :param path: path of the calibration file.
+        """
+        data = {'format': 'field_calibration', 'version': CALIBRATION_VERSION,
+                'created': datetime.now().isoformat(timespec='seconds'), 'units': {'current': 'mA', 'field': 'G'},
+                'metadata': self.metadata, 'up': self.up.to_dict(),
+                'down': self.down.to_dict() if self.down is not None else None}
+        with open(path, 'w') as file:
+            json.dump(data, file, indent=2)
+
+    # Define a function to load a calibration file
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: path of a calibration file written by save, or of a calibration.txt with
+            the "a1,a0" constants of a linear calibration, valid for any current.
+        :return: the FieldCalibration.
+        :raise ValueError: if the file was written by a newer version.
+        """
+        with open(path) as file:
+            text = file.read()
+        if not text.lstrip().startswith('{'):
+            slope, intercept = (float(value) for value in text.split(','))
+            line = BranchModel('linear', {'coef': [intercept, slope], 'domain': [-1.0, 1.0]},
+                               (-math.inf, math.inf), count=0)
+            return cls(line, metadata={'source': path})
+
+        data = json.loads(text)
+        if data.get('format') != 'field_calibration':
+            raise ValueError(f"{path} isn't a field calibration file")
+        if data['version'] > CALIBRATION_VERSION:
+            raise ValueError(f"{path} has version {data['version']}, this program reads up to version "
+                             f"{CALIBRATION_VERSION}")
+        down = BranchModel.from_dict(data['down']) if data['down'] is not None else None
+        return cls(BranchModel.from_dict(data['up']), down, data.get('metadata'))
@@ -3,9 +3,13 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, \
     QWidget, QProgressBar
-from PyQt5.QtCore import Qt
-from time import sleep
+from PyQt5.QtCore import Qt, pyqtSlot
 import sys
+from data_writer import StreamingDataWriter, new_data_path
+from live_plot import LivePlot
+from render_scheduler import RenderScheduler
+from sample_store import SampleStore
+from sweep_worker import SweepWorker, start_worker
 
 
 class MainWindow(QMainWindow):
@@ -57,6 +61,14 @@ class MainWindow(QMainWindow):
         self.ax.set_ylabel('Proportional Values')
         self.ax.set_title('Sweep Plot')
 
+        # Create the live plot engine with one persistent line for the sweep
+        self.live_plot = LivePlot(self.canvas, self.ax)
+        self.live_plot.add_series('sweep', linestyle='-', marker='o', color='r')
+
+        # Draw the stored points at most 20 times per second, whatever the acquisition rate
+        self.render_scheduler = RenderScheduler(self.render_points, rate=20.0, parent=self)
+        self.rendered_points = 0
+
         # Create buttons to run the script and abort
         self.button_run = QPushButton('Run Script')
         self.button_run.clicked.connect(self.run_script)
@@ -112,6 +124,13 @@ class MainWindow(QMainWindow):
         # Set button boolean value to False
         self.button_bool = False
 
+        # Worker running the sweep loop and its thread
+        self.worker = None
+        self.worker_thread = None
+
+        # Create the store of the measured points, read by the plot as views
+        self.data_store = SampleStore(['sweep', 'value'])
+
         # Set the default values of the input line edits
         self.max_edit.setText("1000")
         self.min_edit.setText("0")
@@ -122,6 +141,10 @@ class MainWindow(QMainWindow):
     def toggle_bool(self):
         self.button_bool = not self.button_bool
 
+        # Stop the acquisition loop running in the worker thread
+        if self.button_bool and self.worker is not None:
+            self.worker.abort()
+
     # Define a function that reads the inputs
     def read_inputs(self):
 
@@ -133,10 +156,6 @@ class MainWindow(QMainWindow):
         return max_val, min_val, steps_val, wait
 
     def run_script(self):
-        # Create a list to store the x and y data points
-        self.x_data = []
-        self.y_data = []
-
         # Get the input values from the line edits
         max_val, min_val, steps_val, wait = self.read_inputs()
 
@@ -150,61 +169,82 @@ class MainWindow(QMainWindow):
         # Create an array of sweep values
         sweep_vals = np.arange(min_val, max_val + steps_val, steps_val)
 
-        # Create a list to store the proportional values
-        prop_vals = []
-
-        # Clear the previous plot
-        self.canvas.figure.clear()
-
-        # Create a new set of subplots
-        self.ax = self.canvas.figure.add_subplot(111)
-        self.ax.set_xlabel('Sweep Values')
-        self.ax.set_ylabel('Proportional Values')
-        self.ax.set_title('Sweep Plot')
+        # Calculate the total number of data points to be plotted
+        self.data_points = len(sweep_vals)
 
-        # Loop through the sweep values and calculate proportional values
-        for val in sweep_vals:
+        # Empty the data store, preallocated for the whole sweep
+        self.data_store.clear(capacity=self.data_points)
 
-            # If clause to check for abort button press
-            if self.button_bool == False:
-
-                # Calculate the proportional value
-                prop_val = val * 1.45
-
-                # Calculate the total number of data points to be plotted
-                data_points = ((max_val - min_val) / steps_val) + 1
-
-                # Add the data points to the x and y data lists
-                self.x_data.append(val)
-                self.y_data.append(prop_val)
-                print(f"x: {val}", f"y: {prop_val}")
-
-                # Add the proportional value to the list
-                prop_vals.append(prop_val)
-
-                # Update the progress bar
-                current_index = len(prop_vals)
-                progress = round(current_index / data_points * 100)
-                self.progress_bar.setValue(progress)
-
-                # Plot the current data point
-                self.ax.plot(self.x_data, self.y_data, linestyle='-', marker='o', color='r')
-
-                # Draw the plot on the canvas
-                self.canvas.draw()
-
-                # Wait between plots
-                QApplication.processEvents()
-                sleep(wait/1000)
-
-            # Else clause to end the program
-            else:
-                self.calib_edit.setText("aborted")
-                self.calib2_edit.setText("aborted")
-                break
+        # Clear the previous plot
+        self.live_plot.reset()
+        self.rendered_points = 0
+
+        # Disable the run button until the sweep finishes
+        self.button_run.setEnabled(False)
+
+        # Stream every point to a data file while the sweep runs
+        writer = StreamingDataWriter(new_data_path('sweep_plot'), ['sweep', 'value', 'timestamp'],
+                                     metadata={'min': min_val, 'max': max_val, 'steps': steps_val, 'wait': wait})
+        print(f"Saving data to {writer.path}")
+
+        # Run the sweep loop in a worker thread, the points are sent back in batches
+        self.worker = SweepWorker(sweep_vals, self.measure_point, wait=wait/1000, writer=writer)
+        self.worker.points_ready.connect(self.add_points)
+        self.worker.finished.connect(self.sweep_finished)
+        self.worker.error.connect(self.sweep_error)
+        if self.button_bool:
+            self.worker.abort()
+        self.worker_thread = start_worker(self.worker)
+
+    # Define the measurement of a single point, it runs in the worker thread
+    @staticmethod
+    def measure_point(val):
+        # Calculate the proportional value
+        return val * 1.45
+
+    # Define a function that adds the points measured by the worker
+    @pyqtSlot(list)
+    def add_points(self, points):
+        vals = [point[1] for point in points]
+        prop_vals = [point[2] for point in points]
+
+        # Add the data points to the data store
+        self.data_store.append(vals, prop_vals)
+        for val, prop_val in zip(vals, prop_vals):
+            print(f"x: {val}", f"y: {prop_val}")
+
+        # Draw them with the next frame
+        self.render_scheduler.request()
+
+    # Define a function that draws the points stored since the previous frame
+    def render_points(self):
+        count = len(self.data_store)
+
+        # Update the progress bar
+        progress = round(count / self.data_points * 100)
+        self.progress_bar.setValue(progress)
+
+        # Plot views of the stored columns and redraw only the plotted line
+        sweep, value = self.data_store.column('sweep'), self.data_store.column('value')
+        self.live_plot.set_data('sweep', sweep, value, new_x=sweep[self.rendered_points:],
+                                new_y=value[self.rendered_points:])
+        self.live_plot.update()
+        self.rendered_points = count
+
+    # Define a function that prints the errors raised in the worker thread
+    @pyqtSlot(str)
+    def sweep_error(self, message):
+        print(f"Sweep error: {message}")
+
+    # Define a function that runs when the sweep loop ends
+    @pyqtSlot(bool)
+    def sweep_finished(self, aborted):
+        # Draw the last points and fit the plot limits to the final data
+        self.render_scheduler.flush()
+        self.live_plot.fit_to_data()
 
         # Add the constants to the line edit if abort button was not clicked
-        if self.button_bool == False:
+        if not aborted:
             constant1 = 0.5
             constant2 = 1.5
             self.calib_edit.setText(f"constant1: {constant1}")
@@ -213,14 +253,26 @@ class MainWindow(QMainWindow):
             print(f"constant1: {constant1}")
             print(f"constant2: {constant2}")
         else:
+            self.calib_edit.setText("aborted")
+            self.calib2_edit.setText("aborted")
             print("Measurement aborted")
 
         # Update boolean value to run again
         self.button_bool = False
+        self.worker = None
+        self.button_run.setEnabled(True)
 
         # Print an empty line
         print("")
 
+    # Define a function to stop the worker thread when the window is closed
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.worker.abort()
+        if self.worker_thread is not None:
+            self.worker_thread.wait()
+        super().closeEvent(event)
+
 
 if __name__ == '__main__':
     app = QApplication([])
@@ -1,33 +1,24 @@
 import sys
-import numpy as np
+from functools import partial
+from time import perf_counter
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QTabWidget, QVBoxLayout, QHBoxLayout, QLabel,\
-    QPlainTextEdit, QSplitter, QSpinBox, QRadioButton, QTableWidget, QPushButton, QProgressBar, QFrame, QTableWidgetItem
-from PyQt5.QtCore import Qt
+    QPlainTextEdit, QSplitter, QSpinBox, QDoubleSpinBox, QRadioButton, QTableView, QPushButton, QProgressBar, QFrame, \
+    QHeaderView, QCheckBox, QListWidget
+from PyQt5.QtCore import Qt, QTimer, pyqtSlot
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 import matplotlib.pyplot as plt
-from time import sleep
-
-# -------------- EXTERNAL FUNCTIONS -------------- #
-
-# Function to build array of sweep values depending on path selection
-def build_array(num_paths, points_arr, steps_arr):
-    sweep_values = []
-
-    for i in range(num_paths):
-        start_index = i
-        end_index = i + 1
-
-        start_point = points_arr[start_index]
-        end_point = points_arr[end_index]
-        step_size = steps_arr[start_index]
-
-        # Generate sweep values from start_point to end_point with step_size
-        sweep_values.extend(list(range(int(start_point), int(end_point), int(step_size))))
-
-    # Add final point to sweep values
-    sweep_values.append(points_arr[num_paths])
-
-    return sweep_values
+from console_writer import ConsoleWriter
+from data_writer import StreamingDataWriter, new_data_path
+from instrument_lock import InstrumentLock
+from live_plot import LivePlot
+from paths_acquisition import DATA_COLUMNS, measure_point, settings_size, settings_sweep
+from profile_panel import ProfilePanel
+from render_scheduler import RenderScheduler
+from sample_store import SampleStore
+from stage_timing import TimingTable, timing_path
+from sweep_queue import JobQueue, format_duration
+from sweep_worker import SweepWorker, start_worker
+from table_model import SampleTableModel
 
 # -------------- CLASS DEFINITION -------------- #
 
@@ -68,49 +59,56 @@ class MainWindow(QMainWindow):
         # Create spin boxes and labels for the first tab
         # Point A
         pointA_label = QLabel('Point A')
-        self.pointA_edit = QSpinBox()
+        self.pointA_edit = QDoubleSpinBox()
+        self.pointA_edit.setDecimals(3)
         self.pointA_edit.setMinimum(-20000)
         self.pointA_edit.setMaximum(20000)
         self.pointA_edit.setFixedWidth(100)
 
         # Point B
         pointB_label = QLabel('Point B')
-        self.pointB_edit = QSpinBox()
+        self.pointB_edit = QDoubleSpinBox()
+        self.pointB_edit.setDecimals(3)
         self.pointB_edit.setMinimum(-20000)
         self.pointB_edit.setMaximum(20000)
         self.pointB_edit.setFixedWidth(100)
 
         # Point C
         pointC_label = QLabel('Point C')
-        self.pointC_edit = QSpinBox()
+        self.pointC_edit = QDoubleSpinBox()
+        self.pointC_edit.setDecimals(3)
         self.pointC_edit.setMinimum(-20000)
         self.pointC_edit.setMaximum(20000)
         self.pointC_edit.setFixedWidth(100)
 
         # Point D
         pointD_label = QLabel('Point D')
-        self.pointD_edit = QSpinBox()
+        self.pointD_edit = QDoubleSpinBox()
+        self.pointD_edit.setDecimals(3)
         self.pointD_edit.setMinimum(-20000)
         self.pointD_edit.setMaximum(20000)
         self.pointD_edit.setFixedWidth(100)
 
         # Point E
         pointE_label = QLabel('Point E')
-        self.pointE_edit = QSpinBox()
+        self.pointE_edit = QDoubleSpinBox()
+        self.pointE_edit.setDecimals(3)
         self.pointE_edit.setMinimum(-20000)
         self.pointE_edit.setMaximum(20000)
         self.pointE_edit.setFixedWidth(100)
 
         # Point F
         pointF_label = QLabel('Point F')
-        self.pointF_edit = QSpinBox()
+        self.pointF_edit = QDoubleSpinBox()
+        self.pointF_edit.setDecimals(3)
         self.pointF_edit.setMinimum(-20000)
         self.pointF_edit.setMaximum(20000)
         self.pointF_edit.setFixedWidth(100)
 
         # Point G
         pointG_label = QLabel('Point G')
-        self.pointG_edit = QSpinBox()
+        self.pointG_edit = QDoubleSpinBox()
+        self.pointG_edit.setDecimals(3)
         self.pointG_edit.setMinimum(-20000)
         self.pointG_edit.setMaximum(20000)
         self.pointG_edit.setFixedWidth(100)
@@ -118,42 +116,48 @@ class MainWindow(QMainWindow):
         # Create labels and spin boxes for steps
         # Step A-B
         step1_label = QLabel('Step A-B')
-        self.step1_edit = QSpinBox()
+        self.step1_edit = QDoubleSpinBox()
+        self.step1_edit.setDecimals(3)
         self.step1_edit.setMinimum(-20000)
         self.step1_edit.setMaximum(20000)
         self.step1_edit.setFixedWidth(100)
 
         # Step B-C
         step2_label = QLabel('Step B-C')
-        self.step2_edit = QSpinBox()
+        self.step2_edit = QDoubleSpinBox()
+        self.step2_edit.setDecimals(3)
         self.step2_edit.setMinimum(-20000)
         self.step2_edit.setMaximum(20000)
         self.step2_edit.setFixedWidth(100)
 
         # Step C-D
         step3_label = QLabel('Step C-D')
-        self.step3_edit = QSpinBox()
+        self.step3_edit = QDoubleSpinBox()
+        self.step3_edit.setDecimals(3)
         self.step3_edit.setMinimum(-20000)
         self.step3_edit.setMaximum(20000)
         self.step3_edit.setFixedWidth(100)
 
         # Step D-E
         step4_label = QLabel('Step D-E')
-        self.step4_edit = QSpinBox()
+        self.step4_edit = QDoubleSpinBox()
+        self.step4_edit.setDecimals(3)
         self.step4_edit.setMinimum(-20000)
         self.step4_edit.setMaximum(20000)
         self.step4_edit.setFixedWidth(100)
 
         # Step E-F
         step5_label = QLabel('Step E-F')
-        self.step5_edit = QSpinBox()
+        self.step5_edit = QDoubleSpinBox()
+        self.step5_edit.setDecimals(3)
         self.step5_edit.setMinimum(-20000)
         self.step5_edit.setMaximum(20000)
         self.step5_edit.setFixedWidth(100)
 
         # Step F-G
         step6_label = QLabel('Step F-G')
-        self.step6_edit = QSpinBox()
+        self.step6_edit = QDoubleSpinBox()
+        self.step6_edit.setDecimals(3)
         self.step6_edit.setMinimum(-20000)
         self.step6_edit.setMaximum(20000)
         self.step6_edit.setFixedWidth(100)
@@ -171,7 +175,7 @@ class MainWindow(QMainWindow):
         self.pow_edit.setFixedWidth(100)
         measurements_label = QLabel('# of measurements')
         self.measurements_edit = QSpinBox()
-        self.measurements_edit.setMinimum(-20000)
+        self.measurements_edit.setMinimum(1)
         self.measurements_edit.setMaximum(20000)
         self.measurements_edit.setFixedWidth(100)
         time_label = QLabel('Time between')
@@ -179,10 +183,27 @@ class MainWindow(QMainWindow):
         self.time_edit.setMinimum(-20000)
         self.time_edit.setMaximum(20000)
         self.time_edit.setFixedWidth(100)
-
-        # Create a table widget for the data
-        self.table = QTableWidget(1, 2)
-        self.table.setHorizontalHeaderLabels(['Sweep Values', 'Values of interest'])
+        self.adaptive_check = QCheckBox('Adaptive steps')
+        budget_label = QLabel('Point budget')
+        self.budget_edit = QSpinBox()
+        self.budget_edit.setMinimum(2)
+        self.budget_edit.setMaximum(1000000)
+        self.budget_edit.setFixedWidth(100)
+
+        # Create a table view for the data, backed by a numpy column store
+        self.data_store = SampleStore(['sweep', 'value', 'std', 'samples'])
+        self.table_model = SampleTableModel(self.data_store, ['Sweep Values', 'Values of interest', 'Std deviation',
+                                                              'Samples'])
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+
+        # Create the table of the time spent in each stage of every point, shown in the timing
+        # tab (its panel is created when the tab is first opened) and exported next to the data file
+        self.timing = TimingTable()
+        self.profile_panel = None
+        self.data_path = None
 
         # Create canvas for the plot
         self.figure = plt.Figure()
@@ -192,6 +213,14 @@ class MainWindow(QMainWindow):
         self.ax.set_ylabel('Variable of interest')
         self.ax.set_title('Sweep Plot')
 
+        # Create the live plot engine with one persistent line for the sweep and its error bars
+        self.live_plot = LivePlot(self.canvas, self.ax)
+        self.live_plot.add_series('sweep', errorbars=True, linestyle='-', marker='o', color='r')
+
+        # Draw the stored points at most 20 times per second, whatever the acquisition rate
+        self.render_scheduler = RenderScheduler(self.render_points, rate=20.0, parent=self)
+        self.rendered_points = 0
+
         # Create button to run script and abort
         self.button_run = QPushButton('Run Script')
         self.button_run.clicked.connect(self.run_script)
@@ -199,8 +228,20 @@ class MainWindow(QMainWindow):
         self.button_abort.setCheckable(True)
         self.button_abort.clicked.connect(self.toggle_bool)
 
-        # Create progress bar
+        # Create the job queue list and its buttons
+        self.queue_list = QListWidget()
+        self.button_add_job = QPushButton('Add to Queue')
+        self.button_add_job.clicked.connect(self.add_job)
+        self.button_remove_job = QPushButton('Remove')
+        self.button_remove_job.clicked.connect(self.remove_job)
+        self.button_clear_queue = QPushButton('Clear')
+        self.button_clear_queue.clicked.connect(self.clear_queue)
+        self.button_run_queue = QPushButton('Run Queue')
+        self.button_run_queue.clicked.connect(self.run_queue)
+
+        # Create progress bar and the label with the queue progress
         self.progress_bar = QProgressBar()
+        self.queue_label = QLabel('')
 
         # Create a QPlainTextEdit widget to display the console output
         self.console = QPlainTextEdit(self)
@@ -271,9 +312,15 @@ class MainWindow(QMainWindow):
         setup_layout2.addWidget(self.measurements_edit)
         setup_layout2.addWidget(time_label)
         setup_layout2.addWidget(self.time_edit)
+        setup_layout3 = QVBoxLayout()
+        setup_layout3.addWidget(self.adaptive_check)
+        setup_layout3.addWidget(budget_label)
+        setup_layout3.addWidget(self.budget_edit)
+        setup_layout3.addStretch()
         setup_layout = QHBoxLayout()  # Final layout for setup variables
         setup_layout.addLayout(setup_layout1)
         setup_layout.addLayout(setup_layout2)
+        setup_layout.addLayout(setup_layout3)
 
         # Add a separator line between the layouts
         line1 = QFrame()
@@ -304,6 +351,28 @@ class MainWindow(QMainWindow):
         tab2.setLayout(tab2_layout)
         self.tab_widget.addTab(tab2, "Data")
 
+        # Create the third tab with the job queue
+        queue_button_layout1 = QHBoxLayout()
+        queue_button_layout1.addWidget(self.button_add_job)
+        queue_button_layout1.addWidget(self.button_remove_job)
+        queue_button_layout2 = QHBoxLayout()
+        queue_button_layout2.addWidget(self.button_clear_queue)
+        queue_button_layout2.addWidget(self.button_run_queue)
+        tab3 = QWidget()
+        tab3_layout = QVBoxLayout()
+        tab3_layout.addWidget(QLabel('Queued Sweeps'))
+        tab3_layout.addWidget(self.queue_list)
+        tab3_layout.addLayout(queue_button_layout1)
+        tab3_layout.addLayout(queue_button_layout2)
+        tab3.setLayout(tab3_layout)
+        self.tab_widget.addTab(tab3, "Queue")
+
+        # Create the fourth tab with the timing of the points
+        self.timing_tab = QWidget()
+        self.timing_tab.setLayout(QVBoxLayout())
+        self.tab_widget.addTab(self.timing_tab, "Timing")
+        self.tab_widget.currentChanged.connect(self.show_timing)
+
         # Create a layout for the tabs
         left_layout = QVBoxLayout()
         left_layout.addWidget(self.tab_widget)
@@ -318,6 +387,7 @@ class MainWindow(QMainWindow):
         right_layout.addWidget(self.canvas)
         right_layout.addLayout(button_layout)
         right_layout.addWidget(self.progress_bar)
+        right_layout.addWidget(self.queue_label)
 
         # Create a layout with the left and right layouts
         top_layout = QHBoxLayout()
@@ -345,6 +415,20 @@ class MainWindow(QMainWindow):
         # Set button boolean value to False
         self.button_bool = False
 
+        # Worker running the sweep loop and its thread
+        self.worker = None
+        self.worker_thread = None
+
+        # Adaptive sweep of the running sweep, None for a sweep with fixed steps
+        self.adaptive_sweep = None
+
+        # Queue of sweeps, the settings and start time of the running sweep and the queue state
+        self.job_queue = JobQueue(settings_size)
+        self.sweep_settings = None
+        self.sweep_start = 0.0
+        self.queue_running = False
+        self.queue_total = 0
+
         # Set default values of inputs
         radio1.setChecked(True)
         self.radio_value = 1
@@ -367,27 +451,16 @@ class MainWindow(QMainWindow):
         self.pow_edit.setValue(12)
         self.measurements_edit.setValue(1)
         self.time_edit.setValue(500)
+        self.budget_edit.setValue(200)
 
         # Redirect the stdout and stderr streams to the console widget
-        sys.stdout = self.ConsoleWriter(self.console, sys.stdout)
-        sys.stderr = self.ConsoleWriter(self.console, sys.stderr)
+        # (buffered, the widget is updated on a timer and the output still reaches the terminal)
+        sys.stdout = ConsoleWriter(self.console, sys.stdout)
+        sys.stderr = ConsoleWriter(self.console, sys.stderr)
 
         # Show the GUI
         self.show()
 
-    # -------------- CONSOLE WRITER CLASS -------------- #
-
-    class ConsoleWriter:
-        def __init__(self, console, stream):
-            self.console = console
-            self.stream = stream
-
-        def write(self, text):
-            self.console.insertPlainText(text)
-
-        def flush(self):
-            pass
-
     # -------------- METHODS -------------- #
 
     # Define function to update radio button value
@@ -398,24 +471,28 @@ class MainWindow(QMainWindow):
     def toggle_bool(self):
         self.button_bool = not self.button_bool
 
+        # Stop the acquisition loop running in the worker thread
+        if self.button_bool and self.worker is not None:
+            self.worker.abort()
+
     # Define a function that reads the inputs
     def read_inputs(self):
         # Read input values
-        pointA = float(self.pointA_edit.text())
-        pointB = float(self.pointB_edit.text())
-        pointC = float(self.pointC_edit.text())
-        pointD = float(self.pointD_edit.text())
-        pointE = float(self.pointE_edit.text())
-        pointF = float(self.pointF_edit.text())
-        pointG = float(self.pointG_edit.text())
+        pointA = self.pointA_edit.value()
+        pointB = self.pointB_edit.value()
+        pointC = self.pointC_edit.value()
+        pointD = self.pointD_edit.value()
+        pointE = self.pointE_edit.value()
+        pointF = self.pointF_edit.value()
+        pointG = self.pointG_edit.value()
         points_arr = [pointA, pointB, pointC, pointD, pointE, pointF, pointG]
 
-        stepAB = float(self.step1_edit.text())
-        stepBC = float(self.step2_edit.text())
-        stepCD = float(self.step3_edit.text())
-        stepDE = float(self.step4_edit.text())
-        stepEF = float(self.step5_edit.text())
-        stepFG = float(self.step6_edit.text())
+        stepAB = self.step1_edit.value()
+        stepBC = self.step2_edit.value()
+        stepCD = self.step3_edit.value()
+        stepDE = self.step4_edit.value()
+        stepEF = self.step5_edit.value()
+        stepFG = self.step6_edit.value()
         steps_arr = [stepAB, stepBC, stepCD, stepDE, stepEF, stepFG]
 
         freq = float(self.freq_edit.text())
@@ -426,100 +503,289 @@ class MainWindow(QMainWindow):
 
         return points_arr, steps_arr, setups_arr
 
+    # Define a function that returns the inputs as a settings dict, the format of sweep_cli.py
+    def current_settings(self):
+        points_array, steps_array, setups_array = self.read_inputs()
+        num_paths = self.radio_value
+        return {'sweep': 'paths', 'points': points_array[:num_paths + 1], 'steps': steps_array[:num_paths],
+                'frequency': setups_array[0], 'power': setups_array[1], 'measurements': int(setups_array[2]),
+                'wait': setups_array[3],
+                'adaptive_budget': self.budget_edit.value() if self.adaptive_check.isChecked() else None}
+
     def run_script(self):
+        self.queue_running = False
+        self.start_sweep(self.current_settings())
 
-        print('Running script...')
+    # Define a function that starts the sweep of a settings dict
+    def start_sweep(self, settings, name=None):
+        """
+        :param settings: dict returned by current_settings.
+        :param name: name of the queued job, added to the data file name.
+        """
+        print('Running script...' if name is None else f'Running {name}...')
 
-        # Create a list to store the x and y data points
-        self.x_data = []
-        self.y_data = []
+        # The thread of the previous sweep quits right after its last signal
+        if self.worker_thread is not None:
+            self.worker_thread.wait()
 
         # Reset progress bar
         self.progress_bar.setValue(0)
 
-        # Get the input values and store them in variables
-        points_array, steps_array, setups_array = self.read_inputs()
-        wait = setups_array[3]
-
-        # Build the array of current values
-        num_paths = self.radio_value
-        sweep_array = build_array(num_paths, points_array, steps_array)
-        print(sweep_array)
-
-        # Create a list to store the resulting values
-        resulting_vals = []
-
-        # Clear the previous table elements
-        self.table.clearContents()
-        self.table.setRowCount(1)
-        self.table.setColumnCount(2)
+        # Get the settings and store them in variables
+        points_array, steps_array = settings['points'], settings['steps']
+        setups_array = [settings['frequency'], settings['power'], settings['measurements'], settings['wait']]
+        samples = max(int(settings['measurements']), 1)
+        self.samples = samples
+        wait = settings['wait']
+        self.sweep_settings = settings
+
+        # Build the array of current values, or the adaptive sweep choosing them from the measurements
+        num_paths = len(points_array) - 1
+        sweep_array = settings_sweep(settings)
+        if settings['adaptive_budget'] is not None:
+            self.adaptive_sweep = sweep_array
+            print(f"Adaptive sweep of at most {len(sweep_array)} points")
+        else:
+            self.adaptive_sweep = None
+            print(sweep_array)
+
+        # Get the total number of datapoints to be plotted
+        self.data_points = len(sweep_array)
+
+        # Empty the data store, preallocated for the whole sweep, and the table showing it
+        self.data_store.clear(capacity=self.data_points)
+        self.table_model.reset()
+        self.timing.clear(capacity=self.data_points)
+        if self.profile_panel is not None:
+            self.profile_panel.clear()
 
         # Clear the previous plot
-        self.canvas.figure.clear()
-
-        # Create a new set of subplots
-        self.ax = self.canvas.figure.add_subplot(111)
-        self.ax.set_xlabel('Sweep Values')
-        self.ax.set_ylabel('Variable of interest')
-        self.ax.set_title('Sweep Plot')
-
-        # Loop through the sweep values and get variable of interest values
-        for idx, val in enumerate(sweep_array):
-
-            # If clause to check for abort button press
-            if self.button_bool == False:
-
-                # Get variable of interest value
-                value_of_interest = np.random.normal(0, 1)
-
-                # Get the total number of datapoints to be plotted
-                data_points = len(sweep_array)
-
-                # Add the data points to the x and y data lists
-                self.x_data.append(val)
-                self.y_data.append(value_of_interest)
-
-                # Add the value of interest to the list
-                resulting_vals.append(value_of_interest)
-
-                # Update the progress bar
-                current_index = len(resulting_vals)
-                progress = round(current_index / data_points * 100)
-                self.progress_bar.setValue(progress)
-
-                # Plot the current data point
-                self.ax.plot(self.x_data, self.y_data, linestyle='-', marker='o', color='r')
-
-                # Draw the plot on the canvas
-                self.canvas.draw()
-
-                # Inject new data to the table widget in the second tab
-                new_data = [val, value_of_interest]
-                if idx == 0:
-                    for i, value in enumerate(new_data):
-                        item = QTableWidgetItem(str(value))
-                        self.table.setItem(0, i, item)
-                else:
-                    self.table.insertRow(self.table.rowCount())
-                    for i, value in enumerate(new_data):
-                        item = QTableWidgetItem(str(value))
-                        self.table.setItem(self.table.rowCount()-1, i, item)
-
-                # Wait between plots
-                QApplication.processEvents()
-                sleep(wait / 1000)
-
-            # Else clause to end the program
+        self.live_plot.reset()
+        self.rendered_points = 0
+
+        # Disable the run buttons until the sweep finishes
+        self.button_run.setEnabled(False)
+        self.button_run_queue.setEnabled(False)
+
+        # Stream every point to a data file while the sweep runs, one file per queued job
+        budget = settings['adaptive_budget']
+        writer = StreamingDataWriter(new_data_path('sweep_paths' if name is None else f'sweep_paths_{name}'),
+                                     DATA_COLUMNS,
+                                     metadata={'path': num_paths, 'points': points_array, 'steps': steps_array,
+                                               'setups': setups_array, 'adaptive_budget': budget})
+        print(f"Saving data to {writer.path}")
+        self.data_path = writer.path
+
+        # Run the sweep loop in a worker thread, the points are sent back in batches. The sweep
+        # holds the instrument lock, so it doesn't start while another sweep uses the instruments
+        self.worker = SweepWorker(sweep_array, partial(self.measure_point, samples=samples), wait=wait/1000,
+                                  writer=writer, lock=InstrumentLock(), timing=self.timing)
+        self.worker.points_ready.connect(self.add_points)
+        self.worker.finished.connect(self.sweep_finished)
+        self.worker.error.connect(self.sweep_error)
+        if self.button_bool:
+            self.worker.abort()
+        self.sweep_start = perf_counter()
+        self.worker_thread = start_worker(self.worker)
+        self.update_queue_label()
+
+    # Define a function that adds the current settings to the queue
+    def add_job(self):
+        settings = self.current_settings()
+        # Settings that can't be swept, e.g. a step of 0, are refused
+        try:
+            size = settings_size(settings)
+        except ValueError as e:
+            print(f"The job was not added: {e}")
+            return
+        job = self.job_queue.add(settings)
+        setups = f"{settings['frequency']:g} / {settings['power']:g}"
+        self.queue_list.addItem(f"{job.name}: {len(settings['points']) - 1} paths, {size} points, "
+                                f"frequency / power {setups}, wait {settings['wait']:g} ms")
+        self.update_queue_label()
+
+    # Define a function that removes the selected job from the queue
+    def remove_job(self):
+        row = self.queue_list.currentRow()
+        if row >= 0:
+            self.job_queue.remove(row)
+            self.queue_list.takeItem(row)
+            self.update_queue_label()
+
+    def clear_queue(self):
+        self.job_queue.clear()
+        self.queue_list.clear()
+        self.update_queue_label()
+
+    # Define a function that runs the queued sweeps one after the other
+    def run_queue(self):
+        if not len(self.job_queue):
+            print('The queue is empty')
+            return
+        self.queue_running = True
+        self.queue_total = len(self.job_queue)
+        self.job_queue.finished = 0
+        self.job_queue.failures = 0
+        self.run_next_job()
+
+    # Define a function that starts the next job of the queue
+    def run_next_job(self):
+        job = self.job_queue.pop()
+        self.queue_list.takeItem(0)
+        # A job that can't start (e.g. the data file can't be created) fails, the queue goes on
+        try:
+            self.start_sweep(job.settings, job.name)
+        except Exception as e:
+            print(f"Job {job.name} failed: {type(e).__name__}: {e}")
+            self.worker = None
+            self.job_queue.record(job.settings, 0, 0.0, failed=True)
+            self.continue_queue(False)
+
+    # Define a function that starts the next job of the queue or ends the queue
+    def continue_queue(self, stopped):
+        """
+        :param stopped: the operator aborted the last sweep, the jobs left are not run.
+        """
+        # Start the next job once the thread of the last sweep quit
+        if self.queue_running and not stopped and len(self.job_queue):
+            QTimer.singleShot(0, self.run_next_job)
+            return
+        if self.queue_running:
+            if stopped:
+                print(f'Queue stopped, {len(self.job_queue)} jobs not run')
             else:
-                print('Measurement Aborted')
-                break
+                print(f'Queue finished, {self.job_queue.failures} failed jobs')
+        self.queue_running = False
+        self.button_run.setEnabled(True)
+        self.button_run_queue.setEnabled(True)
+        self.update_queue_label()
+
+    # Define a function that shows the queue progress and the estimated time left
+    def update_queue_label(self):
+        running = self.sweep_settings if self.worker is not None else None
+        if self.queue_running:
+            text = f"Job {self.job_queue.finished + 1}/{self.queue_total}"
+        elif len(self.job_queue):
+            text = f"{len(self.job_queue)} queued jobs"
+        else:
+            self.queue_label.setText('')
+            return
+        eta = self.job_queue.eta(running, len(self.data_store) if running is not None else 0)
+        self.queue_label.setText(f"{text}, estimated time left {format_duration(eta)}")
+
+    # Define the measurement of a single point, it runs in the worker thread
+    measure_point = staticmethod(measure_point)
+
+    # Define a function that adds the points measured by the worker
+    @pyqtSlot(list)
+    def add_points(self, points):
+        vals = [point[1] for point in points]
+        values_of_interest, stds, kept = zip(*[point[2] for point in points])
+
+        # Add the data points to the data store, they are drawn with the next frame
+        self.data_store.append(vals, values_of_interest, stds, kept)
+        self.render_scheduler.request()
+
+    # Define a function that draws the points stored since the previous frame
+    def render_points(self):
+        # Show the new points in the table of the second tab, the rows are added in one batch
+        start = perf_counter()
+        self.table_model.sync()
+        self.timing.add(self.rendered_points, len(self.data_store), 'table', perf_counter() - start)
+        start = perf_counter()
+
+        # Update the progress bar
+        current_index = len(self.data_store)
+        progress = round(current_index / self.data_points * 100)
+        self.progress_bar.setValue(progress)
+
+        # Plot views of the stored columns with their error bars, drawn when each point averages
+        # several readings, and redraw only the plotted lines. The points of an adaptive sweep
+        # are drawn in the order of the path
+        order = self.adaptive_sweep.order(current_index) if self.adaptive_sweep is not None else None
+        sweep, value, std = (self.data_store.column(name) for name in ('sweep', 'value', 'std'))
+        new = slice(self.rendered_points, None)
+        self.live_plot.set_data('sweep', sweep, value, new_x=sweep[new], new_y=value[new],
+                                yerr=std if self.samples > 1 else None, new_yerr=std[new], order=order)
+        self.live_plot.update()
+        self.timing.add(self.rendered_points, current_index, 'plot', perf_counter() - start)
+        self.rendered_points = current_index
+        self.update_queue_label()
+        if self.profile_panel is not None:
+            self.profile_panel.update_timing(self.timing, self.data_points - current_index)
+
+    # Define a function that shows the timing panel when its tab is opened
+    def show_timing(self, index):
+        """
+        Creates the panel with the histograms of the time spent in each stage of the points the
+        first time the timing tab is opened.
+        :param index: index of the current tab.
+        """
+        if self.tab_widget.widget(index) is not self.timing_tab:
+            return
+        if self.profile_panel is None:
+            self.profile_panel = ProfilePanel()
+            self.timing_tab.layout().addWidget(self.profile_panel)
+        remaining = self.data_points - len(self.data_store) if self.worker is not None else 0
+        self.profile_panel.update_timing(self.timing, remaining, force=True)
+
+    # Define a function that prints the errors raised in the worker thread
+    @pyqtSlot(str)
+    def sweep_error(self, message):
+        print(f"Sweep error: {message}")
+
+    # Define a function that runs when the sweep loop ends
+    @pyqtSlot(bool)
+    def sweep_finished(self, aborted):
+        # Draw the last points
+        self.render_scheduler.flush()
+
+        failed = self.worker.is_failed()
+        if failed:
+            print('Measurement Failed')
+        elif aborted:
+            print('Measurement Aborted')
+        else:
+            # An adaptive sweep can end before using its whole budget
+            self.progress_bar.setValue(100)
+
+        # Fit the plot limits to the final data
+        self.live_plot.fit_to_data()
+
+        # Export the time spent in each stage of every point next to the data file
+        path = timing_path(self.data_path)
+        self.timing.save(path)
+        print(f"Timing of the points saved to {path}")
+        if self.profile_panel is not None:
+            self.profile_panel.update_timing(self.timing, 0, force=True)
+
+        # Learn the time per point for the time estimates of the queue
+        self.job_queue.record(self.sweep_settings, len(self.data_store), perf_counter() - self.sweep_start, failed)
 
         # Update boolean value to run again
         self.button_bool = False
+        self.worker = None
 
         # Print an empty line
         print("")
 
+        # Only an abort of the operator stops the queue, a failed job is followed by the next one
+        self.continue_queue(aborted and not failed)
+
+    # Define a function to stop the worker thread when the window is closed
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.worker.abort()
+        if self.worker_thread is not None:
+            self.worker_thread.wait()
+
+        # Give the original streams back
+        if isinstance(sys.stdout, ConsoleWriter):
+            sys.stdout = sys.stdout.stream
+        if isinstance(sys.stderr, ConsoleWriter):
+            sys.stderr = sys.stderr.stream
+        super().closeEvent(event)
+
 # -------------- BOILERPLATE CODE / MAIN ENTRY POINT OF GUI -------------- #
 
 
@@ -0,0 +1,98 @@
+import os
+import sys
+import tempfile
+from time import monotonic, sleep
+
+if sys.platform == 'win32':
+    import msvcrt
+else:
+    import fcntl
+
+
+# Default lock file, shared by every program driving the instruments of the bench
+LOCK_PATH = os.path.join(tempfile.gettempdir(), 'sweep_guis_instruments.lock')
+
+
+class InstrumentBusy(Exception):
+    """
+    Raised when the instruments are locked by another sweep.
+    """
+
+
+class InstrumentLock:
+    """
+    Lock held by a sweep while it drives the instruments, so two sweeps (two windows, a window and
+    sweep_cli.py, or the jobs of a queue) never talk to the bench at the same time.
+
+    The lock is an operating system lock on a file (flock, or msvcrt.locking on Windows), so it
+    works across processes and it is released by the system if the program holding it crashes.
+    """
+
+    def __init__(self, path=LOCK_PATH, timeout=0.0, interval=0.1):
+        """
+        :param path: path of the lock file.
+        :param timeout: time in seconds acquire waits for another sweep to release the lock.
+        :param interval: time in seconds between two attempts while waiting.
+        """
+        self.path = path
+        self.timeout = timeout
+        self.interval = interval
+        self._file = None
+
+    # Define a function to take the lock
+    def acquire(self, abort=None):
+        """
+        :param abort: optional threading.Event that stops the waiting.
+        :raise InstrumentBusy: if another sweep still holds the lock after the timeout.
+        """
+        if self._file is not None:
+            raise RuntimeError("The instrument lock is already held")
+        file = open(self.path, 'a+')
+        deadline = monotonic() + self.timeout
+        while True:
+            try:
+                _lock(file)
+                break
+            except OSError:
+                if monotonic() >= deadline or (abort is not None and abort.is_set()):
+                    file.close()
+                    raise InstrumentBusy(f"The instruments are used by another sweep (lock file {self.path})")
+                sleep(self.interval)
+        self._file = file
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            _unlock(self._file)
+        finally:
+            self._file.close()
+            self._file = None
+
+    @property
+    def locked(self):
+        return self._file is not None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+# Define the functions locking the first byte of the lock file without blocking
+def _lock(file):
+    if sys.platform == 'win32':
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    else:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def _unlock(file):
+    if sys.platform == 'win32':
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,193 @@
+from time import sleep, perf_counter
+
+
+class InstrumentTimeout(Exception):
+    """
+    Raised when an instrument doesn't report the end of an operation in time.
+    """
+    pass
+
+
+class KepcoBOP:
+    """
+    Driver for the KEPCO BOP20-20DL Power Supply.
+
+    The driver remembers the mode, voltage limit, output state and current setpoint it already
+    sent, so setting a new point only sends the ':curr' command. Instead of sleeping a fixed time
+    after each write, it waits for the supply to report the end of the operation, either with the
+    '*OPC?' query or by polling the ESB bit of the status byte.
+    """
+
+    # Event Summary Bit of the IEEE 488.2 status byte
+    ESB_BIT = 0x20
+
+    def __init__(self, resource, voltage_limit=20, completion='opc', timeout=5.0, poll_interval=0.005):
+        """
+        :param resource: pyvisa resource of the power supply (GPIB0::1::INSTR).
+        :param voltage_limit: voltage limit in Volts used in current mode.
+        :param completion: 'opc' to wait with the '*OPC?' query, 'stb' to poll the status byte
+            or None to not wait at all.
+        :param timeout: maximum time in seconds to wait for an operation to complete.
+        :param poll_interval: time in seconds between two status byte polls.
+        """
+        self.resource = resource
+        self.voltage_limit = voltage_limit
+        self.completion = completion
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.invalidate()
+
+    # Define a function to forget the cached state
+    def invalidate(self):
+        """
+        Forgets the state sent to the supply, the next setpoint will send the full configuration
+        again. Call it when the resource was cleared, reopened or used by someone else.
+        """
+        self.mode = None
+        self.voltage = None
+        self.output = None
+        self.current = None
+        self._esr_enabled = False
+
+    # Define a function to send a command and wait until the supply executed it
+    def write(self, command):
+        """
+        Sends a command and waits for its completion with the configured method.
+        :param command: SCPI command string.
+        """
+        if self.completion == 'stb':
+            self._write_stb(command)
+        else:
+            self.resource.write(command)
+            if self.completion == 'opc':
+                self.wait_complete()
+
+    # Define a function to wait for the end of the pending operations
+    def wait_complete(self):
+        """
+        Blocks until the supply finished the pending operations, using the '*OPC?' query.
+        """
+        start = perf_counter()
+        while self.resource.query('*OPC?').strip() != '1':
+            if perf_counter() - start > self.timeout:
+                raise InstrumentTimeout("KEPCO power supply did not complete the operation in time")
+
+    def _write_stb(self, command):
+        """
+        Sends a command followed by '*OPC' and polls the status byte until the Event Summary Bit is set.
+        """
+        if not self._esr_enabled:
+            # Report Operation Complete (bit 0 of the event status register) in the status byte
+            self.resource.write('*ESE 1;*CLS')
+            self._esr_enabled = True
+        self.resource.write(f'{command};*OPC')
+        start = perf_counter()
+        while not self.resource.read_stb() & self.ESB_BIT:
+            if perf_counter() - start > self.timeout:
+                raise InstrumentTimeout("KEPCO power supply did not complete the operation in time")
+            sleep(self.poll_interval)
+
+        # Reading the event status register clears the Event Summary Bit
+        self.resource.query('*ESR?')
+
+    # Define a function to set the output current
+    def set_current(self, current):
+        """
+        Sets the output current, sending only the commands whose state changed.
+        :param current: output current in Ampere units.
+        """
+        commands = []
+        if self.mode != 'curr':
+            commands.append('func:mode curr')
+        if self.current != current:
+            commands.append(f':curr {current}')
+        if self.voltage != self.voltage_limit:
+            commands.append(f':volt {self.voltage_limit}')
+        if self.output != 'ON':
+            commands.append(':OUTP ON')
+        if not commands:
+            return
+
+        # Join the commands in a single message, the first one doesn't need the leading colon
+        self.write(';'.join(commands).lstrip(':'))
+        self.mode = 'curr'
+        self.current = current
+        self.voltage = self.voltage_limit
+        self.output = 'ON'
+
+    # Define a function to read the output current
+    def read_current(self):
+        """
+        Queries the supply for the actual output current.
+        :return: a float with the value of the actual current (Ampere) the instrument is outputting.
+        """
+        outp_str = self.resource.query("curr?").splitlines()
+        return float(outp_str[0])
+
+    # Define a function to set the current and read it back
+    def set_and_read(self, current):
+        """
+        Sets the output current and returns the current the supply is actually outputting.
+        :param current: output current in Ampere units.
+        :return: a float with the value of the actual current (Ampere).
+        """
+        self.set_current(current)
+        return self.read_current()
+
+
+class DTM133:
+    """
+    Driver for the Group3 DTM-133 Digital Teslameter.
+
+    A burst of readings is requested with a single message of chained field queries ('f;f;...'),
+    answered by a single message, instead of one bus round trip per reading. Whether the
+    teslameter (or the GPIB adapter in front of it) accepts chained queries is detected on the
+    first burst: if the answer doesn't hold one reading per query, the driver clears the device
+    and falls back to one query per reading from then on.
+    """
+
+    def __init__(self, resource, burst=None):
+        """
+        :param resource: pyvisa resource of the teslameter (GPIB0::3::INSTR).
+        :param burst: True or False to force the chained queries on or off, None to detect it.
+        """
+        self.resource = resource
+        self.burst = burst
+
+    # Define a function to read the magnetic field
+    def read_field(self):
+        """
+        :return: float with the magnetic field in Gauss (G).
+        """
+        return self._parse(self.resource.query("f"))[0]
+
+    # Define a function to read a burst of magnetic field readings
+    def read_fields(self, count):
+        """
+        :param count: number of readings.
+        :return: list with count magnetic field readings in Gauss (G).
+        """
+        if count > 1 and self.burst is not False:
+            # A garbled or short answer means chained queries aren't supported, the I/O errors
+            # (timeouts...) are raised as for a single reading
+            answer = self.resource.query(';'.join(["f"] * count))
+            try:
+                fields = self._parse(answer)
+            except ValueError:
+                fields = []
+            if len(fields) == count:
+                self.burst = True
+                return fields
+            # Drop any partial answer, chained queries are not supported if it was the first try
+            self.resource.clear()
+            if self.burst is None:
+                self.burst = False
+        return [self.read_field() for _ in range(count)]
+
+    @staticmethod
+    def _parse(answer):
+        """
+        :param answer: answer of one or more chained field queries, e.g. '12.3G;12.4G'.
+        :return: list with the readings as floats.
+        """
+        return [float(part.split('G')[0]) for part in answer.strip().split(';') if part.strip()]
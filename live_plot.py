@@ -0,0 +1,358 @@
+import numpy as np
+from decimation import MinMaxDecimator, lttb_indices, minmax_indices
+
+
+class LivePlot:
+    """
+    Live plot engine shared by the sweep GUIs.
+
+    Each data series is drawn by a single persistent Line2D artist whose data is replaced with
+    set_data instead of calling ax.plot on the full history every point. The static part of the
+    figure (axes, ticks, labels) is cached as a background image and only the lines are redrawn
+    and blitted on top of it. The axis limits grow geometrically when a point falls outside of
+    them, so a sweep of N points only triggers O(log N) full redraws. Error bars are drawn as one
+    more persistent line whose vertical segments are separated by NaN values.
+
+    Long series are drawn decimated to the width of the axes in pixels: the full data stays in
+    the arrays given to set_data (the sample store) and the lines get the lowest and highest point
+    of buckets of consecutive points, computed incrementally as the points arrive, so the cost of
+    a frame doesn't grow with the length of the sweep. When the axes are zoomed in on part of the
+    data, the visible points are decimated again on the next full redraw.
+    """
+
+    def __init__(self, canvas, ax, margin=0.1, growth=0.5, decimation='minmax'):
+        """
+        :param canvas: FigureCanvasQTAgg widget the axes are drawn on.
+        :param ax: matplotlib axes that will hold the live lines.
+        :param margin: fraction of the data span left free around the data on a rescale.
+        :param growth: extra fraction of the data span added on a rescale so that the next points
+            are likely to fit inside the new limits without another full redraw.
+        :param decimation: 'minmax' to draw long series as the lowest and highest point of each
+            bucket, 'lttb' to reduce those points further with Largest Triangle Three Buckets
+            (one point per pixel), or None to draw every point.
+        """
+        self.canvas = canvas
+        self.ax = ax
+        self.margin = margin
+        self.growth = growth
+        self.decimation = decimation
+
+        # Persistent artists and their data buffers, keyed by series name
+        self.lines = {}
+        self.error_bars = {}
+        self._buffers = {}
+        self._sizes = {}
+
+        # Full data of each series (x, y, yerr), its decimator, and the width in pixels and x
+        # limits the lines were decimated for
+        self._data = {}
+        self._decimators = {}
+        self._width = self._axes_width()
+        self._view = None
+
+        # Cached background of the figure without the animated lines
+        self._background = None
+        self._needs_full_draw = True
+        self._draw_pending = False
+
+        # Bounds (x_low, x_high, y_low, y_high) of the data plotted since the last reset
+        self._bounds = None
+
+        # Recapture the background every time the canvas is fully redrawn (resize, rescale...)
+        self._draw_cid = self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    # Define a function to create a new series
+    def add_series(self, name, errorbars=False, **line_kwargs):
+        """
+        Creates the persistent line of a data series.
+        :param name: key used to refer to the series in append and set_data.
+        :param errorbars: also create the line drawing the vertical error bars of the series.
+        :param line_kwargs: keyword arguments passed to ax.plot (color, marker, linestyle...).
+        :return: the Line2D artist of the series.
+        """
+        line, = self.ax.plot([], [], animated=True, **line_kwargs)
+        self.lines[name] = line
+        if errorbars:
+            self.error_bars[name], = self.ax.plot([], [], animated=True, color=line.get_color(), linewidth=1,
+                                                  alpha=0.6)
+        self._buffers[name] = np.empty((2, 256), dtype=np.float64)
+        self._sizes[name] = 0
+        self._decimators[name] = MinMaxDecimator(self._width)
+        return line
+
+    # Define a function to clear the data of every series
+    def reset(self):
+        """
+        Removes the data of every series and resets the axis limits so a new sweep can start.
+        """
+        for name, line in self.lines.items():
+            self._sizes[name] = 0
+            self._data.pop(name, None)
+            self._decimators[name].reset()
+            line.set_data([], [])
+        for bars in self.error_bars.values():
+            bars.set_data([], [])
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self._bounds = None
+        self._needs_full_draw = True
+        self.update()
+
+    # Define a function to fit the axis limits to the data
+    def fit_to_data(self):
+        """
+        Sets the axis limits tightly around the plotted data (plus margin), e.g. once a sweep
+        has finished and the growth padding is not needed anymore.
+        """
+        if self._bounds is None:
+            return
+        growth = self.growth
+        self.growth = 0
+        self.ax.set_xlim(*self._grown_limits(self._bounds[0], self._bounds[1], self.ax.get_xlim()))
+        self.ax.set_ylim(*self._grown_limits(self._bounds[2], self._bounds[3], self.ax.get_ylim()))
+        self.growth = growth
+        self._needs_full_draw = True
+        self.update()
+
+    # Define a function to append new data points to a series
+    def append(self, name, x, y):
+        """
+        Appends one or more points to a series without redrawing it.
+        :param name: key of the series.
+        :param x: a float or array of x values.
+        :param y: a float or array of y values, same length as x.
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        buffer = self._buffers[name]
+        size = self._sizes[name]
+        new_size = size + x.size
+
+        # Grow the buffer geometrically so appends are amortized O(1)
+        if new_size > buffer.shape[1]:
+            capacity = max(new_size, 2 * buffer.shape[1])
+            new_buffer = np.empty((2, capacity), dtype=np.float64)
+            new_buffer[:, :size] = buffer[:, :size]
+            buffer = self._buffers[name] = new_buffer
+
+        buffer[0, size:new_size] = x
+        buffer[1, size:new_size] = y
+        self._sizes[name] = new_size
+        self.set_data(name, buffer[0, :new_size], buffer[1, :new_size], new_x=x, new_y=y)
+
+    # Define a function to replace the whole data of a series
+    def set_data(self, name, x, y, new_x=None, new_y=None, yerr=None, new_yerr=None, order=None):
+        """
+        Replaces the data of a series, e.g. with views on an externally owned array.
+        :param name: key of the series.
+        :param x: array with every x value of the series.
+        :param y: array with every y value of the series.
+        :param new_x: only the x values added since the last call, used to check the axis limits.
+            Defaults to the whole x array.
+        :param new_y: only the y values added since the last call. Defaults to the whole y array.
+        :param yerr: array with the half height of the error bar of every point, the series must
+            have been created with errorbars=True.
+        :param new_yerr: only the errors of the points added since the last call. Defaults to the
+            whole yerr array.
+        :param order: array of indices giving the order the points are drawn in, e.g. to draw the
+            points of an adaptive sweep along the sweep instead of in measurement order.
+        """
+        new_x = x if new_x is None else new_x
+        new_y = y if new_y is None else new_y
+        if order is not None:
+            x, y = np.asarray(x)[order], np.asarray(y)[order]
+            if yerr is not None:
+                new_yerr = yerr if new_yerr is None else new_yerr
+                yerr = np.asarray(yerr)[order]
+        self._data[name] = (np.asarray(x), np.asarray(y), None if yerr is None else np.asarray(yerr))
+        if yerr is None:
+            self._check_limits(new_x, new_y)
+        else:
+            # The limits have to hold the ends of the error bars
+            new_x = np.asarray(new_x, dtype=np.float64)
+            new_y = np.asarray(new_y, dtype=np.float64)
+            new_yerr = np.asarray(yerr if new_yerr is None else new_yerr, dtype=np.float64)
+            self._check_limits(np.concatenate((new_x, new_x)),
+                               np.concatenate((new_y - new_yerr, new_y + new_yerr)))
+
+        # Reordered data changes every time, its buckets are computed again
+        self._show(name, rebuild=order is not None)
+
+    # Define a function to give the data of a series to its lines
+    def _show(self, name, rebuild=False):
+        """
+        Sets the data of the line (and error bars) of a series, decimated if it is long.
+        :param rebuild: compute the buckets of the whole series again.
+        """
+        x, y, yerr = self._view_data(name, rebuild)
+        self.lines[name].set_data(x, y)
+        if yerr is not None:
+            self.error_bars[name].set_data(*self._error_segments(x, y, yerr))
+
+    def _view_data(self, name, rebuild):
+        """
+        :return: x, y and yerr arrays to draw for a series.
+        """
+        x, y, yerr = self._data[name]
+        limit = 4 * self._width
+        if self.decimation is None:
+            return x, y, yerr
+
+        # Zoomed in: decimate the visible points and their neighbours, the line is broken where
+        # the series leaves the view
+        x_low, x_high = sorted(self.ax.get_xlim())
+        if self._bounds is not None and (self._bounds[0] < x_low or self._bounds[1] > x_high):
+            inside = (x >= x_low) & (x <= x_high)
+            inside[1:] |= inside[:-1]
+            inside[:-1] |= inside[1:]
+            visible = np.flatnonzero(inside)
+            runs = np.cumsum(np.diff(visible, prepend=-1) > 1)
+            if visible.size > limit:
+                kept = self._reduce(x[visible], y[visible], minmax_indices(y[visible], self._width))
+                visible, runs = visible[kept], runs[kept]
+            return self._with_breaks(visible, runs, x, y, yerr)
+
+        if y.size <= limit:
+            return x, y, yerr
+        decimator = self._decimators[name]
+        if rebuild or decimator.size != self._width:
+            decimator.size = self._width
+            decimator.reset()
+        shown = self._reduce(x, y, decimator.update(y))
+        return x[shown], y[shown], None if yerr is None else yerr[shown]
+
+    def _reduce(self, x, y, indices):
+        """
+        :return: the min/max indices, reduced to one point per pixel for the lttb decimation.
+        """
+        if self.decimation == 'lttb':
+            return indices[lttb_indices(x[indices], y[indices], self._width)]
+        return indices
+
+    @staticmethod
+    def _with_breaks(indices, runs, x, y, yerr):
+        """
+        :param runs: array with the number of the run of consecutive visible points of each index.
+        :return: x, y and yerr arrays of the points of increasing indices, with a NaN point
+            between the points of different runs.
+        """
+        breaks = np.flatnonzero(np.diff(runs)) + 1
+        x = np.insert(x[indices].astype(np.float64), breaks, np.nan)
+        y = np.insert(y[indices].astype(np.float64), breaks, np.nan)
+        if yerr is not None:
+            yerr = np.insert(yerr[indices].astype(np.float64), breaks, np.nan)
+        return x, y, yerr
+
+    @staticmethod
+    def _error_segments(x, y, yerr):
+        """
+        :return: x and y arrays of one line drawing a vertical segment from y - yerr to y + yerr at
+            every x, the segments are separated by NaN values.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        yerr = np.asarray(yerr, dtype=np.float64)
+        segments = np.full((2, 3 * x.size), np.nan)
+        segments[0, 0::3] = x
+        segments[0, 1::3] = x
+        segments[1, 0::3] = y - yerr
+        segments[1, 1::3] = y + yerr
+        return segments[0], segments[1]
+
+    # Define a function to redraw the live plot
+    def update(self):
+        """
+        Redraws the live lines. A full redraw is only done when the axis limits changed or no
+        background has been cached yet, otherwise the lines are blitted on the cached background.
+        The full redraw of a shown canvas runs from the event loop (draw_idle).
+        """
+        if self._draw_pending:
+            return
+        if self._needs_full_draw or self._background is None:
+            self._needs_full_draw = False
+            # The full redraw of a shown canvas is deferred to the event loop and coalesced with
+            # the other draw requests, the draw_event callback caches the background and draws the
+            # lines with their data at that time. Blitting waits for the new background
+            if self.canvas.isVisible():
+                self._draw_pending = True
+                self.canvas.draw_idle()
+            else:
+                self.canvas.draw()
+            return
+
+        self.canvas.restore_region(self._background)
+        self._draw_lines()
+        self.canvas.blit(self.canvas.figure.bbox)
+
+    def _on_draw(self, event):
+        """
+        Caches the freshly drawn background and draws the animated lines on top of it, decimated
+        again if the size of the axes or the x limits changed.
+        """
+        self._draw_pending = False
+        self._needs_full_draw = False
+        self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._width = self._axes_width()
+        view = (self._width, self.ax.get_xlim())
+        if view != self._view:
+            self._view = view
+            for name in self._data:
+                self._show(name)
+        self._draw_lines()
+
+    def _axes_width(self):
+        """
+        :return: width of the axes in pixels, the number of buckets of the decimation.
+        """
+        return max(int(self.ax.get_window_extent().width), 100)
+
+    def _draw_lines(self):
+        for bars in self.error_bars.values():
+            self.ax.draw_artist(bars)
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+
+    def _check_limits(self, x, y):
+        """
+        Expands the axis limits if any of the new points falls outside of them.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        finite = np.isfinite(x) & np.isfinite(y)
+        if not finite.any():
+            return
+        x = x[finite]
+        y = y[finite]
+
+        # Update the bounds of the whole plotted history
+        new_bounds = [x.min(), x.max(), y.min(), y.max()]
+        first = self._bounds is None
+        if not first:
+            new_bounds = [min(self._bounds[0], new_bounds[0]), max(self._bounds[1], new_bounds[1]),
+                          min(self._bounds[2], new_bounds[2]), max(self._bounds[3], new_bounds[3])]
+        self._bounds = new_bounds
+
+        # Only the axis the data escaped from is rescaled
+        x_lim = self.ax.get_xlim()
+        if first or new_bounds[0] < x_lim[0] or new_bounds[1] > x_lim[1]:
+            self.ax.set_xlim(*self._grown_limits(new_bounds[0], new_bounds[1], x_lim))
+            self._needs_full_draw = True
+        y_lim = self.ax.get_ylim()
+        if first or new_bounds[2] < y_lim[0] or new_bounds[3] > y_lim[1]:
+            self.ax.set_ylim(*self._grown_limits(new_bounds[2], new_bounds[3], y_lim))
+            self._needs_full_draw = True
+
+    def _grown_limits(self, low, high, current):
+        """
+        Computes axis limits around the data span. The side(s) the data escaped from get an extra
+        growth padding so a sweep moving in one direction rescales only O(log N) times.
+        """
+        span = high - low
+        if span == 0:
+            span = abs(high) if high != 0 else 1.0
+        pad_low = pad_high = span * self.margin
+        if low < current[0]:
+            pad_low += span * self.growth
+        if high > current[1]:
+            pad_high += span * self.growth
+        return low - pad_low, high + pad_high
@@ -0,0 +1,81 @@
+from functools import partial
+import numpy as np
+from acquisition import burst_statistics
+from adaptive_sweep import AdaptiveSweep
+from sweep_paths import build_path, path_length, path_position, path_size
+
+
+# Columns of the path sweep data files, after the sweep value the values returned by measure_point
+DATA_COLUMNS = ['sweep', 'value', 'std', 'samples', 'timestamp']
+
+
+# Function to build array of sweep values depending on path selection
+def build_array(num_paths, points_arr, steps_arr):
+    """
+    Builds the sweep values of the first num_paths segments of the path settings.
+    :param num_paths: number of segments selected with the radio buttons (1 for A-B, 2 for A-B-C...).
+    :param points_arr: list with the path points (A, B, C...).
+    :param steps_arr: list with the step sizes between the path points (A-B, B-C...).
+    :return: float64 numpy array with the sweep values.
+    """
+    return build_path(points_arr[:num_paths + 1], steps_arr[:num_paths])
+
+
+# Function to build an adaptive sweep depending on path selection
+def build_adaptive(num_paths, points_arr, steps_arr, budget):
+    """
+    Builds an adaptive sweep of the first num_paths segments of the path settings. The sweep
+    refines the distance travelled along the path, so a path going back and forth is refined on
+    each of its segments, and the points stay on the grid of the smallest step.
+    :param num_paths: number of segments selected with the radio buttons (1 for A-B, 2 for A-B-C...).
+    :param points_arr: list with the path points (A, B, C...).
+    :param steps_arr: list with the step sizes between the path points (A-B, B-C...).
+    :param budget: maximum number of points of the sweep.
+    :return: AdaptiveSweep giving the sweep values.
+    """
+    points = points_arr[:num_paths + 1]
+    min_step = min(abs(step) for step in steps_arr[:num_paths])
+    return AdaptiveSweep(0, path_length(points), budget, min_step=min_step, position=partial(path_position, points))
+
+
+# Define a function to build the sweep of a settings dict
+def settings_sweep(settings):
+    """
+    :param settings: dict with the path sweep settings of the sweep_cli.py settings files (points,
+        steps and adaptive_budget), every segment of the points is swept.
+    :return: float64 numpy array with the sweep values, or an AdaptiveSweep.
+    """
+    points, steps = settings['points'], settings['steps']
+    if settings.get('adaptive_budget') is not None:
+        return build_adaptive(len(points) - 1, points, steps, settings['adaptive_budget'])
+    return build_array(len(points) - 1, points, steps)
+
+
+# Define a function to get the number of points of a settings dict
+def settings_size(settings):
+    """
+    :param settings: dict with the path sweep settings.
+    :return: number of points of the sweep, the budget of an adaptive sweep.
+    """
+    if settings.get('adaptive_budget') is not None:
+        return int(settings['adaptive_budget'])
+    return path_size(settings['points'], settings['steps'])
+
+
+# Define the measurement of a single point, it runs in the thread of the sweep loop
+def measure_point(val, samples=1):
+    """
+    Reads the variable of interest a number of times in one burst and averages the readings.
+    :param val: sweep value.
+    :param samples: number of readings of the point.
+    :return: tuple with the mean and standard deviation of the readings and the number of
+        readings kept after rejecting the outliers.
+    """
+    # A single reading doesn't need any statistics
+    if samples == 1:
+        return float(np.random.normal(0, 1)), 0.0, 1.0
+
+    # Get variable of interest values
+    readings = np.random.normal(0, 1, samples)
+    mean, std, kept = burst_statistics(readings)
+    return float(mean), float(std), float(kept)
@@ -0,0 +1,100 @@
+from time import perf_counter
+import numpy as np
+from PyQt5.QtWidgets import QLabel, QVBoxLayout, QWidget
+from sweep_queue import format_duration
+
+
+class ProfilePanel(QWidget):
+    """
+    Live view of the TimingTable of a sweep: the estimated time left, the mean and 95th
+    percentile of each stage, and a histogram of the durations of each stage.
+
+    The histograms are persistent step patches updated in place, the panel is only redrawn while
+    it is shown and at most once per interval, so it doesn't slow the sweep down.
+    """
+
+    def __init__(self, parent=None, interval=1.0, bins=30):
+        """
+        :param parent: optional parent widget.
+        :param interval: minimum time in seconds between two redraws of the histograms.
+        :param bins: number of bins of each histogram.
+        """
+        super().__init__(parent)
+        # Import matplotlib on first use, the windows can start without it
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+
+        self.interval = interval
+        self.bins = bins
+        self._last = -float('inf')
+        self._histograms = {}
+
+        self.eta_label = QLabel('')
+        self.stats_label = QLabel('')
+        self.figure = Figure(figsize=(4, 4))
+        self.figure.subplots_adjust(hspace=0.8, wspace=0.4)
+        self.canvas = FigureCanvas(self.figure)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.eta_label)
+        layout.addWidget(self.stats_label)
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+
+    # Define a function to show the timing of the sweep
+    def update_timing(self, timing, remaining, force=False):
+        """
+        :param timing: TimingTable of the sweep.
+        :param remaining: number of points left.
+        :param force: redraw even if the panel was redrawn less than an interval ago, e.g. once
+            the sweep has finished.
+        """
+        now = perf_counter()
+        if not self.isVisible() or (not force and now - self._last < self.interval):
+            return
+        self._last = now
+
+        eta = timing.eta(remaining)
+        periods = timing.periods()
+        rate = f", {1 / periods.mean():.3g} points/s" if periods.size and periods.mean() > 0 else ""
+        left = format_duration(eta) if not np.isnan(eta) else "unknown"
+        self.eta_label.setText(f"{len(timing)} points{rate}, estimated time left {left}")
+        self.stats_label.setText(timing.summary())
+
+        # One histogram per stage that was timed, in ms
+        for name in timing.stages:
+            values = timing.column(name)
+            values = values[~np.isnan(values)] * 1000
+            if values.size == 0:
+                continue
+            counts, edges = np.histogram(values, bins=self.bins)
+            ax, steps = self._histogram(name, len(timing.stages))
+            steps.set_data(counts, edges)
+            ax.set_xlim(edges[0], edges[-1])
+            ax.set_ylim(0, counts.max() * 1.1)
+        self.canvas.draw_idle()
+
+    def _histogram(self, name, count):
+        """
+        :return: axes and step patch of the histogram of a stage, created on first use.
+        """
+        if name not in self._histograms:
+            columns = 3
+            rows = -(-count // columns)
+            ax = self.figure.add_subplot(rows, columns, len(self._histograms) + 1)
+            ax.set_title(f"{name} (ms)", fontsize=8)
+            ax.tick_params(labelsize=6)
+            steps = ax.stairs([0], [0, 1], fill=True)
+            self._histograms[name] = (ax, steps)
+        return self._histograms[name]
+
+    def clear(self):
+        """
+        Removes the histograms, e.g. before a new sweep.
+        """
+        self.figure.clear()
+        self._histograms = {}
+        self.eta_label.setText('')
+        self.stats_label.setText('')
+        if self.isVisible():
+            self.canvas.draw_idle()
@@ -0,0 +1,64 @@
+from time import perf_counter
+from PyQt5.QtCore import QObject, QTimer
+
+
+class RenderScheduler(QObject):
+    """
+    Caps the rate at which a window redraws its plot, progress bar and table during a sweep.
+
+    The windows store every batch of points as soon as it arrives and only request a render. The
+    requests are coalesced: a render runs at least one frame interval after the end of the
+    previous one and draws every point stored since then. A request made once the interval has
+    passed renders right away, the other ones start a single shot timer in the GUI thread for the
+    end of the interval, so a render also runs when the GUI thread is kept busy by the incoming
+    points and the timer can't fire. A slow render lowers the frame rate instead of keeping the
+    GUI thread busy. When the acquisition is faster than the renderer the points pile up in the
+    data store instead of in the queue of the event loop, so the sweep is no longer throttled by
+    the redraws.
+    """
+
+    def __init__(self, render, rate=20.0, parent=None):
+        """
+        :param render: function called without arguments to draw the stored points.
+        :param rate: maximum number of renders per second.
+        :param parent: optional QObject owning the scheduler.
+        """
+        super().__init__(parent)
+        self.render = render
+        self.interval = 1.0 / rate
+        self.frames = 0
+        self._pending = False
+        self._last = -float('inf')
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._render)
+
+    # Define a function to ask for a render
+    def request(self):
+        """
+        Renders now if the previous render ended more than a frame interval ago, otherwise
+        schedules a render for the end of the interval. Several requests give a single render.
+        """
+        self._pending = True
+        delay = self._last + self.interval - perf_counter()
+        if delay <= 0:
+            self.flush()
+        elif not self._timer.isActive():
+            self._timer.start(max(1, round(delay * 1000)))
+
+    # Define a function to render the pending points now
+    def flush(self):
+        """
+        Renders the pending points immediately, e.g. once the sweep has finished.
+        """
+        self._timer.stop()
+        if self._pending:
+            self._render()
+
+    def _render(self):
+        self._pending = False
+        self.frames += 1
+        try:
+            self.render()
+        finally:
+            self._last = perf_counter()
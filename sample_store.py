@@ -0,0 +1,130 @@
+import os
+import tempfile
+import numpy as np
+
+
+class SampleStore:
+    """
+    Columnar store of the points of a sweep.
+
+    Each column is a float64 numpy array inside one preallocated block that grows geometrically
+    when it is full, so appending a point is amortized O(1) and the columns can be read as views
+    without copying. Blocks bigger than memmap_threshold bytes are backed by a temporary file
+    (numpy memmap) instead of RAM, so very long runs don't have to fit in memory.
+    """
+
+    def __init__(self, columns, capacity=1024, memmap_threshold=256 * 2**20, directory=None):
+        """
+        :param columns: list with the names of the columns.
+        :param capacity: number of points allocated up front.
+        :param memmap_threshold: size in bytes above which the block is memory mapped, None to
+            always keep it in RAM.
+        :param directory: directory of the memory mapped files, defaults to the temp directory.
+        """
+        self.columns = list(columns)
+        self.memmap_threshold = memmap_threshold
+        self.directory = directory
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        self._path = None
+        self._data = self._allocate(capacity)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def capacity(self):
+        return self._data.shape[1]
+
+    @property
+    def is_memmap(self):
+        return self._path is not None
+
+    def _allocate(self, capacity):
+        """
+        Allocates a new block and releases the file of the previous one, if any.
+        :param capacity: number of points of the block.
+        :return: the new block, of shape (columns, capacity).
+        """
+        shape = (len(self.columns), max(int(capacity), 1))
+        old_path = self._path
+        self._path = None
+        if self.memmap_threshold is not None and 8 * shape[0] * shape[1] > self.memmap_threshold:
+            fd, self._path = tempfile.mkstemp(prefix='samples_', suffix='.f8', dir=self.directory)
+            os.close(fd)
+            data = np.memmap(self._path, dtype=np.float64, mode='w+', shape=shape)
+        else:
+            data = np.empty(shape, dtype=np.float64)
+        self._remove_file(old_path)
+        return data
+
+    @staticmethod
+    def _remove_file(path):
+        if path is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                # Still mapped by a view on Windows, it stays in the temp directory
+                pass
+
+    # Define a function to remove every point
+    def clear(self, capacity=None):
+        """
+        Removes every point, optionally reallocating the store for a known number of points.
+        :param capacity: number of points to allocate, keeps the current allocation if None.
+        """
+        if capacity is not None and capacity != self.capacity:
+            self._data = self._allocate(capacity)
+        self.size = 0
+
+    # Define a function to release the memory mapped file
+    def close(self):
+        """
+        Drops the stored points and deletes the memory mapped file, if any.
+        """
+        path, self._path = self._path, None
+        self._data = np.empty((len(self.columns), 1), dtype=np.float64)
+        self.size = 0
+        self._remove_file(path)
+
+    def _reserve(self, size):
+        if size > self.capacity:
+            old_data = self._data
+            new_data = self._allocate(max(size, 2 * self.capacity))
+            new_data[:, :self.size] = old_data[:, :self.size]
+            self._data = new_data
+
+    # Define a function to add points
+    def append(self, *columns):
+        """
+        Appends one or more points, given as one value (or array of values) per column.
+        :param columns: values of each column, in the order of the column names.
+        :return: the index of the first appended point.
+        """
+        values = np.asarray(columns, dtype=np.float64).reshape(len(self.columns), -1)
+        start = self.size
+        self._reserve(start + values.shape[1])
+        self._data[:, start:start + values.shape[1]] = values
+        self.size += values.shape[1]
+        return start
+
+    # Define a function to read a column
+    def column(self, name):
+        """
+        :param name: name or index of the column.
+        :return: read only view of the stored values of the column.
+        """
+        index = self._index[name] if isinstance(name, str) else name
+        view = self._data[index, :self.size]
+        view.flags.writeable = False
+        return view
+
+    # Define a function to read a single value
+    def value(self, row, column):
+        """
+        :param row: index of the point.
+        :param column: name or index of the column.
+        :return: the stored value as a float.
+        """
+        index = self._index[column] if isinstance(column, str) else column
+        return float(self._data[index, row])
@@ -0,0 +1,315 @@
+import json
+import math
+import random
+import threading
+from collections import namedtuple
+from time import sleep, monotonic
+
+
+# Same fields as pyvisa's ResourceInfo, the alias is at index 4
+ResourceInfo = namedtuple('ResourceInfo', ['interface_type', 'interface_board_number', 'resource_class',
+                                           'resource_name', 'alias'])
+
+
+class SimulatedMagnet:
+    """
+    Model of the electromagnet driven by the power supply and measured by the teslameter.
+
+    The coil current follows the supply setpoint with a first order lag, and the field relaxes
+    towards its equilibrium value with its own time constant. The equilibrium field has a linear
+    part, a saturating iron core part and a backlash type hysteresis: the iron core only follows
+    the current once it moved more than the coercive current away from its last turning point,
+    so ascending and descending sweeps give different fields.
+    """
+
+    def __init__(self, gauss_per_amp=150.0, saturation=2500.0, saturation_current=8.0, coercive_current=0.1,
+                 current_tau=0.02, field_tau=0.15, noise=0.5, seed=None):
+        """
+        :param gauss_per_amp: linear (air core) field per Ampere.
+        :param saturation: field of the saturated iron core in Gauss.
+        :param saturation_current: current scale of the core saturation in Ampere.
+        :param coercive_current: half width of the hysteresis loop in Ampere.
+        :param current_tau: time constant in seconds of the coil current.
+        :param field_tau: time constant in seconds of the field settling.
+        :param noise: standard deviation in Gauss of the teslameter readings.
+        :param seed: seed of the noise generator, for reproducible runs.
+        """
+        self.gauss_per_amp = gauss_per_amp
+        self.saturation = saturation
+        self.saturation_current = saturation_current
+        self.coercive_current = coercive_current
+        self.current_tau = current_tau
+        self.field_tau = field_tau
+        self.noise = noise
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.setpoint = 0.0
+        self.current = 0.0
+        self.core_current = 0.0
+        self.field = self.equilibrium_field(0.0, 0.0)
+        self._time = monotonic()
+
+    # Define a function to get the field the magnet would settle to
+    def equilibrium_field(self, current, core_current):
+        """
+        :return: the settled field in Gauss for a coil current and core state.
+        """
+        core = self.saturation * math.tanh(core_current / self.saturation_current)
+        return self.gauss_per_amp * current + core
+
+    def _advance(self):
+        """
+        Evolves the current and field up to the present time.
+        """
+        now = monotonic()
+        dt = now - self._time
+        self._time = now
+        if dt <= 0:
+            return
+
+        # Coil current, first order lag to the setpoint
+        self.current = self.setpoint + (self.current - self.setpoint) * math.exp(-dt / self.current_tau)
+
+        # Backlash hysteresis of the iron core
+        self.core_current = min(max(self.core_current, self.current - self.coercive_current),
+                                self.current + self.coercive_current)
+
+        # Field relaxation
+        target = self.equilibrium_field(self.current, self.core_current)
+        self.field = target + (self.field - target) * math.exp(-dt / self.field_tau)
+
+    def set_current(self, current):
+        with self._lock:
+            self._advance()
+            self.setpoint = current
+
+    def current_settle_time(self, tolerance=1e-4):
+        """
+        :return: time in seconds until the coil current is within tolerance (A) of the setpoint.
+        """
+        with self._lock:
+            self._advance()
+            error = abs(self.current - self.setpoint)
+            if error <= tolerance:
+                return 0.0
+            return self.current_tau * math.log(error / tolerance)
+
+    def read_current(self):
+        with self._lock:
+            self._advance()
+            return self.current
+
+    def read_field(self):
+        with self._lock:
+            self._advance()
+            return self.field + self._random.gauss(0.0, self.noise)
+
+
+class SimulatedResource:
+    """
+    Base class of the simulated pyvisa resources. Every bus transaction waits a latency and is
+    counted, so benchmarks can report the traffic of a driver.
+    """
+
+    def __init__(self, name, magnet, latency=0.002, command_latency=None):
+        """
+        :param name: VISA resource name.
+        :param magnet: SimulatedMagnet shared by the simulated instruments.
+        :param latency: time in seconds of a bus transaction.
+        :param command_latency: dict with specific latencies for some commands, e.g. {'f': 0.05}.
+        """
+        self.resource_name = name
+        self.magnet = magnet
+        self.latency = latency
+        self.command_latency = command_latency or {}
+        self.timeout = 2000
+        self.transactions = 0
+        self.bytes_written = 0
+        self._pending = None
+
+    def _transaction(self, command=''):
+        self.transactions += 1
+        self.bytes_written += len(command) + 1 if command else 0
+        # A command with a specific latency (e.g. a slow measurement) adds it for each time it is
+        # chained in the message
+        parts = [part.strip().lower() for part in command.split(';')]
+        delay = self.latency + sum(self.command_latency[part] - self.latency
+                                   for part in parts if part in self.command_latency)
+        if delay:
+            sleep(delay)
+
+    def clear(self):
+        self._transaction()
+        self._pending = None
+
+    def write(self, command):
+        self._transaction(command)
+        answers = []
+        for part in command.split(';'):
+            part = part.strip()
+            if part:
+                answer = self.handle(part)
+                if answer is not None:
+                    answers.append(answer)
+
+        # The answers of chained queries are sent back in one message separated by ';'
+        if len(answers) == 1:
+            self._pending = answers[0]
+        elif answers:
+            self._pending = ';'.join(answer.strip() for answer in answers) + '\n'
+        else:
+            self._pending = None
+
+    def read(self):
+        self._transaction()
+        answer, self._pending = self._pending, None
+        if answer is None:
+            raise IOError(f"{self.resource_name}: nothing to read")
+        return answer
+
+    def query(self, command):
+        self.write(command)
+        return self.read()
+
+    def read_stb(self):
+        self._transaction()
+        return 0
+
+    def close(self):
+        pass
+
+    def handle(self, command):
+        """
+        Executes a single command and returns the answer of queries, None otherwise.
+        """
+        raise NotImplementedError
+
+
+class SimulatedKepco(SimulatedResource):
+    """
+    Simulated KEPCO BOP20-20DL Power Supply answering the SCPI commands of supply_current2020
+    and the KepcoBOP driver.
+    """
+
+    # Event Summary Bit of the IEEE 488.2 status byte
+    ESB_BIT = 0x20
+
+    def __init__(self, name, magnet, **kwargs):
+        super().__init__(name, magnet, **kwargs)
+        self.mode = 'volt'
+        self.current_setpoint = 0.0
+        self.voltage = 0.0
+        self.output = False
+        self.esr = 0
+        self._opc_time = 0.0
+
+    def read_stb(self):
+        self._transaction()
+        return self.ESB_BIT if self.esr and monotonic() >= self._opc_time else 0
+
+    def handle(self, command):
+        header, _, argument = command.lstrip(':').lower().partition(' ')
+        if header == '*idn?':
+            return 'KEPCO,BOP20-20DL,SIMULATED,1.0\n'
+        if header == '*opc?':
+            # The operation is complete once the output current reached the setpoint
+            sleep(self.magnet.current_settle_time())
+            return '1\n'
+        if header == '*opc':
+            self.esr |= 1
+            self._opc_time = monotonic() + self.magnet.current_settle_time()
+        elif header == '*esr?':
+            esr, self.esr = self.esr, 0
+            return f'{esr}\n'
+        elif header == '*cls':
+            self.esr = 0
+        elif header in ('func:mode', 'func'):
+            self.mode = argument.strip()
+        elif header in ('curr', 'current'):
+            self.current_setpoint = float(argument)
+        elif header in ('volt', 'voltage'):
+            self.voltage = float(argument)
+        elif header in ('outp', 'output'):
+            self.output = argument.strip() in ('on', '1')
+        elif header in ('curr?', 'current?'):
+            return f'{self.magnet.read_current():.5E}\n'
+        elif header not in ('*ese', '*rst'):
+            raise ValueError(f"{self.resource_name}: unknown command '{command}'")
+
+        # Drive the magnet with the programmed current when the output is on in current mode
+        if self.output and self.mode.startswith('curr'):
+            self.magnet.set_current(self.current_setpoint)
+        else:
+            self.magnet.set_current(0.0)
+        return None
+
+
+class SimulatedTeslameter(SimulatedResource):
+    """
+    Simulated Group3 DTM-133 Digital Teslameter answering the field query of gaussm_query.
+    """
+
+    def handle(self, command):
+        command = command.lower()
+        if command == 'f':
+            return f'{self.magnet.read_field():.1f}G\r\n'
+        if command in ('id', '*idn?'):
+            return 'DTM-133 SIMULATED\r\n'
+        raise ValueError(f"{self.resource_name}: unknown command '{command}'")
+
+
+class SimulatedResourceManager:
+    """
+    Stand in for pyvisa.ResourceManager with a simulated power supply and teslameter sharing
+    one magnet, so the calibration can run without the GPIB bench.
+    """
+
+    def __init__(self, supply_name='GPIB0::1::INSTR', teslameter_name='GPIB0::3::INSTR', latency=0.002,
+                 command_latency=None, magnet=None, **magnet_kwargs):
+        """
+        :param supply_name: resource name of the simulated power supply.
+        :param teslameter_name: resource name of the simulated teslameter.
+        :param latency: time in seconds of a bus transaction.
+        :param command_latency: dict with specific latencies for some commands.
+        :param magnet: SimulatedMagnet to use. If None, one is created with magnet_kwargs.
+        :param magnet_kwargs: keyword arguments of SimulatedMagnet (field_tau, noise, coercive_current...).
+        """
+        self.magnet = magnet if magnet is not None else SimulatedMagnet(**magnet_kwargs)
+        self._classes = {supply_name: (SimulatedKepco, 'KEPCO'), teslameter_name: (SimulatedTeslameter, 'DTM133')}
+        self.latency = latency
+        self.command_latency = command_latency
+
+    def list_resources(self, query='?*::INSTR'):
+        return tuple(self._classes)
+
+    def resource_info(self, name):
+        alias = self._classes[name][1]
+        return ResourceInfo('GPIB', 0, 'INSTR', name, alias)
+
+    def open_resource(self, name, **kwargs):
+        if name not in self._classes:
+            raise ValueError(f"Resource {name} is not simulated")
+        resource_class = self._classes[name][0]
+        resource = resource_class(name, self.magnet, latency=self.latency, command_latency=self.command_latency)
+        for key, value in kwargs.items():
+            setattr(resource, key, value)
+        return resource
+
+    def close(self):
+        pass
+
+
+# Define a function to create the simulated resource manager from a configuration file
+def resource_manager_from_config(path=None):
+    """
+    Creates a SimulatedResourceManager with the settings of a JSON file, e.g.
+    {"latency": 0.005, "command_latency": {"f": 0.05}, "field_tau": 0.3, "noise": 1.0}.
+    :param path: path of the JSON file. If None or empty, the default settings are used.
+    :return: a SimulatedResourceManager.
+    """
+    settings = {}
+    if path:
+        with open(path) as file:
+            settings = json.load(file)
+    return SimulatedResourceManager(**settings)
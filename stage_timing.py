@@ -0,0 +1,196 @@
+import os
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+import numpy as np
+from data_writer import export_csv, write_data
+
+
+# Stages timed for each point. In the thread of the sweep loop: the current setpoint write, the
+# wait for the field to settle, the current readback and field query (read at the same time, so
+# they overlap), the whole measurement function and the wait between points. In the GUI thread:
+# the share of each frame spent drawing the plot and the table, and the console output
+STAGES = ['setpoint', 'settle', 'readback', 'field', 'measure', 'wait', 'plot', 'table', 'log']
+
+# Durations of the stages of the point being measured in each thread
+_local = threading.local()
+
+
+# Define a function to time a stage of the current point
+@contextmanager
+def stage(name):
+    """
+    Adds the duration of the enclosed block to a stage of the point measured in this thread.
+    Does nothing outside of a point started with TimingTable.start_point, e.g. in sweep_cli.py
+    without timing or when a function is called by hand.
+    :param name: name of the stage, one of STAGES.
+    """
+    durations = getattr(_local, 'durations', None)
+    if durations is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        durations[name] = durations.get(name, 0.0) + perf_counter() - start
+
+
+# Define a function to add a duration measured elsewhere to the current point
+def record(name, duration):
+    """
+    :param name: name of the stage, one of STAGES.
+    :param duration: duration in seconds, e.g. of a reading done in another thread.
+    """
+    durations = getattr(_local, 'durations', None)
+    if durations is not None:
+        durations[name] = durations.get(name, 0.0) + duration
+
+
+class TimingTable:
+    """
+    Duration of each stage of every point of a sweep, in seconds.
+
+    The table is a preallocated array with one row per point and one column per stage, plus the
+    start time of each point, so recording a point is a row write. The sweep loop adds the rows
+    from its thread and the window adds the time of its frames to the same rows from the GUI
+    thread, both under a lock. Stages that didn't run for a point are nan.
+    """
+
+    def __init__(self, capacity=1024, stages=None):
+        """
+        :param capacity: number of points preallocated, the table grows when it is full.
+        :param stages: list of stage names, STAGES by default.
+        """
+        self.stages = list(STAGES if stages is None else stages)
+        self._index = {name: index for index, name in enumerate(self.stages)}
+        self._lock = threading.Lock()
+        self._start = None
+        self.clear(capacity)
+
+    def clear(self, capacity=None):
+        """
+        Removes every point, e.g. before a new sweep.
+        :param capacity: optional new number of preallocated points.
+        """
+        with self._lock:
+            capacity = max(int(capacity if capacity is not None else len(self._start)), 1)
+            self._data = np.full((capacity, len(self.stages)), np.nan)
+            self._start = np.full(capacity, np.nan)
+            self.size = 0
+            self._origin = None
+
+    def __len__(self):
+        return self.size
+
+    # Define a function to start timing a point in the calling thread
+    def start_point(self):
+        _local.durations = {}
+        _local.start = perf_counter()
+
+    # Define a function to store the stages of the current point
+    def end_point(self, **measured):
+        """
+        Stores the stages timed in this thread since start_point as a new row.
+        :param measured: durations in seconds of stages timed by the caller, by stage name.
+        :return: index of the row.
+        """
+        durations, start = _local.durations, _local.start
+        _local.durations = None
+        durations.update(measured)
+        with self._lock:
+            if self.size == len(self._start):
+                self._grow()
+            if self._origin is None:
+                self._origin = start
+            row = self.size
+            self._start[row] = start - self._origin
+            for name, duration in durations.items():
+                self._data[row, self._index[name]] = duration
+            self.size += 1
+        return row
+
+    def _grow(self):
+        capacity = 2 * len(self._start)
+        data = np.full((capacity, len(self.stages)), np.nan)
+        data[:self.size] = self._data[:self.size]
+        start = np.full(capacity, np.nan)
+        start[:self.size] = self._start[:self.size]
+        self._data, self._start = data, start
+
+    # Define a function to add a duration shared by several points
+    def add(self, first, last, name, duration):
+        """
+        Adds a duration to a stage of the rows first to last - 1, split evenly between them, e.g.
+        a frame of the window drawing these points.
+        :param name: name of the stage.
+        :param duration: total duration in seconds.
+        """
+        with self._lock:
+            last = min(last, self.size)
+            if last <= first:
+                return
+            column = self._data[first:last, self._index[name]]
+            column[:] = np.nan_to_num(column) + duration / (last - first)
+
+    def column(self, name):
+        """
+        :return: copy of the durations of a stage, in seconds.
+        """
+        with self._lock:
+            return self._data[:self.size, self._index[name]].copy()
+
+    def periods(self):
+        """
+        :return: array with the time in seconds between the start of each point and the next one.
+        """
+        with self._lock:
+            return np.diff(self._start[:self.size])
+
+    # Define a function to estimate the time left
+    def eta(self, remaining, recent=50):
+        """
+        :param remaining: number of points left.
+        :param recent: number of last points whose mean period is used.
+        :return: estimated time left in seconds, nan before the second point.
+        """
+        periods = self.periods()[-recent:]
+        return remaining * periods.mean() if periods.size else np.nan
+
+    def summary(self):
+        """
+        :return: text with the mean and 95th percentile of each stage that was timed, in ms.
+        """
+        lines = []
+        for name in self.stages:
+            values = self.column(name)
+            values = values[~np.isnan(values)] * 1000
+            if values.size:
+                lines.append(f"{name}: mean {values.mean():.3g} ms, p95 {np.percentile(values, 95):.3g} ms")
+        return "\n".join(lines)
+
+    # Define a function to export the table next to the data file
+    def save(self, path, metadata=None, write_csv=False):
+        """
+        Writes the table in the binary format of the data files (read_data reads it back): the
+        index and start time of each point, then the duration of each stage in seconds, nan for
+        the stages that didn't run. Writing the binary file takes milliseconds, converting a long
+        sweep to CSV takes about a second.
+        :param path: path of the data file.
+        :param metadata: optional dict saved in the header.
+        :param write_csv: also write a CSV copy next to the file.
+        """
+        with self._lock:
+            table = np.column_stack((np.arange(self.size), self._start[:self.size], self._data[:self.size]))
+        write_data(path, ['index', 'start_s'] + [f'{name}_s' for name in self.stages], table, metadata)
+        if write_csv:
+            export_csv(path)
+
+
+# Define a function to get the path of the timing table of a data file
+def timing_path(data_path):
+    """
+    :param data_path: path of the data file of the sweep.
+    :return: path of its timing table, the data file path ending with _timing.sweep.
+    """
+    return os.path.splitext(data_path)[0] + '_timing.sweep'
@@ -0,0 +1,383 @@
+"""
+Headless runner of the sweeps of Calibration_GUI.py and gui_plot_paths.py.
+
+The sweep settings are read from a JSON file with the same fields as the windows, the sweep runs
+with the same acquisition code (SweepLoop and the measurement functions of
+calibration_acquisition.py and paths_acquisition.py) without loading Qt or matplotlib, every point
+is streamed to a data file in the data directory and a summary is printed at the end. Ctrl+C
+aborts the sweep cleanly (the power supply is set back to zero). Examples of settings files, the
+missing fields take the default values of the windows:
+
+    {"sweep": "calibration", "min": 0, "max": 1000, "steps": 100, "wait": 100, "samples": 1,
+     "settle_tolerance": 0, "settle_window": 100, "adaptive_budget": null, "round_trip": false,
+     "model": "poly"}
+
+    {"sweep": "calibration", "field_targets": true, "min": 500, "max": 2000, "steps": 250,
+     "field_tolerance": 1, "max_iterations": 5, "calibration_models": "calibration.json"}
+
+With "field_targets" the min, max and steps are fields in G: the current of each target comes
+from the calibration models (by default the JSON file next to --calibration-file, or the
+calibration file itself) and is corrected with the teslameter until the field is within the
+tolerance. The calibration files aren't rewritten by a field target sweep.
+
+    {"sweep": "paths", "points": [-1000, -100, 0, 100], "steps": [100, 10, 10], "frequency": 7000,
+     "power": 12, "measurements": 1, "wait": 500, "adaptive_budget": null}
+
+A settings file can also hold a list of sweeps, the queue of a measurement campaign. They run one
+after the other with the job progress and the estimated time left printed between them, and each
+job gets its own data file named after the optional "name" field of its settings (job1, job2...
+by default). Every sweep holds the instrument lock, so a sweep never starts while a window or
+another runner is using the instruments. A job that fails, e.g. because the instruments are busy,
+is reported in the summary and the next job runs; Ctrl+C stops the queue.
+
+The time spent in each stage of every point (setpoint, settle, readback, field, measure, wait)
+is written next to each data file, in the data file ending with _timing.sweep and its CSV copy,
+and its mean and 95th percentile are printed with the summary.
+
+Run it with:
+
+    python sweep_cli.py settings.json
+    python sweep_cli.py settings.json --simulate
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+from functools import partial
+from time import perf_counter
+from acquisition import ConvergenceStatistics, SettleStatistics
+from calibration import LinearCalibrator
+from data_writer import StreamingDataWriter, new_data_path
+from field_calibration import FieldCalibration
+from instrument_lock import InstrumentLock
+from stage_timing import TimingTable, timing_path
+from sweep_loop import SweepLoop
+from sweep_queue import JobQueue, format_duration
+
+# Default settings of each sweep, the ones of the windows
+CALIBRATION_DEFAULTS = {'min': 0, 'max': 1000, 'steps': 100, 'wait': 100, 'samples': 1, 'settle_tolerance': 0,
+                        'settle_window': 100, 'adaptive_budget': None, 'round_trip': False, 'model': 'poly',
+                        'field_targets': False, 'field_tolerance': 1.0, 'max_iterations': 5,
+                        'calibration_models': None}
+PATHS_DEFAULTS = {'frequency': 7000, 'power': 12, 'measurements': 1, 'wait': 500, 'adaptive_budget': None}
+
+
+class ProgressPrinter:
+    """
+    Receives the batches of the sweep loop and prints the progress at most every interval seconds.
+    """
+
+    def __init__(self, total, interval=5.0, on_points=None, quiet=False):
+        """
+        :param total: number of points of the sweep (the budget of an adaptive sweep).
+        :param interval: minimum time in seconds between two progress lines.
+        :param on_points: optional function also called with each batch.
+        :param quiet: don't print the progress.
+        """
+        self.total = total
+        self.interval = interval
+        self.on_points = on_points
+        self.quiet = quiet
+        self.count = 0
+        self.start = perf_counter()
+        self._last_print = self.start
+
+    def __call__(self, batch):
+        self.count += len(batch)
+        if self.on_points is not None:
+            self.on_points(batch)
+
+        now = perf_counter()
+        if not self.quiet and now - self._last_print >= self.interval:
+            self._last_print = now
+            elapsed = now - self.start
+            eta = elapsed / self.count * (self.total - self.count)
+            print(f"{self.count}/{self.total} points, {elapsed:.1f} s, ETA {eta:.0f} s", flush=True)
+
+
+# Define a function to read the settings file
+def read_settings(path):
+    """
+    :return: list with the dict of settings of each sweep of the file, the missing fields set to
+        the defaults of the sweep.
+    """
+    with open(path) as file:
+        settings = json.load(file)
+    if isinstance(settings, list):
+        return [complete_settings(sweep) for sweep in settings]
+    return [complete_settings(settings)]
+
+
+# Define a function to set the missing settings of a sweep to their defaults
+def complete_settings(settings):
+    sweep = settings.get('sweep')
+    if sweep == 'calibration':
+        return dict(CALIBRATION_DEFAULTS, **settings)
+    if sweep == 'paths':
+        if 'points' not in settings or 'steps' not in settings:
+            raise ValueError("A paths sweep needs 'points' and 'steps'")
+        return dict(PATHS_DEFAULTS, **settings)
+    raise ValueError(f"Unknown sweep {sweep!r}, use 'calibration' or 'paths'")
+
+
+# Define a function to run a calibration sweep
+def run_calibration(settings, progress_interval=5.0, quiet=False, calibration_file='calibration.txt',
+                    name='calibration'):
+    """
+    Runs the sweep of Calibration_GUI.py: finds the instruments, sweeps the current and fits the
+    calibration constants and the calibration models of each branch, or sweeps target fields.
+    :param calibration_file: file the calibration constants are written to, the models are
+        written to the JSON file with the same name.
+    :param name: prefix of the data file name.
+    :return: dict with the summary of the sweep.
+    """
+    from calibration_acquisition import DATA_COLUMNS, FIELD_DATA_COLUMNS, FieldFeedback, calibration_sweep, \
+        find_instruments, load_field_calibration, measure_point, prepare_instruments, sessions, settle_settings, \
+        sweep_cleanup
+
+    # A field target sweep starts from the calibration models
+    field_mode = settings['field_targets']
+    models_file = os.path.splitext(calibration_file)[0] + '.json' if calibration_file else None
+    if field_mode:
+        path = settings['calibration_models']
+        if not path:
+            # The models next to the calibration constants, else the constants, else the calibration
+            # of the working directory
+            path = models_file if models_file and os.path.exists(models_file) else calibration_file or None
+        calibration = load_field_calibration(path)
+        print(f"Field targets from the calibration {path or 'of the working directory'}")
+
+    print("Finding the instruments...")
+    find_instruments()
+
+    budget = None if field_mode else settings['adaptive_budget']
+    curr_vals = calibration_sweep(settings['min'], settings['max'], settings['steps'], budget, settings['round_trip'])
+    settle, fixed_wait = settle_settings(settings['settle_tolerance'], settings['settle_window'], settings['wait'])
+    samples = max(int(settings['samples']), 1)
+    if field_mode:
+        measure = FieldFeedback(calibration, settings['field_tolerance'], settings['max_iterations'], samples,
+                                settle, fixed_wait)
+        fixed_wait = 0.0
+    else:
+        measure = partial(measure_point, samples=samples, settle=settle)
+
+    # Update the fit and the settle statistics with every batch, the points are kept for the
+    # calibration models
+    calibrator = LinearCalibrator()
+    settle_stats = SettleStatistics()
+    convergence_stats = ConvergenceStatistics()
+    currents, fields = [], []
+
+    def add_points(batch):
+        results = [point[2] for point in batch]
+        currents.extend(result[0] for result in results)
+        fields.extend(result[1] for result in results)
+        calibrator.add(currents[-len(results):], fields[-len(results):])
+        if settle is not None:
+            settle_stats.add([result[4] for result in results], [result[5] for result in results])
+        if field_mode:
+            convergence_stats.add(*zip(*[result[8:] for result in results]))
+
+    metadata = {key: settings[key] for key in CALIBRATION_DEFAULTS}
+    writer = StreamingDataWriter(new_data_path(name), FIELD_DATA_COLUMNS if field_mode else DATA_COLUMNS,
+                                 metadata=metadata)
+    summary = run_loop(curr_vals, measure, fixed_wait, writer, add_points, progress_interval, quiet,
+                       setup=prepare_instruments, cleanup=sweep_cleanup)
+    sessions.close_all()
+
+    summary.update({'a1': calibrator.slope, 'a0': calibrator.intercept, 'r_squared': calibrator.r_squared,
+                    'residual_std': calibrator.residual_std})
+    if settle_stats.count:
+        summary['settle'] = settle_stats.summary()
+    if field_mode:
+        summary['feedback'] = convergence_stats.summary()
+    elif not summary['aborted'] and calibration_file:
+        calibrator.save(calibration_file)
+        summary['calibration_file'] = calibration_file
+        try:
+            calibration = FieldCalibration.fit(currents, fields, settings['model'], metadata=metadata)
+            calibration.save(models_file)
+            summary['calibration_models'] = calibration.summary()
+            summary['calibration_models_file'] = models_file
+        except (ValueError, ImportError) as e:
+            summary['errors'].append(f"Could not fit the {settings['model']} calibration: {e}")
+    return summary
+
+
+# Define a function to run a path sweep
+def run_paths(settings, progress_interval=5.0, quiet=False, name='sweep_paths'):
+    """
+    Runs the sweep of gui_plot_paths.py along every segment of the points of the settings.
+    :param name: prefix of the data file name.
+    :return: dict with the summary of the sweep.
+    """
+    from paths_acquisition import DATA_COLUMNS, measure_point, settings_sweep
+
+    points, steps = settings['points'], settings['steps']
+    num_paths = len(points) - 1
+    budget = settings['adaptive_budget']
+    sweep_values = settings_sweep(settings)
+    samples = max(int(settings['measurements']), 1)
+
+    # Same metadata as the window
+    setups = [settings['frequency'], settings['power'], settings['measurements'], settings['wait']]
+    metadata = {'path': num_paths, 'points': points, 'steps': steps, 'setups': setups, 'adaptive_budget': budget}
+    writer = StreamingDataWriter(new_data_path(name), DATA_COLUMNS, metadata=metadata)
+    return run_loop(sweep_values, partial(measure_point, samples=samples), settings['wait']/1000, writer, None,
+                    progress_interval, quiet)
+
+
+# Define a function to run a sweep loop until it ends or Ctrl+C is pressed
+def run_loop(sweep_values, measure, wait, writer, on_points, progress_interval, quiet, setup=None, cleanup=None):
+    """
+    :return: dict with the number of points, the time, the data file, the aborted flag, the
+        failed flag (the sweep ended with an error and wasn't stopped with Ctrl+C) and the timing
+        of the stages of the points.
+    """
+    progress = ProgressPrinter(len(sweep_values), progress_interval, on_points, quiet)
+    errors = []
+    timing = TimingTable(len(sweep_values))
+    loop = SweepLoop(sweep_values, measure, wait=wait, setup=setup, cleanup=cleanup, writer=writer,
+                     batch_interval=0.5, on_points=progress, on_error=errors.append, lock=InstrumentLock(),
+                     timing=timing)
+    print(f"Saving data to {writer.path}")
+
+    # Ctrl+C aborts the loop, so the cleanup still runs and the data file is closed
+    previous_handler = signal.signal(signal.SIGINT, lambda signum, frame: loop.abort())
+    try:
+        aborted = loop.run()
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+
+    elapsed = perf_counter() - progress.start
+    timing_file = timing_path(writer.path)
+    timing.save(timing_file, write_csv=True)
+    return {'points': progress.count, 'time_s': elapsed,
+            'time_per_point_ms': elapsed / progress.count * 1e3 if progress.count else float('nan'),
+            'data_file': writer.path, 'aborted': aborted, 'failed': loop.failed and not loop.abort_requested,
+            'errors': errors, 'timing': timing.summary(), 'timing_file': timing_file}
+
+
+# Define a function to run a sweep of either kind
+def run_settings(settings, args, name=None):
+    """
+    :param name: name of the job, added to the data file name.
+    :return: dict with the summary of the sweep.
+    """
+    if settings['sweep'] == 'calibration':
+        return run_calibration(settings, args.progress, args.quiet, args.calibration_file,
+                               f'calibration_{name}' if name else 'calibration')
+    return run_paths(settings, args.progress, args.quiet, f'sweep_paths_{name}' if name else 'sweep_paths')
+
+
+# Define a function to get the number of points of a sweep, for the time estimates of a queue
+def sweep_size(settings):
+    if settings['sweep'] == 'calibration':
+        from calibration_acquisition import calibration_sweep
+        # The same sweep as run_calibration, a field target sweep has a fixed step
+        budget = None if settings['field_targets'] else settings['adaptive_budget']
+        sweep = calibration_sweep(settings['min'], settings['max'], settings['steps'], budget, settings['round_trip'])
+        return len(sweep)
+    from paths_acquisition import settings_size
+    return settings_size(settings)
+
+
+# Define a function to run the sweeps of a queue one after the other
+def run_queue(queue, args):
+    """
+    Runs the jobs until the queue is empty or a sweep is aborted with Ctrl+C, the jobs after an
+    aborted one are not run. A job that fails (missing calibration, bad settings, instruments
+    busy, measurement error) is reported with its error and the queue goes on with the next one,
+    as in gui_plot_paths.py.
+    :return: list with the summary of each sweep run, with its job name and whether it failed.
+    """
+    summaries = []
+    total = len(queue)
+    while len(queue):
+        job = queue.pop()
+        print(f"\nJob {queue.finished + 1}/{total} ({job.name}), "
+              f"estimated time left {format_duration(queue.eta(job.settings))}", flush=True)
+        try:
+            summary = run_settings(job.settings, args, job.name)
+        except Exception as e:
+            summary = {'job': job.name, 'failed': True, 'aborted': False, 'errors': [f"{type(e).__name__}: {e}"],
+                       'points': 0}
+            summaries.append(summary)
+            queue.record(job.settings, 0, 0.0, failed=True)
+            print(f"Job {job.name} failed: {summary['errors'][0]}", file=sys.stderr)
+            continue
+        summary['job'] = job.name
+        summaries.append(summary)
+        queue.record(job.settings, summary['points'], summary['time_s'], summary['failed'])
+        print_summary(summary)
+        if summary['aborted'] and not summary['failed']:
+            print(f"Queue stopped, {len(queue)} jobs not run")
+            break
+    else:
+        print(f"\nQueue finished, {queue.failures} failed jobs")
+    return summaries
+
+
+# Define a function to print the summary of a sweep
+def print_summary(summary):
+    print("Sweep failed" if summary['failed'] else "Sweep aborted" if summary['aborted'] else "Sweep finished")
+    for error in summary['errors']:
+        print(f"Sweep error: {error}", file=sys.stderr)
+    print(f"{summary['points']} points in {summary['time_s']:.1f} s ({summary['time_per_point_ms']:.3f} ms/point)")
+    print(f"Data file: {summary['data_file']}")
+    if summary['timing']:
+        print(f"Time per point:\n{summary['timing']}")
+    print(f"Timing file: {summary['timing_file']}")
+    if 'a1' in summary:
+        print(f"a1: {summary['a1']}")
+        print(f"a0: {summary['a0']}")
+        print(f"R^2: {summary['r_squared']}")
+        print(f"Residual standard error: {summary['residual_std']} G")
+    if 'settle' in summary:
+        print(f"Field {summary['settle']}")
+    if 'feedback' in summary:
+        print(f"Field target {summary['feedback']}")
+    if 'calibration_file' in summary:
+        print(f"Calibration file: {summary['calibration_file']}")
+    if 'calibration_models' in summary:
+        print(f"Calibration models:\n{summary['calibration_models']}")
+        print(f"Calibration models file: {summary['calibration_models_file']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('settings', help='JSON file with the sweep settings')
+    parser.add_argument('--simulate', action='store_true',
+                        help='use the simulated instruments (also SWEEP_SIMULATE=1), calibration only')
+    parser.add_argument('--progress', type=float, default=5.0, help='time in seconds between two progress lines')
+    parser.add_argument('--quiet', action='store_true', help="don't print the progress")
+    parser.add_argument('--calibration-file', default=os.path.join(os.getcwd(), 'calibration.txt'),
+                        help='file the calibration constants are written to')
+    parser.add_argument('--json', help='also write the summary to this JSON file')
+    args = parser.parse_args()
+
+    # The instrument module reads the simulation flag when it is imported, by run_calibration
+    if args.simulate:
+        os.environ['SWEEP_SIMULATE'] = '1'
+
+    settings = read_settings(args.settings)
+    if len(settings) == 1:
+        summary = run_settings(settings[0], args)
+        print_summary(summary)
+        aborted = summary['aborted']
+    else:
+        queue = JobQueue(sweep_size)
+        for sweep in settings:
+            queue.add(sweep, sweep.get('name'))
+        summary = run_queue(queue, args)
+        aborted = len(summary) < len(settings) or any(job['aborted'] or job['failed'] for job in summary)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(summary, file, indent=2)
+    sys.exit(1 if aborted else 0)
+
+
+if __name__ == '__main__':
+    main()
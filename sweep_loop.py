@@ -0,0 +1,157 @@
+import threading
+from time import perf_counter, time
+
+
+class SweepLoop:
+    """
+    Acquisition loop of a sweep, without any Qt dependency.
+
+    The loop calls a measurement function for every sweep value and hands the results to a
+    callback in batches. SweepWorker runs it in a QThread for the windows and sweep_cli.py runs it
+    directly for headless sweeps.
+    """
+
+    def __init__(self, sweep_values, measure, wait=0.0, setup=None, cleanup=None, writer=None, batch_interval=0.05,
+                 on_points=None, on_error=None, lock=None, timing=None):
+        """
+        :param sweep_values: iterable with the values of the sweep. If it has a record method
+            (e.g. AdaptiveSweep) it is called with the result of each value before the next value
+            is requested, so the sweep can choose its next values from the measurements.
+        :param measure: function called with each sweep value, its return value is sent to on_points.
+        :param wait: time to wait between measurements in seconds.
+        :param setup: optional function called before the loop, e.g. to check that the instruments
+            answer. If it raises an exception the sweep is aborted.
+        :param cleanup: optional function called after the loop with the aborted flag, e.g. to set
+            the power supply output back to zero.
+        :param writer: optional StreamingDataWriter. Each point is queued to it as (sweep value,
+            measurement result values..., timestamp) and it is closed when the loop ends.
+        :param batch_interval: minimum time in seconds between two on_points calls.
+        :param on_points: optional function called with each batch, a list of (index, sweep value,
+            measurement result) tuples.
+        :param on_error: optional function called with the message of an exception raised by the
+            measurement, setup, cleanup or writer.
+        :param lock: optional InstrumentLock held from before the setup until after the cleanup. If
+            another sweep holds it the sweep is aborted without touching the instruments.
+        :param timing: optional TimingTable getting a row with the stages of every point, stored
+            before the point is sent to on_points. The measurement function times its own stages.
+        """
+        self.sweep_values = sweep_values
+        self.measure = measure
+        self.wait = wait
+        self.setup = setup
+        self.cleanup = cleanup
+        self.writer = writer
+        self.batch_interval = batch_interval
+        self.on_points = on_points
+        self.on_error = on_error
+        self.lock = lock
+        self.timing = timing
+        # Set by abort, the operator stopped the sweep (Abort button, Ctrl+C)
+        self.abort_requested = False
+        # Set when an exception of the lock, setup, measurement, cleanup or writer was reported
+        self.failed = False
+        self._abort_event = threading.Event()
+
+    # Define a function to request the loop to stop
+    def abort(self):
+        """
+        Requests the acquisition loop to stop. It is safe to call from any thread and it also
+        interrupts the wait between measurements.
+        """
+        self.abort_requested = True
+        self._abort_event.set()
+
+    def is_aborted(self):
+        return self._abort_event.is_set()
+
+    def run(self):
+        """
+        Acquisition loop, runs in the calling thread until the sweep ends or is aborted.
+        :return: True if the sweep was aborted, by abort or by an error (see abort_requested and
+            failed).
+        """
+        batch = []
+        last_emit = perf_counter()
+        record = getattr(self.sweep_values, 'record', None)
+        locked = False
+        try:
+            if self.lock is not None:
+                self.lock.acquire(abort=self._abort_event)
+            locked = True
+
+            if self.setup is not None:
+                self.setup()
+
+            for idx, val in enumerate(self.sweep_values):
+
+                # Check for abort before talking to the instruments
+                if self._abort_event.is_set():
+                    break
+
+                # Measure the current point
+                if self.timing is None:
+                    result = self.measure(val)
+                else:
+                    self.timing.start_point()
+                    start = perf_counter()
+                    result = self.measure(val)
+                    row = self.timing.end_point(measure=perf_counter() - start)
+                batch.append((idx, val, result))
+
+                # Feed the result back to a sweep choosing its values from the measurements
+                if record is not None:
+                    record(result)
+
+                # Save the point to disk, the writer does the I/O in its own thread
+                if self.writer is not None:
+                    values = result if isinstance(result, tuple) else (result,)
+                    self.writer.append(val, *values, time())
+
+                # Send the accumulated points at most once per batch interval
+                now = perf_counter()
+                if now - last_emit >= self.batch_interval:
+                    self._send(batch)
+                    batch = []
+                    last_emit = now
+
+                # Wait between measurements, returns early if abort is requested
+                if self.wait > 0:
+                    start = perf_counter()
+                    self._abort_event.wait(self.wait)
+                    if self.timing is not None:
+                        self.timing.add(row, row + 1, 'wait', perf_counter() - start)
+
+        except Exception as e:
+            self._abort_event.set()
+            self._error(e)
+
+        # Send the remaining points
+        if batch:
+            self._send(batch)
+
+        # The instruments are only cleaned up and released if this sweep got them
+        aborted = self._abort_event.is_set()
+        if self.cleanup is not None and locked:
+            try:
+                self.cleanup(aborted)
+            except Exception as e:
+                self._error(e)
+        if self.lock is not None and locked:
+            self.lock.release()
+
+        # Finish the data file
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except Exception as e:
+                self._error(e)
+        return aborted
+
+    def _send(self, batch):
+        if self.on_points is not None:
+            self.on_points(batch)
+
+    def _error(self, exception):
+        self.failed = True
+        if self.on_error is not None:
+            self.on_error(f"{type(exception).__name__}: {exception}")
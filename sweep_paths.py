@@ -0,0 +1,129 @@
+import math
+import numpy as np
+
+
+# Relative tolerance used to decide if a segment length is a whole number of steps
+STEP_TOLERANCE = 1e-9
+
+
+# Define a function to get the number of points of one segment
+def segment_size(start_point, end_point, step_size):
+    """
+    Number of sweep values of a segment going from start_point (included) to end_point (excluded).
+    :param start_point: first value of the segment.
+    :param end_point: value where the segment ends, it is not part of the segment.
+    :param step_size: distance between two values. Only its magnitude is used, the direction
+        is given by the start and end points.
+    :return: an int with the number of values of the segment.
+    """
+    distance = abs(end_point - start_point)
+    if distance == 0:
+        return 0
+    step_size = abs(step_size)
+    if step_size == 0:
+        raise ValueError(f"Step size of the segment {start_point} -> {end_point} can't be zero")
+
+    # Round up, unless the distance is a whole number of steps (within float precision)
+    num_steps = distance / step_size
+    nearest = round(num_steps)
+    if abs(num_steps - nearest) <= STEP_TOLERANCE * max(1.0, num_steps):
+        return int(nearest)
+    return int(math.ceil(num_steps))
+
+
+# Define a function to check the path settings
+def _check_path(points, steps):
+    points = [float(point) for point in points]
+    steps = [float(step) for step in steps]
+    if len(points) < 1:
+        raise ValueError("A path needs at least one point")
+    if len(steps) != len(points) - 1:
+        raise ValueError(f"A path with {len(points)} points needs {len(points) - 1} steps, got {len(steps)}")
+    return points, steps
+
+
+# Define a function to get the total number of sweep values of a path
+def path_size(points, steps):
+    """
+    Total number of sweep values of a path, including its final point.
+    :param points: sequence with the N + 1 points of the path (A, B, C...).
+    :param steps: sequence with the N step sizes between consecutive points (A-B, B-C...).
+    :return: an int with the number of values build_path would return.
+    """
+    points, steps = _check_path(points, steps)
+    return sum(segment_size(points[i], points[i + 1], steps[i]) for i in range(len(steps))) + 1
+
+
+# Define a function to build the array of sweep values of a path
+def build_path(points, steps):
+    """
+    Builds the sweep values of a path made of any number of segments. Each segment goes from
+    one point to the next one with its own step size, fractional steps are kept and the direction
+    is taken from the points, so the sign of the steps does not matter.
+    :param points: sequence with the N + 1 points of the path (A, B, C...).
+    :param steps: sequence with the N step sizes between consecutive points (A-B, B-C...).
+    :return: contiguous float64 numpy array with the sweep values, ending with the last point.
+    """
+    points, steps = _check_path(points, steps)
+    sizes = [segment_size(points[i], points[i + 1], steps[i]) for i in range(len(steps))]
+
+    # Fill a preallocated array segment by segment
+    sweep_values = np.empty(sum(sizes) + 1, dtype=np.float64)
+    position = 0
+    for i, size in enumerate(sizes):
+        direction = 1.0 if points[i + 1] >= points[i] else -1.0
+        segment = sweep_values[position:position + size]
+        np.multiply(np.arange(size, dtype=np.float64), direction * abs(steps[i]), out=segment)
+        segment += points[i]
+        position += size
+
+    # Add final point to sweep values
+    sweep_values[-1] = points[-1]
+    return sweep_values
+
+
+# Define a generator to build very long paths lazily
+def iter_path(points, steps, chunk_size=65536):
+    """
+    Lazily generates the sweep values of a path in chunks, so sweeps of millions of points do
+    not need to be held in memory at once.
+    :param points: sequence with the N + 1 points of the path (A, B, C...).
+    :param steps: sequence with the N step sizes between consecutive points (A-B, B-C...).
+    :param chunk_size: maximum number of values of each chunk.
+    :return: generator of float64 numpy arrays. Their concatenation equals build_path(points, steps).
+    """
+    points, steps = _check_path(points, steps)
+    for i in range(len(steps)):
+        size = segment_size(points[i], points[i + 1], steps[i])
+        step = (1.0 if points[i + 1] >= points[i] else -1.0) * abs(steps[i])
+        for first in range(0, size, chunk_size):
+            last = min(first + chunk_size, size)
+            yield points[i] + step * np.arange(first, last, dtype=np.float64)
+
+    # Add final point to sweep values
+    yield np.array(points[-1:], dtype=np.float64)
+
+
+# Define a function to get the length of a path
+def path_length(points):
+    """
+    :param points: sequence with the points of the path (A, B, C...).
+    :return: a float with the total distance travelled along the path.
+    """
+    return float(np.abs(np.diff(np.asarray(points, dtype=np.float64))).sum())
+
+
+# Define a function to get the sweep value at a distance along a path
+def path_position(points, distance):
+    """
+    Sweep value reached after travelling a distance along a path, e.g. to run an adaptive sweep
+    over the distance instead of the sweep value, which goes back and forth on a multi segment path.
+    :param points: sequence with the points of the path (A, B, C...).
+    :param distance: float (or array) with the distance from the first point, between 0 and
+        path_length(points).
+    :return: a float (or array) with the sweep value.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    lengths = np.concatenate(([0.0], np.cumsum(np.abs(np.diff(points)))))
+    position = np.interp(distance, lengths, points)
+    return float(position) if np.ndim(position) == 0 else position
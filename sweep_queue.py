@@ -0,0 +1,120 @@
+from collections import namedtuple
+
+
+# Sweep waiting in a queue: its name (used in the data file name) and its settings, with the
+# fields of the sweep_cli.py settings files
+SweepJob = namedtuple('SweepJob', ['name', 'settings'])
+
+
+class JobQueue:
+    """
+    Queue of sweeps run one after the other, e.g. the same path at several frequency and power
+    setups, so a measurement campaign runs unattended.
+
+    The queue also estimates the time left. Each point is expected to take the wait of its sweep
+    plus an overhead (instrument round trips, saving) learned from the points already measured,
+    so jobs with different waits are estimated correctly.
+
+    Only an abort of the operator stops a running queue. A job that fails (instruments busy,
+    measurement error, data file error) is reported and counted in failures, and the queue goes
+    on with the next job.
+    """
+
+    def __init__(self, size):
+        """
+        :param size: function returning the number of points of the sweep of a settings dict.
+        """
+        self.size = size
+        self.jobs = []
+        self.finished = 0
+        self.failures = 0
+        self._created = 0
+        self._points = 0
+        self._overhead_time = 0.0
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def __iter__(self):
+        return iter(self.jobs)
+
+    # Define a function to add a sweep to the queue
+    def add(self, settings, name=None):
+        """
+        :param settings: dict with the sweep settings, it is copied.
+        :param name: name of the job, job1, job2... by default.
+        :return: the new SweepJob.
+        """
+        self._created += 1
+        job = SweepJob(name or f'job{self._created}', dict(settings))
+        self.jobs.append(job)
+        return job
+
+    def remove(self, index):
+        del self.jobs[index]
+
+    def clear(self):
+        self.jobs.clear()
+
+    # Define a function to take the next job
+    def pop(self):
+        """
+        :return: the first SweepJob of the queue, or None if the queue is empty.
+        """
+        return self.jobs.pop(0) if self.jobs else None
+
+    # Define a function to learn the time per point
+    def record(self, settings, points, elapsed, failed=False):
+        """
+        Counts a job as finished and adds its points to the estimate of the overhead per point.
+        :param settings: settings of the sweep.
+        :param points: number of points measured.
+        :param elapsed: time in seconds the points took.
+        :param failed: the job ended with an error, it is counted in failures and its time, which
+            may include timeouts, isn't used for the estimate.
+        """
+        self.finished += 1
+        if failed:
+            self.failures += 1
+            return
+        self._points += points
+        self._overhead_time += max(elapsed - points * settings.get('wait', 0) / 1000, 0.0)
+
+    @property
+    def overhead(self):
+        """
+        Time in seconds each point takes on top of the wait of its sweep, 0 until points are measured.
+        """
+        return self._overhead_time / self._points if self._points else 0.0
+
+    # Define a function to estimate the time left
+    def eta(self, current=None, current_points=0):
+        """
+        :param current: settings of the sweep running now, None if no sweep is running.
+        :param current_points: number of points the running sweep already measured.
+        :return: estimated time in seconds until the running sweep and every queued job end.
+        """
+        remaining = 0.0
+        if current is not None:
+            remaining += self._job_time(current, max(self.size(current) - current_points, 0))
+        for job in self.jobs:
+            remaining += self._job_time(job.settings, self.size(job.settings))
+        return remaining
+
+    def _job_time(self, settings, points):
+        return points * (settings.get('wait', 0) / 1000 + self.overhead)
+
+
+# Define a function to format a duration
+def format_duration(seconds):
+    """
+    :return: text like 1 h 02 min, 3 min 05 s or 12 s.
+    """
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours} h {minutes:02d} min"
+    if minutes:
+        return f"{minutes} min {seconds:02d} s"
+    return f"{seconds} s"
@@ -0,0 +1,82 @@
+from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+from sweep_loop import SweepLoop
+
+
+class SweepWorker(QObject):
+    """
+    Runs the acquisition loop of a sweep outside of the GUI thread.
+
+    The worker runs a SweepLoop, which calls a measurement function for every sweep value, and
+    sends the results to the window in batches through the points_ready signal, so the GUI thread
+    only has to plot and stays responsive while the instruments are being read.
+    """
+
+    # List of (index, sweep value, measurement result) tuples
+    points_ready = pyqtSignal(list)
+    # Emitted once the loop ended, True if the sweep was aborted
+    finished = pyqtSignal(bool)
+    # Emitted with the error message if the measurement function raised an exception
+    error = pyqtSignal(str)
+
+    def __init__(self, sweep_values, measure, wait=0.0, setup=None, cleanup=None, writer=None, batch_interval=0.05,
+                 lock=None, timing=None):
+        """
+        The arguments are the ones of SweepLoop. The measurement, setup and cleanup functions run
+        in the worker thread so they must not touch any widget.
+        :param sweep_values: iterable with the values of the sweep, or AdaptiveSweep.
+        :param measure: function called with each sweep value, its return value is sent to the window.
+        :param wait: time to wait between measurements in seconds.
+        :param setup: optional function called before the loop. If it raises an exception the sweep
+            is aborted.
+        :param cleanup: optional function called after the loop with the aborted flag.
+        :param writer: optional StreamingDataWriter saving every point, closed when the loop ends.
+        :param batch_interval: minimum time in seconds between two points_ready emissions.
+        :param lock: optional InstrumentLock held while the loop drives the instruments.
+        :param timing: optional TimingTable getting the stages of every point.
+        """
+        super().__init__()
+        self.loop = SweepLoop(sweep_values, measure, wait=wait, setup=setup, cleanup=cleanup, writer=writer,
+                              batch_interval=batch_interval, on_points=self.points_ready.emit,
+                              on_error=self.error.emit, lock=lock, timing=timing)
+
+    # Define a function to request the loop to stop
+    def abort(self):
+        """
+        Requests the acquisition loop to stop. It is safe to call from any thread and it also
+        interrupts the wait between measurements.
+        """
+        self.loop.abort()
+
+    def is_aborted(self):
+        return self.loop.is_aborted()
+
+    # Define a function to tell an error from an abort of the operator once the loop ended
+    def is_failed(self):
+        """
+        :return: True if an exception of the loop was reported and the operator didn't abort the
+            sweep, e.g. a queue goes on with its next job.
+        """
+        return self.loop.failed and not self.loop.abort_requested
+
+    @pyqtSlot()
+    def run(self):
+        """
+        Acquisition loop. Runs in the worker thread once the thread is started.
+        """
+        self.finished.emit(self.loop.run())
+
+
+# Define a function to start a worker in its own thread
+def start_worker(worker):
+    """
+    Moves a worker to a new QThread and starts it. The thread quits by itself when the worker
+    finishes.
+    :param worker: a SweepWorker instance.
+    :return: the running QThread. Keep a reference to it until it finished.
+    """
+    thread = QThread()
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+    worker.finished.connect(thread.quit)
+    thread.start()
+    return thread
@@ -0,0 +1,68 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant
+
+
+class SampleTableModel(QAbstractTableModel):
+    """
+    Table model showing the points of a SampleStore in a QTableView.
+
+    Nothing is copied into the model: the view asks for the values of the visible rows only and
+    they are formatted on demand. New points are announced to the view in batches with sync, so
+    a batch of points costs one beginInsertRows/endInsertRows pair instead of one row insertion
+    and one QTableWidgetItem per value.
+    """
+
+    def __init__(self, store, headers, columns=None, parent=None):
+        """
+        :param store: SampleStore with the data.
+        :param headers: list with the header text of each column of the table.
+        :param columns: list with the store column shown in each table column. Defaults to the
+            first columns of the store.
+        :param parent: parent QObject.
+        """
+        super().__init__(parent)
+        self.store = store
+        self.headers = list(headers)
+        self.columns = list(columns) if columns is not None else list(range(len(self.headers)))
+        self._rows = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        if role == Qt.DisplayRole:
+            return str(self.store.value(index.row(), self.columns[index.column()]))
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return QVariant()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            return self.headers[section]
+        return str(section + 1)
+
+    # Define a function to show the points added to the store since the last call
+    def sync(self):
+        """
+        Announces to the view the rows appended to the store since the last call, in one batch.
+        """
+        size = len(self.store)
+        if size > self._rows:
+            self.beginInsertRows(QModelIndex(), self._rows, size - 1)
+            self._rows = size
+            self.endInsertRows()
+
+    # Define a function to empty the table
+    def reset(self):
+        """
+        Removes every row from the view, call it after clearing the store.
+        """
+        self.beginResetModel()
+        self._rows = len(self.store)
+        self.endResetModel()
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import time
+
+
+# Identity of a VISA resource, identity is None if the instrument didn't answer
+InstrumentInfo = namedtuple('InstrumentInfo', ['name', 'alias', 'identity'])
+
+# Default location of the discovery cache
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.sweep_guis_visa_cache.json')
+
+
+class VisaDiscovery:
+    """
+    Finds the instruments connected to the VISA buses.
+
+    Every resource is opened and asked for its identity concurrently, each probe with its own
+    timeout, so a crowded or partly unresponsive bus costs about one timeout instead of the sum of
+    them. The result is cached in a JSON file and reused while it is younger than ttl seconds, so
+    the next launches don't touch the bus at all. Instruments are then picked by a pattern of
+    their identity (or VISA alias) instead of a fixed address.
+    """
+
+    def __init__(self, resource_manager, cache_path=CACHE_PATH, ttl=24 * 3600, timeout=1.0, max_workers=8,
+                 queries=('*IDN?', 'ID')):
+        """
+        :param resource_manager: pyvisa ResourceManager, or any object with the same interface.
+        :param cache_path: path of the JSON cache, None to disable it.
+        :param ttl: time in seconds a cached discovery is trusted.
+        :param timeout: time in seconds allowed to open and identify each resource.
+        :param max_workers: maximum number of resources probed at the same time.
+        :param queries: identification queries tried in order, e.g. the DTM-133 answers to 'ID'.
+        """
+        self.resource_manager = resource_manager
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.queries = tuple(queries)
+        self.instruments = None
+        self.from_cache = False
+        self._lock = threading.Lock()
+
+    # Define a function to discover the connected instruments
+    def discover(self, refresh=False):
+        """
+        Returns the identity of every resource, from the cache if it is still valid.
+        :param refresh: ignore the cache and probe the resources again.
+        :return: list of InstrumentInfo.
+        """
+        with self._lock:
+            instruments = None if refresh else self._read_cache()
+            self.from_cache = instruments is not None
+            if instruments is None:
+                instruments = self._probe_all()
+                self._write_cache(instruments)
+            self.instruments = instruments
+            return instruments
+
+    # Define a function to find an instrument by identity
+    def find(self, pattern, default=None):
+        """
+        If the instruments come from the cache and none matches, the resources are probed again
+        in case the instrument was off or moved when the cache was written.
+        :param pattern: text searched (case insensitive) in the identity and alias of the resources.
+        :param default: value returned if no resource matches.
+        :return: name of the first matching resource, or default.
+        """
+        pattern = pattern.lower()
+        instruments = self.instruments if self.instruments is not None else self.discover()
+        for info in instruments:
+            if any(pattern in text.lower() for text in (info.identity, info.alias) if text):
+                return info.name
+        if self.from_cache:
+            self.discover(refresh=True)
+            return self.find(pattern, default)
+        return default
+
+    def _probe_all(self):
+        names = list(self.resource_manager.list_resources())
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(names))),
+                                      thread_name_prefix='VisaDiscovery')
+        futures = [executor.submit(self._probe, name) for name in names]
+
+        # The probes time out by themselves, the extra wait only covers a driver that hangs
+        done, _ = wait(futures, timeout=2 * self.timeout * len(self.queries) + 1)
+        executor.shutdown(wait=False)
+        return [future.result() if future in done else InstrumentInfo(name, None, None)
+                for name, future in zip(names, futures)]
+
+    def _probe(self, name):
+        """
+        Opens a resource and asks for its identity.
+        :return: the InstrumentInfo of the resource.
+        """
+        try:
+            alias = self.resource_manager.resource_info(name)[4]
+        except Exception:
+            alias = None
+
+        timeout_ms = int(self.timeout * 1000)
+        try:
+            resource = self.resource_manager.open_resource(name, open_timeout=timeout_ms, timeout=timeout_ms)
+        except Exception:
+            return InstrumentInfo(name, alias, None)
+
+        identity = None
+        try:
+            for query in self.queries:
+                try:
+                    identity = resource.query(query).strip() or None
+                except Exception:
+                    continue
+                if identity:
+                    break
+        finally:
+            try:
+                resource.close()
+            except Exception:
+                pass
+        return InstrumentInfo(name, alias, identity)
+
+    def _read_cache(self):
+        """
+        :return: the cached list of InstrumentInfo, or None if there is no valid cache.
+        """
+        if self.cache_path is None:
+            return None
+        try:
+            with open(self.cache_path) as file:
+                cache = json.load(file)
+            if time() - cache['timestamp'] > self.ttl:
+                return None
+            return [InstrumentInfo(*instrument) for instrument in cache['instruments']]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_cache(self, instruments):
+        if self.cache_path is None:
+            return
+        try:
+            with open(self.cache_path, 'w') as file:
+                json.dump({'timestamp': time(), 'instruments': [list(info) for info in instruments]}, file, indent=2)
+        except OSError:
+            pass
+
+
+# Define a function to format a discovery as a table
+def format_instruments(instruments):
+    """
+    :param instruments: list of InstrumentInfo.
+    :return: text table with the name, alias and identity of each resource.
+    """
+    lines = [f"{'Name':<24} {'alias':<12} identity"]
+    for info in instruments:
+        lines.append(f"{info.name:<24} {str(info.alias):<12} {info.identity or 'no answer'}")
+    return '\n'.join(lines)
@@ -0,0 +1,205 @@
+import threading
+
+
+# Define a function that imports pyvisa on first use, it is slow to import and the simulated
+# instruments don't need it
+def _pyvisa():
+    import pyvisa
+    return pyvisa
+
+
+class _NoVisaError(Exception):
+    """
+    Stands for the pyvisa errors when pyvisa can't be imported, no exception is an instance of it.
+    """
+
+
+_errors = None
+
+
+# Define a function to get the pyvisa exception classes caught by the sessions
+def _visa_errors():
+    """
+    Resolves the classes once, outside of the except clauses, so an error raised by a simulated
+    resource on a machine without pyvisa isn't replaced by the ModuleNotFoundError of the import.
+    :return: tuple (VisaIOError, Error) of pyvisa, or placeholders if pyvisa isn't installed.
+    """
+    global _errors
+    if _errors is None:
+        try:
+            errors = _pyvisa().errors
+            _errors = (errors.VisaIOError, errors.Error)
+        except ImportError:
+            _errors = (_NoVisaError, _NoVisaError)
+    return _errors
+
+
+class VisaSession:
+    """
+    Persistent session to a single VISA resource.
+
+    The resource is opened the first time it is used and kept open across sweeps. Every call goes
+    through a lock so the session can be shared by the GUI and the worker thread, and a call that
+    times out closes the resource, opens it again and is retried once.
+    """
+
+    def __init__(self, manager, name, health_query='*IDN?', clear_on_open=False, open_kwargs=None):
+        """
+        :param manager: SessionManager that owns the session.
+        :param name: VISA resource name, e.g. 'GPIB0::1::INSTR'.
+        :param health_query: cheap query used by check to verify the instrument answers.
+        :param clear_on_open: send a device clear every time the resource is (re)opened.
+        :param open_kwargs: keyword arguments passed to open_resource (timeout, termination...).
+        """
+        self.manager = manager
+        self.name = name
+        self.health_query = health_query
+        self.clear_on_open = clear_on_open
+        self.open_kwargs = open_kwargs or {}
+        self._resource = None
+        self._lock = threading.RLock()
+        self._reconnect_callbacks = []
+
+    # Define a function to get the open resource
+    @property
+    def resource(self):
+        """
+        The pyvisa resource, opened on first access.
+        """
+        with self._lock:
+            if self._resource is None:
+                self._resource = self.manager.resource_manager.open_resource(self.name, **self.open_kwargs)
+                if self.clear_on_open:
+                    self._resource.clear()
+            return self._resource
+
+    # Define a function to register a callback run after each reconnection
+    def on_reconnect(self, callback):
+        """
+        Registers a function called without arguments after the resource was reopened, e.g. to
+        invalidate the state cached by a driver.
+        """
+        self._reconnect_callbacks.append(callback)
+
+    def write(self, command):
+        return self._call('write', command)
+
+    def query(self, command):
+        return self._call('query', command)
+
+    def read(self):
+        return self._call('read')
+
+    def read_stb(self):
+        return self._call('read_stb')
+
+    def clear(self):
+        return self._call('clear')
+
+    def _call(self, method, *args):
+        """
+        Calls a method of the resource, reconnecting and retrying once if it times out.
+        """
+        io_error = _visa_errors()[0]
+        with self._lock:
+            try:
+                return getattr(self.resource, method)(*args)
+            except io_error as e:
+                if e.error_code != _pyvisa().constants.StatusCode.error_timeout:
+                    raise
+                self.reconnect()
+                return getattr(self.resource, method)(*args)
+
+    # Define a function to check that the instrument answers
+    def check(self):
+        """
+        Sends the health query, reconnecting once if the instrument doesn't answer.
+        :return: the answer of the instrument to the health query.
+        """
+        io_error = _visa_errors()[0]
+        with self._lock:
+            try:
+                return self.resource.query(self.health_query)
+            except io_error:
+                self.reconnect()
+                return self.resource.query(self.health_query)
+
+    # Define a function to open the resource again
+    def reconnect(self):
+        """
+        Closes the resource and opens it again.
+        """
+        with self._lock:
+            self.close()
+            resource = self.resource
+        for callback in self._reconnect_callbacks:
+            callback()
+        return resource
+
+    # Define a function to close the resource
+    def close(self):
+        """
+        Closes the resource if it is open. The next call opens it again.
+        """
+        error = _visa_errors()[1]
+        with self._lock:
+            if self._resource is not None:
+                try:
+                    self._resource.close()
+                except error:
+                    pass
+                self._resource = None
+
+    def is_open(self):
+        return self._resource is not None
+
+
+class SessionManager:
+    """
+    Keeps one persistent VisaSession per resource name.
+    """
+
+    def __init__(self, resource_manager=None):
+        """
+        :param resource_manager: pyvisa ResourceManager. If None, one is created on first use.
+        """
+        self._resource_manager = resource_manager
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def resource_manager(self):
+        with self._lock:
+            if self._resource_manager is None:
+                self._resource_manager = _pyvisa().ResourceManager()
+            return self._resource_manager
+
+    # Define a function to get the session of a resource
+    def session(self, name, **session_kwargs):
+        """
+        Returns the session of a resource, creating it the first time. No I/O is done until the
+        session is used.
+        :param name: VISA resource name, e.g. 'GPIB0::1::INSTR'.
+        :param session_kwargs: keyword arguments of VisaSession, only used when the session is created.
+        :return: the VisaSession of the resource.
+        """
+        with self._lock:
+            if name not in self._sessions:
+                self._sessions[name] = VisaSession(self, name, **session_kwargs)
+            return self._sessions[name]
+
+    # Define a function to check every session before a sweep
+    def check_all(self):
+        """
+        Sends the health query of every session, reconnecting the ones that don't answer.
+        :return: dict with the answer of each resource.
+        """
+        return {name: session.check() for name, session in list(self._sessions.items())}
+
+    # Define a function to close every session
+    def close_all(self):
+        """
+        Closes every open resource, e.g. when the application exits.
+        """
+        for session in list(self._sessions.values()):
+            session.close()